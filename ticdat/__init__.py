@@ -17,7 +17,7 @@ The ticDat library is distributed under the BSD2 open source license.
 from ticdat.ticdatfactory import TicDatFactory, freeze_me
 from ticdat.utils import Sloc, LogFile, Progress, Slicer, \
                          find_denormalized_sub_table_failures, standard_main, \
-                         gurobi_env, ampl_format, verify
+                         gurobi_env, ampl_format, verify, ParseCache
 from ticdat.opl import opl_run, create_opl_mod_text, create_opl_mod_output_text
 from ticdat.lingo import lingo_run
 from ticdat.model import Model
@@ -25,4 +25,4 @@ from ticdat.pandatfactory import PanDatFactory
 __version__ = '0.2.16'
 __all__ = ["TicDatFactory", "PanDatFactory", "freeze_me", "LogFile", "Sloc", "Slicer", "Progress", "standard_main",
            "Model", "opl_run", "create_opl_mod_text", "create_opl_mod_output_text", "lingo_run", "ampl_format",
-           "gurobi_env", "verify"]
+           "gurobi_env", "verify", "ParseCache"]
@@ -6,6 +6,8 @@ PEP8
 import os
 from ticdat.utils import DataFrame, create_generic_free
 from ticdat.utils import freezable_factory, TicDatError, verify, containerish, dictish
+from ticdat.utils import _DataDirectory, _open_data_file, _zip_writer, _open_zip_member, _projected_read
+from ticdat.utils import _KeyCountingDict, _loaded_duplicates
 from collections import defaultdict
 from itertools import product
 
@@ -42,11 +44,11 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         self.tic_dat_factory = tic_dat_factory
         self._isFrozen = True
     def create_tic_dat(self, dir_path, dialect='excel', headers_present = True,
-                       freeze_it = False):
+                       freeze_it = False, tables = None, fields = None, duplicates_handler = None):
         """
         Create a TicDat object from the csv files in a directory
 
-        :param dir_path: the directory containing the .csv files.
+        :param dir_path: the directory containing the .csv files, or a .zip archive of them.
 
         :param dialect: the csv dialect. Consult csv documentation for details.
 
@@ -55,28 +57,47 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param duplicates_handler: None, or a function that is passed the duplicated primary keys found
+                                   while the data is loaded, as a dictionary in the same format as the one
+                                   returned by find_duplicates.
+
         :return: a TicDat object populated by the matching files.
 
         caveats: Missing files resolve to an empty table, but missing fields on
                  matching files throw an Exception.
                  Data field values (but not primary key values) will be coerced
                  into floats if possible.
+                 Files compressed as .csv.gz, .csv.bz2 or .csv.xz are decompressed as they are read.
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.csv.create_tic_dat(dir_path, dialect, headers_present,
+                                                                           duplicates_handler=duplicates_handler))
         verify(csv, "csv needs to be installed to use this subroutine")
         tdf = self.tic_dat_factory
         verify(headers_present or not tdf.generic_tables,
                "headers need to be present to read generic tables")
         verify(DataFrame or not tdf.generic_tables,
                "Strange absence of pandas despite presence of generic tables")
-        rtn =  self.tic_dat_factory.TicDat(**self._create_tic_dat(dir_path, dialect,
-                                                                  headers_present))
+        dat = self._create_tic_dat(dir_path, dialect, headers_present, duplicates_handler is not None)
+        if duplicates_handler:
+            duplicates_handler(_loaded_duplicates(dat))
+        rtn =  self.tic_dat_factory.TicDat(**dat)
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
         return rtn
-    def _create_tic_dat(self, dir_path, dialect, headers_present):
+    def _create_tic_dat(self, dir_path, dialect, headers_present, count_duplicates = False):
         verify(dialect in csv.list_dialects(), "Invalid dialect %s"%dialect)
-        verify(os.path.isdir(dir_path), "Invalid directory path %s"%dir_path)
-        rtn =  {t : self._create_table(dir_path, t, dialect, headers_present)
+        verify(os.path.isdir(dir_path) or os.path.isfile(dir_path), "Invalid directory path %s"%dir_path)
+        data_dir = _DataDirectory(dir_path)
+        rtn =  {t : self._create_table(data_dir, t, dialect, headers_present, count_duplicates)
                 for t in self.tic_dat_factory.all_tables}
         missing_tables = {t for t in self.tic_dat_factory.all_tables if not rtn[t]}
         if missing_tables:
@@ -87,7 +108,7 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         """
         Find the row counts for duplicated rows.
 
-        :param dir_path: the directory containing .csv files.
+        :param dir_path: the directory containing .csv files, or a .zip archive of them.
 
         :param dialect: the csv dialect. Consult csv documentation for details.
 
@@ -106,12 +127,13 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         """
         verify(csv, "csv needs to be installed to use this subroutine")
         verify(dialect in csv.list_dialects(), "Invalid dialect %s"%dialect)
-        verify(os.path.isdir(dir_path), "Invalid directory path %s"%dir_path)
+        verify(os.path.isdir(dir_path) or os.path.isfile(dir_path), "Invalid directory path %s"%dir_path)
+        data_dir = _DataDirectory(dir_path)
         tdf = self.tic_dat_factory
         rtn = {t:defaultdict(int) for t,_ in tdf.primary_key_fields.items()
-               if _ and self._get_file_path(dir_path, t)}
+               if _ and self._get_file_path(data_dir, t)}
         for t in rtn:
-            with open(self._get_file_path(dir_path, t)) as csvfile:
+            with data_dir.open(self._get_file_path(data_dir, t)) as csvfile:
                 for r in self._get_data(csvfile, t, dialect, headers_present):
                     p_key = r[tdf.primary_key_fields[t][0]] \
                             if len(tdf.primary_key_fields[t])==1 else \
@@ -122,13 +144,8 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
             if not rtn[t]:
                 del(rtn[t])
         return rtn
-    def _get_file_path(self, dir_path, table):
-        rtn = [path for f in os.listdir(dir_path) for path in [os.path.join(dir_path, f)]
-               if os.path.isfile(path) and
-               f.lower().replace(" ", "_") == "%s.csv"%table.lower()]
-        verify(len(rtn) <= 1, "duplicate .csv files found for %s"%table)
-        if rtn:
-            return rtn[0]
+    def _get_file_path(self, data_dir, table):
+        return data_dir.find(table, ".csv")
     def _get_data(self, csvfile, table, dialect, headers_present):
         tdf = self.tic_dat_factory
         fieldnames=tdf.primary_key_fields.get(table, ()) + tdf.data_fields.get(table, ())
@@ -151,19 +168,19 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
                            "Duplicate field names found for field %s table %s"%(f, table))
                 yield {f: _try_float(row[key_matching[f][0]]) for f in fieldnames}
 
-    def _create_table(self, dir_path, table, dialect, headers_present):
-        file_path = self._get_file_path(dir_path, table)
-        if not (file_path and  os.path.isfile(file_path)) :
+    def _create_table(self, data_dir, table, dialect, headers_present, count_duplicates = False):
+        file_path = self._get_file_path(data_dir, table)
+        if not file_path:
             return
         tdf = self.tic_dat_factory
         if table in tdf.generator_tables:
             def rtn() :
-                with open(file_path) as csvfile:
+                with data_dir.open(file_path) as csvfile:
                     for r in self._get_data(csvfile, table, dialect, headers_present):
                         yield tuple(r[_] for _ in tdf.data_fields[table])
         else:
-            rtn = {} if tdf.primary_key_fields.get(table) else []
-            with open(file_path) as csvfile:
+            rtn = (_KeyCountingDict() if count_duplicates else {}) if tdf.primary_key_fields.get(table) else []
+            with data_dir.open(file_path) as csvfile:
                 for r in self._get_data(csvfile, table, dialect, headers_present) :
                     if tdf.primary_key_fields.get(table) :
                         p_key = r[tdf.primary_key_fields[table][0]] \
@@ -177,14 +194,15 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         return rtn
 
     def write_directory(self, tic_dat, dir_path, allow_overwrite = False, dialect='excel',
-                        write_header = True):
+                        write_header = True, compression = None, compress_threads = 1):
         """
 
         write the ticDat data to a collection of csv files
 
         :param tic_dat: the data object
 
-        :param dir_path: the directory in which to write the csv files
+        :param dir_path: the directory in which to write the csv files. If it ends with .zip, then
+                         a zip archive of the csv files is written instead.
 
         :param allow_overwrite: boolean - are we allowed to overwrite existing
                                 files?
@@ -194,36 +212,53 @@ class CsvTicFactory(freezable_factory(object, "_isFrozen")) :
         :param write_header: Boolean. Should the header information be written
                              as the first row?
 
+        :param compression: None, "gz", "bz2" or "xz". If not None, each file is compressed,
+                            with the matching suffix appended to its .csv extension.
+                            (Ignored for zip archives, whose members are always deflated).
+
+        :param compress_threads: positive integer. The number of threads used to compress each file.
+
         :return:
         """
         verify(csv, "csv needs to be installed to use this subroutine")
         verify(dialect in csv.list_dialects(), "Invalid dialect %s"%dialect)
-        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        is_zip = dir_path.lower().endswith(".zip")
+        verify(is_zip or not os.path.isfile(dir_path), "A file is not a valid directory path")
+        verify(compression in (None, "gz", "bz2", "xz"), "compression needs to be None, gz, bz2 or xz")
         if self.tic_dat_factory.generic_tables:
             dat, tdf = create_generic_free(tic_dat, self.tic_dat_factory)
-            return tdf.csv.write_directory(dat, dir_path, allow_overwrite, dialect, write_header)
+            return tdf.csv.write_directory(dat, dir_path, allow_overwrite, dialect, write_header,
+                                           compression, compress_threads)
         tdf = self.tic_dat_factory
         msg = []
         if not self.tic_dat_factory.good_tic_dat_object(tic_dat, lambda m : msg.append(m)) :
             raise TicDatError("Not a valid TicDat object for this schema : " + " : ".join(msg))
+        file_name = lambda t : t + ".csv" + ("." + compression if compression and not is_zip else "")
         if not allow_overwrite:
-            for t in tdf.all_tables :
-                f = os.path.join(dir_path, t + ".csv")
+            for f in ([dir_path] if is_zip else [os.path.join(dir_path, file_name(t)) for t in tdf.all_tables]):
                 verify(not os.path.exists(f), "The %s path exists and overwrite is not allowed"%f)
+        if is_zip:
+            with _zip_writer(dir_path) as zf:
+                for t in tdf.all_tables :
+                    with _open_zip_member(zf, file_name(t)) as csvfile:
+                        self._write_table(csvfile, tic_dat, t, dialect, write_header)
+            return
         if not os.path.isdir(dir_path) :
             os.mkdir(dir_path)
         for t in tdf.all_tables :
-            f = os.path.join(dir_path, t + ".csv")
-            with open(f, 'w') as csvfile:
-                 writer = csv.DictWriter(csvfile,dialect=dialect, fieldnames=
-                        tdf.primary_key_fields.get(t, ()) + tdf.data_fields.get(t, ()) )
-                 writer.writeheader() if write_header else None
-                 _t =  getattr(tic_dat, t)
-                 if dictish(_t) :
-                     for p_key, data_row in _t.items() :
-                         primaryKeyDict = {f:v for f,v in zip(tdf.primary_key_fields[t],
-                                            p_key if containerish(p_key) else (p_key,))}
-                         writer.writerow(dict(data_row, **primaryKeyDict))
-                 else :
-                     for data_row in (_t if containerish(_t) else _t()) :
-                         writer.writerow(dict(data_row))
\ No newline at end of file
+            with _open_data_file(os.path.join(dir_path, file_name(t)), 'w', compress_threads) as csvfile:
+                self._write_table(csvfile, tic_dat, t, dialect, write_header)
+    def _write_table(self, csvfile, tic_dat, t, dialect, write_header):
+        tdf = self.tic_dat_factory
+        writer = csv.DictWriter(csvfile,dialect=dialect, fieldnames=
+               tdf.primary_key_fields.get(t, ()) + tdf.data_fields.get(t, ()) )
+        writer.writeheader() if write_header else None
+        _t =  getattr(tic_dat, t)
+        if dictish(_t) :
+            for p_key, data_row in _t.items() :
+                primaryKeyDict = {f:v for f,v in zip(tdf.primary_key_fields[t],
+                                   p_key if containerish(p_key) else (p_key,))}
+                writer.writerow(dict(data_row, **primaryKeyDict))
+        else :
+            for data_row in (_t if containerish(_t) else _t()) :
+                writer.writerow(dict(data_row))
\ No newline at end of file
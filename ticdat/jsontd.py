@@ -3,9 +3,10 @@ Read/write ticDat objects from json files. Requires the json module
 PEP8
 """
 import os
+import re
 from collections import defaultdict
 from ticdat.utils import freezable_factory, TicDatError, verify, stringish, dictish, containerish
-from ticdat.utils import find_duplicates_from_dict_ticdat
+from ticdat.utils import find_duplicates_from_dict_ticdat, _open_data_file, _DataDirectory, _projected_read
 
 try:
     import json
@@ -14,31 +15,218 @@ except:
 
 _can_unit_test = json
 
+_json_chunk_size = 2**16
+_json_write_batch_size = 1000
+_json_skip_whitespace = re.compile(r"[ \t\n\r]*").match
+
+class _JsonStream(object):
+    """
+    an incremental reader of a json document. The document is read a chunk at a time, and
+    its objects and arrays can be walked one member at a time, so that only the values the caller
+    decodes are ever held in memory. The scalars and the members themselves are decoded with
+    the scanner of json.JSONDecoder (i.e. what json.JSONDecoder.raw_decode uses).
+    """
+    def __init__(self, fp, chunk_size = _json_chunk_size):
+        self._fp, self._chunk_size = fp, chunk_size
+        self._buf, self._pos, self._eof = "", 0, False
+        self._scan = json.JSONDecoder().scan_once
+    def _fill(self):
+        # read at least as much as is already buffered, so that decoding a large value
+        # is retried only a logarithmic number of times
+        if self._eof:
+            return False
+        chunk = self._fp.read(max(self._chunk_size, len(self._buf) - self._pos))
+        self._eof = not chunk
+        self._buf, self._pos = self._buf[self._pos:] + chunk, 0
+        return bool(chunk)
+    def _error(self, msg):
+        return ValueError("%s at character %s of the current json buffer"%(msg, self._pos))
+    def peek(self):
+        """
+        :return: the next non whitespace character, or the empty string at the end of the document
+        """
+        while True:
+            self._pos = _json_skip_whitespace(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+    def _expect(self, chars):
+        rtn = self.peek()
+        if not rtn or rtn not in chars:
+            raise self._error("Expected one of %s but found %s"%(list(chars), repr(rtn or "end of file")))
+        self._pos += 1
+        return rtn
+    def value(self):
+        """
+        :return: the next value, fully decoded
+        """
+        self.peek()
+        while True:
+            try:
+                rtn, end = self._scan(self._buf, self._pos)
+            except (StopIteration, ValueError):
+                if self._fill():
+                    continue
+                raise self._error("Expecting a value")
+            # a number at the end of the buffer might continue in the next chunk
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return rtn
+    def keys(self):
+        """
+        yields the keys of the next value, which needs to be an object. The value of each key
+        needs to be consumed (by value, keys, elements or skip) before the next key is yielded.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not stringish(key):
+                raise self._error("Expected a string key")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+    def elements(self):
+        """
+        yields once for each element of the next value, which needs to be an array. Each element
+        needs to be consumed (by value, keys, elements or skip) before the next one is yielded.
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self._expect(",]") == "]":
+                return
+    def values(self):
+        """
+        yields the decoded elements of the next value, which needs to be an array.
+        Equivalent to (self.value() for _ in self.elements()), but faster.
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        scan, skip_whitespace = self._scan, _json_skip_whitespace
+        while True:
+            buf = self._buf
+            start = skip_whitespace(buf, self._pos).end()
+            try:
+                rtn, end = scan(buf, start)
+                pos = skip_whitespace(buf, end).end()
+                separator = buf[pos] if pos < len(buf) else ""
+            except (StopIteration, ValueError):
+                separator = ""
+            if separator == "," or separator == "]":
+                self._pos = pos + 1
+            else: # the element or its separator isn't (entirely) in the buffer
+                self._pos = start
+                rtn = self.value()
+                separator = self._expect(",]")
+            yield rtn
+            if separator == "]":
+                return
+    def skip(self):
+        """
+        consume the next value without holding more than one of its scalars in memory
+        """
+        if self.peek() == "{":
+            for _ in self.keys():
+                self.skip()
+        elif self.peek() == "[":
+            for _ in self.elements():
+                self.skip()
+        else:
+            self.value()
+    def verify_end(self):
+        if self.peek():
+            raise self._error("Unexpected data after the json document")
+
 def _standard_verify(tdf):
     verify(json, "json needs to be installed to use this subroutine")
     verify(not tdf.generator_tables, "json not yet implemented for generator tables.")
     verify(not tdf.generic_tables, "json not yet implemented for generic tables.\n" +
            "This is due to lack of multi-index json support. See goo.gl/u6FGBg")
 
+def _json_rows(tdf, tic_dat, t, verbose=False):
+    all_fields = tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t,())
+    def make_row(row):
+        assert containerish(row) and len(row) == len(all_fields)
+        return {f:v for f,v in zip(all_fields, row)} if verbose else row
+    tbl = getattr(tic_dat, t)
+    if tdf.primary_key_fields.get(t):
+        for pk, data_row in tbl.items():
+            yield make_row((list(pk) if containerish(pk) else [pk]) +
+                           [data_row[df] for df in tdf.data_fields[t]])
+    else:
+        for data_row in (tbl if containerish(tbl) else tbl()):
+            yield make_row([data_row[df] for df in tdf.data_fields[t]])
+
 def make_json_dict(tdf, tic_dat, verbose=False):
     assert tdf.good_tic_dat_object(tic_dat)
     jdict = defaultdict(list)
     for t in tdf.all_tables:
-        all_fields = tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t,())
-        def make_row(row):
-            assert containerish(row) and len(row) == len(all_fields)
-            return {f:v for f,v in zip(all_fields, row)} if verbose else row
-        appender = lambda row : jdict[t].append(make_row(row))
-        tbl = getattr(tic_dat, t)
-        if tdf.primary_key_fields.get(t):
-            for pk, data_row in tbl.items():
-                appender((list(pk) if containerish(pk) else [pk]) +
-                         [data_row[df] for df in tdf.data_fields[t]])
-        else:
-            for data_row in tbl:
-                appender([data_row[df] for df in tdf.data_fields[t]])
+        for row in _json_rows(tdf, tic_dat, t, verbose):
+            jdict[t].append(row)
     return jdict
 
+def _jsonl_file_path(dir_path, table):
+    """
+    the .jsonl (or compressed .jsonl) file for the table, matched with case-space insensitivity
+    """
+    rtn = _DataDirectory(dir_path).find(table, ".jsonl")
+    if rtn:
+        return os.path.join(dir_path, rtn)
+
+def _jsonl_values(file_path):
+    """
+    yields the decoded value of each (non blank) line of a JSON Lines file, one line at a time.
+    A last line that is incomplete, because it is still being appended, is ignored.
+    """
+    with _open_data_file(file_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                if not line.endswith("\n"):
+                    return
+                raise TicDatError("Unable to decode line %s of %s : %s"%(line_number, file_path, e))
+
+def _jsonl_rows(file_path, fields):
+    """
+    yields the rows of a JSON Lines file as tuples ordered by fields. Each line is either a
+    list of the field values, or a dictionary keyed by field name.
+    """
+    for value in _jsonl_values(file_path):
+        if dictish(value):
+            verify(all(f in value for f in fields),
+                   "Unable to find all of the fields %s in a row of %s"%(list(fields), file_path))
+            yield tuple(value[f] for f in fields)
+        else:
+            verify(containerish(value) and len(value) == len(fields),
+                   "Need %s values for each row of %s"%(len(fields), file_path))
+            yield tuple(value)
+
+def _write_jsonl(file_path, rows, append, default = None):
+    encode = json.JSONEncoder(separators=(",", ":"), default=default).encode
+    with _open_data_file(file_path, "a" if append else "w") as f:
+        batch = []
+        for row in rows:
+            batch.append(encode(row))
+            if len(batch) >= _json_write_batch_size:
+                f.write("\n".join(batch) + "\n")
+                batch = []
+        if batch:
+            f.write("\n".join(batch) + "\n")
+
 class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
     """
     Primary class for reading/writing json files with TicDat objects.
@@ -54,7 +242,8 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
         """
         self.tic_dat_factory = tic_dat_factory
         self._isFrozen = True
-    def create_tic_dat(self, json_file_path, freeze_it = False):
+    def create_tic_dat(self, json_file_path, freeze_it = False, tables = None, fields = None,
+                       duplicates_handler = None):
         """
         Create a TicDat object from a json file
 
@@ -63,6 +252,17 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param duplicates_handler: None, or a function that is passed the duplicated primary keys found
+                                   while the data is loaded, as a dictionary in the same format as the one
+                                   returned by find_duplicates.
+
         :return: a TicDat object populated by the matching tables.
 
         caveats: Table names matches are case insensitive and also
@@ -70,9 +270,15 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
                  Tables that don't find a match are interpreted as an empty table.
                  Dictionary keys that don't match any table are ignored.
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.json.create_tic_dat(json_file_path,
+                                                                            duplicates_handler=duplicates_handler))
         _standard_verify(self.tic_dat_factory)
         jdict = self._create_jdict(json_file_path)
         tic_dat_dict = self._create_tic_dat_dict(jdict)
+        if duplicates_handler:
+            duplicates_handler(find_duplicates_from_dict_ticdat(self.tic_dat_factory, tic_dat_dict) or {})
         missing_tables = set(self.tic_dat_factory.all_tables).difference(tic_dat_dict)
         if missing_tables:
             print ("The following table names could not be found in the %s file.\n%s\n"%
@@ -99,18 +305,32 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
         rtn = find_duplicates_from_dict_ticdat(self.tic_dat_factory, jdict)
         return rtn or {}
     def _create_jdict(self, json_file_path):
+        """
+        read the json file incrementally. Only the entries whose keys match a table are
+        decoded, and the rows of those entries are decoded one at a time.
+        """
         verify(os.path.isfile(json_file_path), "json_file_path is not a valid file path.")
+        tdf = self.tic_dat_factory
+        table_keys = {t.lower() for t in tdf.all_tables}
+        jdict = {}
         try :
-            with open(json_file_path, "r") as fp:
-                jdict = json.load(fp)
+            with _open_data_file(json_file_path, "r") as fp:
+                stream = _JsonStream(fp)
+                verify(stream.peek() == "{", "%s failed to load a dictionary"%json_file_path)
+                for key in stream.keys():
+                    verify(stream.peek() in "[{",
+                           "The dictionary loaded from %s doesn't have containers as values"%json_file_path)
+                    if key.replace(" ", "_").lower() not in table_keys:
+                        stream.skip()
+                    elif stream.peek() == "{":
+                        jdict[key] = stream.value()
+                    else:
+                        jdict[key] = list(stream.values())
+                stream.verify_end()
+        except TicDatError:
+            raise
         except Exception as e:
-            raise TicDatError("Unable to interpret %s as json file : %s"%
-                              (json_file_path, e.message))
-        verify(dictish(jdict), "%s failed to load a dictionary"%json_file_path)
-        verify(all(map(stringish, jdict)),
-               "The dictionary loaded from %s isn't indexed by strings"%json_file_path)
-        verify(all(map(containerish, jdict.values())),
-               "The dictionary loaded from %s doesn't have containers as values"%json_file_path)
+            raise TicDatError("Unable to interpret %s as json file : %s"%(json_file_path, e))
         return jdict
     def _create_tic_dat_dict(self, jdict):
         tdf = self.tic_dat_factory
@@ -124,13 +344,15 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
                 verify(len(table_keys[t]) < 2, "Found duplicate matching keys for table %s"%t)
                 rtn[t] = jdict[table_keys[t][0]]
         return rtn
-    def write_file(self, tic_dat, json_file_path, allow_overwrite = False, verbose = False):
+    def write_file(self, tic_dat, json_file_path, allow_overwrite = False, verbose = False,
+                   compact = False, compress_threads = 1):
         """
         write the ticDat data to an excel file
 
         :param tic_dat: the data object to write (typically a TicDat)
 
         :param json_file_path: The file path of the json file to create.
+                               If it ends with ".gz", ".bz2" or ".xz", the file will be compressed.
 
         :param allow_overwrite: boolean - are we allowed to overwrite an
                                 existing file?
@@ -138,6 +360,14 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
         :param verbose: boolean. Verbose mode writes the data rows as dicts
                         keyed by field name. Otherwise, they are lists.
 
+        :param compact: boolean. Compact mode writes the tables one at a time, without
+                        indentation or key sorting, and without first building the
+                        entire json dictionary in memory. Recommended for large data.
+                        Otherwise, the file is pretty printed with sorted keys, which
+                        makes for more readable diffs.
+
+        :param compress_threads: positive integer. The number of threads used to compress the file.
+
         :return:
         """
         _standard_verify(self.tic_dat_factory)
@@ -146,6 +376,120 @@ class JsonTicFactory(freezable_factory(object, "_isFrozen")) :
         msg = []
         if not self.tic_dat_factory.good_tic_dat_object(tic_dat, lambda m : msg.append(m)) :
             raise TicDatError("Not a valid TicDat object for this schema : " + " : ".join(msg))
+        if compact:
+            self._write_compact(tic_dat, json_file_path, verbose, compress_threads)
+            return
         jdict = make_json_dict(self.tic_dat_factory, tic_dat, verbose)
-        with open(json_file_path, "w") as fp:
+        with _open_data_file(json_file_path, "w", compress_threads) as fp:
             json.dump(jdict, fp, sort_keys=True, indent=2)
+    def _write_compact(self, tic_dat, json_file_path, verbose, compress_threads):
+        tdf = self.tic_dat_factory
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        with _open_data_file(json_file_path, "w", compress_threads) as fp:
+            fp.write("{")
+            for i, t in enumerate(sorted(tdf.all_tables)):
+                fp.write("%s%s:["%("," if i else "", encode(t)))
+                batch, separator = [], ""
+                for row in _json_rows(tdf, tic_dat, t, verbose):
+                    batch.append(encode(row))
+                    if len(batch) >= _json_write_batch_size:
+                        fp.write(separator + ",".join(batch))
+                        batch, separator = [], ","
+                if batch:
+                    fp.write(separator + ",".join(batch))
+                fp.write("]")
+            fp.write("}")
+    def create_tic_dat_from_jsonl(self, dir_path, freeze_it = False, tables = None, fields = None):
+        """
+        Create a TicDat object from the JSON Lines files in a directory
+
+        :param dir_path: the directory containing one .jsonl file per table. Each line of a file
+                         is one row, either as a list of the field values (primary key fields
+                         first) or as a dictionary keyed by field name.
+                         .jsonl.gz, .jsonl.bz2 and .jsonl.xz files are decompressed as they are read.
+
+        :param freeze_it: boolean. should the returned object be frozen?
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :return: a TicDat object populated by the matching files.
+
+        caveats: File names are matched with case-space insensitivity.
+                 Missing files resolve to an empty table.
+                 The files are read one line at a time. Generator tables re-read their file
+                 each time they are iterated, so they pick up rows appended in the meantime.
+                 A last line that is incomplete (i.e. still being written) is ignored.
+        """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.json.create_tic_dat_from_jsonl(dir_path))
+        tdf = self.tic_dat_factory
+        verify(json, "json needs to be installed to use this subroutine")
+        verify(not tdf.generic_tables, "json not yet implemented for generic tables.")
+        verify(os.path.isdir(dir_path), "Invalid directory path %s"%dir_path)
+        rtn = {}
+        for t in tdf.all_tables:
+            file_path = _jsonl_file_path(dir_path, t)
+            if not file_path:
+                continue
+            pks, dfs = tdf.primary_key_fields.get(t, ()), tdf.data_fields.get(t, ())
+            if t in tdf.generator_tables:
+                def generator(file_path=file_path, fields=dfs):
+                    for row in _jsonl_rows(file_path, fields):
+                        yield row
+                rtn[t] = generator
+            elif pks:
+                rtn[t] = {(row[0] if len(pks) == 1 else row[:len(pks)]): row[len(pks):]
+                          for row in _jsonl_rows(file_path, pks + dfs)}
+            else:
+                rtn[t] = list(_jsonl_rows(file_path, dfs))
+        missing_tables = set(tdf.all_tables).difference(rtn)
+        if missing_tables:
+            print ("The following table names could not be found in the %s directory.\n%s\n"%
+                   (dir_path,"\n".join(missing_tables)))
+        rtn = tdf.TicDat(**rtn)
+        if freeze_it:
+            return tdf.freeze_me(rtn)
+        return rtn
+    def write_jsonl_directory(self, tic_dat, dir_path, allow_overwrite = False, verbose = False,
+                              append = False):
+        """
+        write the ticDat data to a directory of JSON Lines files, one file per table
+
+        :param tic_dat: the data object to write (typically a TicDat)
+
+        :param dir_path: the directory in which to write the .jsonl files
+
+        :param allow_overwrite: boolean - are we allowed to overwrite existing files?
+
+        :param verbose: boolean. Verbose mode writes the rows as dicts keyed by field name.
+                        Otherwise, they are lists.
+
+        :param append: boolean. Should the rows be appended to the existing files (if any)?
+                       This allows a solution to be written out incrementally.
+
+        :return:
+
+        caveats: The rows are written one table at a time, directly from tic_dat.
+                 Generator tables are iterated while being written.
+        """
+        tdf = self.tic_dat_factory
+        verify(json, "json needs to be installed to use this subroutine")
+        verify(not tdf.generic_tables, "json not yet implemented for generic tables.")
+        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        msg = []
+        if not tdf.good_tic_dat_object(tic_dat, lambda m : msg.append(m)) :
+            raise TicDatError("Not a valid TicDat object for this schema : " + " : ".join(msg))
+        if not (allow_overwrite or append):
+            for t in tdf.all_tables :
+                f = os.path.join(dir_path, t + ".jsonl")
+                verify(not os.path.exists(f), "The %s path exists and overwrite is not allowed"%f)
+        if not os.path.isdir(dir_path) :
+            os.mkdir(dir_path)
+        for t in tdf.all_tables:
+            _write_jsonl(os.path.join(dir_path, t + ".jsonl"), _json_rows(tdf, tic_dat, t, verbose), append)
@@ -90,7 +90,8 @@ class MdbTicFactory(freezable_factory(object, "_isFrozen")) :
         self.tic_dat_factory = tic_dat_factory
         self._duplicate_focused_tdf = create_duplicate_focused_tdf(tic_dat_factory)
         self._isFrozen = True
-    def create_tic_dat(self, mdb_file_path, freeze_it = False):
+    def create_tic_dat(self, mdb_file_path, freeze_it = False, tables = None, fields = None,
+                       duplicates_handler = None):
         """
         Create a TicDat object from an Access MDB file
 
@@ -98,13 +99,31 @@ class MdbTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param duplicates_handler: None, or a function that is passed the duplicated primary keys found
+                                   while the data is loaded, as a dictionary in the same format as the one
+                                   returned by find_duplicates.
+
         :return: a TicDat object populated by the matching tables.
 
         caveats : Numbers with absolute values larger than 1e+100 will
                   be read as float("inf") or float("-inf")
         """
+        if tables is not None or fields is not None:
+            return utils._projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                         read=lambda tdf: tdf.mdb.create_tic_dat(mdb_file_path,
+                                                            duplicates_handler=duplicates_handler))
         _standard_verify(self.tic_dat_factory.generic_tables)
-        rtn =  self.tic_dat_factory.TicDat(**self._create_tic_dat(mdb_file_path))
+        dat = self._create_tic_dat(mdb_file_path, duplicates_handler is not None)
+        if duplicates_handler:
+            duplicates_handler(utils._loaded_duplicates(dat))
+        rtn =  self.tic_dat_factory.TicDat(**dat)
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
         return rtn
@@ -175,14 +194,15 @@ class MdbTicFactory(freezable_factory(object, "_isFrozen")) :
                 for row in cur.fetchall():
                   yield list(map(_read_data, row))
         return tableObj
-    def _create_tic_dat(self, mdbFilePath):
+    def _create_tic_dat(self, mdbFilePath, count_duplicates = False):
         tdf = self.tic_dat_factory
         table_names = self._check_tables_fields(mdbFilePath, tdf.all_tables)
         rtn = {}
         with _connect(_connection_str(mdbFilePath)) as con:
             for table in set(tdf.all_tables).difference(tdf.generator_tables) :
                 fields = tdf.primary_key_fields.get(table, ()) + tdf.data_fields.get(table, ())
-                rtn[table]= {} if tdf.primary_key_fields.get(table, ())  else []
+                rtn[table]= (utils._KeyCountingDict() if count_duplicates else {}) \
+                            if tdf.primary_key_fields.get(table, ())  else []
                 with con.cursor() as cur :
                     cur.execute("Select %s from [%s]"%(", ".join(_brackets(fields)),
                                  table_names[table]))
@@ -5,7 +5,7 @@ PEP8
 
 # Note that we're really just leveraging ticdat's ability handle DataFrame's here
 from ticdat.utils import freezable_factory, verify, find_duplicates, create_duplicate_focused_tdf
-from ticdat.utils import dictish, DataFrame, stringish
+from ticdat.utils import dictish, DataFrame, stringish, _projected_read
 from itertools import product
 from collections import defaultdict
 import inspect
@@ -87,7 +87,7 @@ class OpalyticsTicFactory(freezable_factory(object, "_isFrozen")) :
                                  self.tic_dat_factory.data_fields[t]))
         return rtn
 
-    def create_tic_dat(self, inputset, raw_data=False, freeze_it=False):
+    def create_tic_dat(self, inputset, raw_data=False, freeze_it=False, tables=None, fields=None):
         """
         Create a TicDat object from an opalytics inputset
         :param inputset: An opalytics inputset consistent with this TicDatFactory
@@ -96,10 +96,18 @@ class OpalyticsTicFactory(freezable_factory(object, "_isFrozen")) :
                          removing data type failures, data row predicate failures, foreign key
                          failures and deactivated records.
         :param freeze_it: boolean. should the returned object be frozen?
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
         :return: a TicDat object populated by the tables as they are rendered by inputset
         caveats: A table present in the TicDatFactory schema but missing from the inputset schema will resolve
                  to an empty table.
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.opalytics.create_tic_dat(inputset, raw_data))
         message = []
         verify(self._good_inputset(inputset, message.append),
                "inputset is inconsistent with this TicDatFactory : %s"%(message or [None])[0])
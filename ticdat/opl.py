@@ -74,7 +74,7 @@ def opl_run(mod_file, input_tdf, input_dat, soln_tdf, infinity=INFINITY, oplrun_
     if os.path.isfile(results_dat):
         os.remove(results_dat)
     with open(datfile, "w") as f:
-        f.write(create_opl_text(input_tdf, input_dat, infinity))
+        write_opl_text(input_tdf, input_dat, f, infinity)
     verify(os.path.isfile(datfile), "Could not create temp.dat")
     with open(os.path.join(working_dir, "ticdat_"+mod_file_name+".mod"), "w") as f:
         f.write("/* Autogenerated input file, created by opl.py on " + time.asctime() + " */\n")
@@ -122,43 +122,62 @@ def create_opl_text(tdf, tic_dat, infinity=INFINITY):
     :param infinity: A number used to represent infinity in OPL
     :return: A string consistent with the OPL .dat format
     """
+    rtn = []
+    _write_opl_text(tdf, tic_dat, rtn.append, infinity)
+    return "".join(rtn)
+
+def write_opl_text(tdf, tic_dat, file_handle, infinity=INFINITY):
+    """
+    Write OPL .dat text for a TicDat object directly to an open file handle
+    :param tdf: A TicDatFactory defining the schema
+    :param tic_dat: A TicDat object consistent with tdf
+    :param file_handle: A writable text mode file handle
+    :param infinity: A number used to represent infinity in OPL
+    :return: None. The text written is identical to that returned by create_opl_text.
+    caveats: The tables are written one row at a time, so the full .dat text is never held in memory.
+    """
+    _write_opl_text(tdf, tic_dat, file_handle.write, infinity)
+
+def _write_opl_text(tdf, tic_dat, write, infinity):
     msg = []
     verify(tdf.good_tic_dat_object(tic_dat, msg.append),
            "tic_dat not a good object for this factory : %s"%"\n".join(msg))
     verify(not tdf.generator_tables, "doesn't work with generator tables.")
     verify(not tdf.generic_tables, "doesn't work with generic tables. (not yet - will add ASAP as needed) ")
-    dict_with_lists = defaultdict(list)
+    infinity_text, inf = str(infinity), float('inf')
+    def value_text(v):
+        if type(v) in (int, float): # fast path for the most common cell types
+            return infinity_text if v == inf else str(v)
+        if type(v) is str or stringish(v):
+            return '"%s"'%v
+        return infinity_text if inf == v else str(v)
+    def table_rows(t):
+        data_fields = tdf.data_fields.get(t, [])
+        if tdf.primary_key_fields.get(t):
+            for k,r in getattr(tic_dat, t).items():
+                yield (list(k) if type(k) is tuple or containerish(k) else [k]) + [r[f] for f in data_fields]
+        else:
+            for r in getattr(tic_dat, t):
+                yield [r[f] for f in data_fields]
     dict_tables = {t for t,pk in tdf.primary_key_fields.items() if pk}
-    for t in dict_tables:
-        for k,r in getattr(tic_dat, t).items():
-            row = list(k) if containerish(k) else [k]
-            for f in tdf.data_fields.get(t, []):
-                row.append(r[f])
-            dict_with_lists[t].append(row)
-    for t in set(tdf.all_tables).difference(dict_tables):
-        for r in getattr(tic_dat, t):
-            row = [r[f] for f in tdf.data_fields[t]]
-            dict_with_lists[t].append(row)
-
-    rtn = ""
-    for i, (t,l) in enumerate(dict_with_lists.items()):
-        rtn += "\n" if i > 0 else ""
-        rtn += "%s = {"%(tdf.opl_prepend + t)
-        if len(l[0]) > 1:
-            rtn += "\n"
-        for x in range(len(l)):
-            r = l[x]
+    first_table = True
+    for t in list(dict_tables) + list(set(tdf.all_tables).difference(dict_tables)):
+        rows = table_rows(t)
+        r = next(rows, None)
+        if r is None: # empty tables are omitted
+            continue
+        write(("" if first_table else "\n") + "%s = {"%(tdf.opl_prepend + t))
+        first_table = False
+        if len(r) > 1:
+            write("\n")
+        while r is not None:
+            next_r = next(rows, None)
             if len(r) > 1:
-                rtn += "<"
-            for i,v in enumerate(r):
-                rtn += ('"%s"'%v if stringish(v) else (str(infinity) if float('inf') == v else str(v))) + (", " if i < len(r)-1 else "")
-            if len(r) == 1 and len(l)-1 != x:
-                rtn += ', '
-            if len(r) > 1:
-                rtn += ">\n"
-        rtn += "};\n"
-
-    return rtn
+                write("<" + ", ".join(map(value_text, r)) + ">\n")
+            elif r:
+                write(value_text(r[0]) + (", " if next_r is not None else ""))
+            r = next_r
+        write("};\n")
 
 def create_opl_mod_text(tdf):
     """
@@ -7,12 +7,21 @@ import json
 
 import os
 from ticdat.utils import freezable_factory, verify, case_space_to_pretty, pd, TicDatError, FrozenDict, all_fields
-from ticdat.utils import all_underscore_replacements, stringish, dictish
+from ticdat.utils import all_underscore_replacements, stringish, dictish, containerish
+from ticdat.utils import _DataDirectory, _open_data_file, _compression_suffix, _compressions, _zip_writer
+from ticdat.utils import _open_zip_member, _projected_read
+from ticdat.sqlitetd import _sql_catalog, _matching_table_names, _write_batch_size, _index_sql, _set_pragmas
+import ticdat.xls as xls
+import ticdat.parquettd as parquettd
+from ticdat.jsontd import _JsonStream, _jsonl_file_path, _jsonl_values, _write_jsonl
 from itertools import product
 from collections import defaultdict
 import inspect
+from io import StringIO, BytesIO
+from multiprocessing.pool import ThreadPool
 
 _longest_sheet = 30 # seems to be an Excel limit with pandas
+_csv_min_chunk_size = 2**22 # csv files are only split into chunks at least this many bytes long
 
 def _sql_con(dbFile):
     verify(sql, "sqlite3 needs to be installed")
@@ -22,6 +31,65 @@ def _sql_con(dbFile):
 def _brackets(l) :
     return ["[%s]"%_ for _ in l]
 
+def _sql_columns(con, table_name):
+    rslt = con.execute("Select * from [%s] where 0"%table_name)
+    if getattr(rslt, "description", None):
+        return [_[0] for _ in rslt.description]
+    return list(rslt.keys())
+
+def _sql_rows(df, fields):
+    """
+    the rows of df as tuples of Python values, with nulls as None. Built column by column, so only
+    the columns that have nulls need to be converted to objects.
+    """
+    columns = []
+    for f in fields:
+        s = df[f]
+        nulls = s.isnull()
+        columns.append(s.astype(object).where(~nulls, None).tolist() if nulls.any() else s.tolist())
+    return zip(*columns)
+
+def _read_csv_chunks(file_path, threads, kwargs):
+    """
+    split a csv file at line boundaries into chunks of at least _csv_min_chunk_size bytes, and parse the
+    chunks in a thread pool. Returns None (so the file can be read in one piece) if the file is too small,
+    has quoted values (which might hold line breaks) or if the chunks don't agree on their column types.
+    """
+    size = os.path.getsize(file_path)
+    chunks = min(threads, size // _csv_min_chunk_size)
+    if chunks < 2:
+        return None
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        bounds = [f.tell()]
+        for i in range(1, chunks):
+            f.seek(max(size * i // chunks, bounds[-1]))
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    if b'"' in header:
+        return None
+    def parse(bound):
+        start, end = bound
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        if b'"' in data:
+            return None
+        return pd.read_csv(BytesIO(header + data), **kwargs)
+    pool = ThreadPool(chunks)
+    try:
+        frames = pool.map(parse, zip(bounds[:-1], bounds[1:]))
+    finally:
+        pool.close()
+    if any(df is None for df in frames):
+        return None
+    for c in frames[0].columns:
+        kinds = {df[c].dtype.kind for df in frames}
+        if "O" in kinds and len(kinds) > 1:
+            return None
+    return pd.concat(frames, ignore_index=True)
+
 class _DummyContextManager(object):
     def __init__(self, *args, **kwargs):
         pass
@@ -68,7 +136,7 @@ class OpalyticsPanFactory(freezable_factory(object, "_isFrozen")) :
                            badly_matched)
             return False
         return True
-    def create_pan_dat(self, inputset, raw_data=False, freeze_it=False):
+    def create_pan_dat(self, inputset, raw_data=False, freeze_it=False, tables=None, fields=None):
         """
         Create a PanDat object from an opalytics inputset
 
@@ -79,8 +147,18 @@ class OpalyticsPanFactory(freezable_factory(object, "_isFrozen")) :
                          removing data type failures, data row predicate failures, foreign key
                          failures, duplicated rows and deactivated records.
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
         :return: a PanDat object populated by the tables as they are rendered by inputset
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                                   read=lambda pdf: pdf.opalytics.create_pan_dat(inputset, raw_data))
         message = []
         verify(self._good_inputset(inputset, message.append),
                "inputset is inconsistent with this PanDatFactory : %s"%(message or [None])[0])
@@ -119,6 +197,12 @@ class OpalyticsPanFactory(freezable_factory(object, "_isFrozen")) :
                 pass
         return rtn
 
+def _json_default(x):
+    # numpy scalars that found their way into object columns
+    if hasattr(x, "item"):
+        return x.item()
+    raise TypeError("%s is not JSON serializable"%repr(x))
+
 class JsonPanFactory(freezable_factory(object, "_isFrozen")):
     """
     Primary class for reading/writing json data with PanDat objects.
@@ -139,11 +223,12 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
         assert "orient" in to_json_args
         self._modern_pandas = "index" in to_json_args
         self._isFrozen = True
-    def create_pan_dat(self, path_or_buf, fill_missing_fields=False, orient='split', **kwargs):
+    def create_pan_dat(self, path_or_buf, fill_missing_fields=False, orient='split', tables=None, fields=None, **kwargs):
         """
         Create a PanDat object from a SQLite database file
 
-        :param path_or_buf:  a valid JSON string or file-like
+        :param path_or_buf:  a valid JSON string or file-like. Files ending with ".gz", ".bz2" or ".xz"
+                             are decompressed as they are read.
 
         :param fill_missing_fields: boolean. If truthy, missing fields will be filled in
                                     with their default value. Otherwise, missing fields
@@ -151,6 +236,13 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
 
         :param orient: Indication of expected JSON string format. See pandas.read_json for more details.
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
         :param kwargs: additional named arguments to pass to pandas.read_json
 
         :return: a PanDat object populated by the matching tables.
@@ -161,20 +253,19 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
                  (ticdat supports whitespace in field names but not table names).
                  +- "inf", "-inf" strings will be converted to +-float("inf")
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                read=lambda pdf: pdf.json.create_pan_dat(path_or_buf, fill_missing_fields, orient, **kwargs))
+        verify("orient" not in kwargs, "orient should be passed as a non-kwargs argument")
         if os.path.exists(path_or_buf):
             verify(os.path.isfile(path_or_buf), "%s appears to be a directory and not a file." % path_or_buf)
-            with open(path_or_buf, "r") as f:
-                loaded_dict = json.load(f)
+            with _open_data_file(path_or_buf, "r") as f:
+                frames, keys = self._read_frames(f, orient, kwargs)
         else:
             verify(stringish(path_or_buf), "%s isn't a string" % path_or_buf)
-            loaded_dict = json.loads(path_or_buf)
-        verify(dictish(loaded_dict), "path_or_buf to json.load as a dict")
-        verify(all(map(dictish, loaded_dict.values())),
-               "the json.load result doesn't resolve to a dictionary whose values are themselves dictionaries")
-
-        tbl_names = self._get_table_names(loaded_dict)
-        verify("orient" not in kwargs, "orient should be passed as a non-kwargs argument")
-        rtn = {t: pd.read_json(json.dumps(loaded_dict[f]), orient=orient, **kwargs) for t,f in tbl_names.items()}
+            frames, keys = self._read_frames(StringIO(path_or_buf), orient, kwargs)
+        tbl_names = self._get_table_names(keys)
+        rtn = {t: frames[f] for t,f in tbl_names.items()}
         missing_fields = {(t, f) for t in rtn for f in all_fields(self.pan_dat_factory, t)
                           if f not in rtn[t].columns}
         if fill_missing_fields:
@@ -182,13 +273,69 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
                 rtn[t][f] = self.pan_dat_factory.default_values[t][f]
         verify(fill_missing_fields or not missing_fields,
                "The following (table, field) pairs are missing fields.\n%s" % [(t, f) for t,f in missing_fields])
-        for v in rtn.values():
-            v.replace("inf", float("inf"), inplace=True)
-            v.replace("-inf", -float("inf"), inplace=True)
+        for t, df in rtn.items():
+            for f in self._inf_candidates(t, df):
+                df[f] = df[f].mask(df[f] == "inf", float("inf")).mask(df[f] == "-inf", -float("inf")).infer_objects()
         rtn = self.pan_dat_factory.PanDat(**rtn)
         msg = []
         assert self.pan_dat_factory.good_pan_dat_object(rtn, msg.append), str(msg)
         return rtn
+    def _read_frames(self, f, orient, kwargs):
+        """
+        stream the json dictionary one entry at a time, turning each entry that matches a table
+        into a DataFrame before the next one is decoded, and skipping the other entries.
+
+        :return: the DataFrames keyed by their json keys, and all the keys of the dictionary
+        """
+        table_keys = {t.lower() for t in self.pan_dat_factory.all_tables}
+        stream, frames, keys = _JsonStream(f), {}, []
+        try:
+            verify(stream.peek() == "{", "path_or_buf to json.load as a dict")
+            for key in stream.keys():
+                keys.append(key)
+                verify(stream.peek() == "{" or (orient == "records" and stream.peek() == "["),
+                       "the json.load result doesn't resolve to a dictionary " +
+                       "whose values are themselves dictionaries")
+                if key.lower().replace(" ", "_") in table_keys:
+                    frames[key] = self._json_frame(stream.value(), orient, kwargs)
+                else:
+                    stream.skip()
+            stream.verify_end()
+        except ValueError as e:
+            raise TicDatError("Unable to interpret json : %s"%e)
+        return frames, keys
+    def _json_frame(self, value, orient, kwargs):
+        """
+        build the DataFrame for a decoded json table directly, rather than re-encoding the
+        table so pandas.read_json can parse it. Falls back to pandas.read_json for the orients
+        (and read_json arguments) this doesn't handle.
+        """
+        if kwargs or orient not in ("split", "records", "columns"):
+            return pd.read_json(json.dumps(value), orient=orient, **kwargs)
+        if orient == "split":
+            verify(dictish(value) and set(value).issubset({"columns", "index", "data"}),
+                   "split orient tables need to be dictionaries of columns, index and data")
+            return pd.DataFrame(value.get("data", []), columns=value.get("columns"), index=value.get("index"))
+        if orient == "records":
+            verify(containerish(value) and all(map(dictish, value)),
+                   "records orient tables need to be lists of dictionaries")
+            return pd.DataFrame(value)
+        verify(dictish(value) and all(map(dictish, value.values())),
+               "columns orient tables need to be dictionaries of dictionaries")
+        rtn = pd.DataFrame(value)
+        try:
+            rtn.index = rtn.index.astype("int64")
+        except (TypeError, ValueError):
+            pass
+        return rtn
+    def _inf_candidates(self, table, df):
+        """
+        the columns of df that might hold "inf" and "-inf" strings that are meant as numbers
+        """
+        fields = set(all_fields(self.pan_dat_factory, table))
+        data_types = self.pan_dat_factory.data_types.get(table, {})
+        return [c for c in df.columns if df[c].dtype == object and
+                (not fields or (c in fields and (c not in data_types or data_types[c].number_allowed)))]
     def _get_table_names(self, loaded_dict):
         rtn = {}
         for table in self.pan_dat_factory.all_tables:
@@ -198,14 +345,14 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
             rtn[table] = rtn[table][0]
         return rtn
     def write_file(self, pan_dat, json_file_path, case_space_table_names=False, orient='split',
-                   index=False, indent=None, sort_keys=False, **kwargs):
+                   index=False, indent=None, sort_keys=False, compress_threads=1, **kwargs):
         """
         write the PanDat data to a collection of csv files
 
         :param pan_dat: the PanDat object to write
 
         :param json_file_path: the json file into which the data is to be written. If falsey, will return a
-                               JSON  string
+                               JSON  string. If it ends with ".gz", ".bz2" or ".xz", the file will be compressed.
 
         :param case_space_table_names: boolean - make best guesses how to add spaces and upper case
                                        characters to table names
@@ -218,6 +365,8 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
 
         :param sort_keys: See json.dumps
 
+        :param compress_threads: positive integer. The number of threads used to compress the file.
+
         :param kwargs: additional named arguments to pass to pandas.to_json
 
         :return:
@@ -240,14 +389,142 @@ class JsonPanFactory(freezable_factory(object, "_isFrozen")):
         for t in self.pan_dat_factory.all_tables:
             df = getattr(pan_dat, t).replace(float("inf"), "inf").replace(-float("inf"), "-inf")
             k = case_space_to_pretty(t) if case_space_table_names else t
-            rtn[k] = json.loads(df.to_json(path_or_buf=None, orient=orient, **kwargs))
+            if orient in ("split", "records", "columns") and set(kwargs).issubset({"index"}):
+                rtn[k] = self._json_structure(df, orient, index)
+            else:
+                rtn[k] = json.loads(df.to_json(path_or_buf=None, orient=orient, **kwargs))
             if orient == 'split' and not index:
                 rtn[k].pop("index", None)
         if json_file_path:
-            with open(json_file_path, "w") as f:
-                json.dump(rtn, f, indent=indent, sort_keys=sort_keys)
+            with _open_data_file(json_file_path, "w", compress_threads) as f:
+                json.dump(rtn, f, indent=indent, sort_keys=sort_keys, default=_json_default)
         else:
-            return json.dumps(rtn, indent=indent, sort_keys=sort_keys)
+            return json.dumps(rtn, indent=indent, sort_keys=sort_keys, default=_json_default)
+    def create_pan_dat_from_jsonl(self, dir_path, fill_missing_fields=False, tables=None, fields=None):
+        """
+        Create a PanDat object from a directory of JSON Lines files
+
+        :param dir_path: the directory containing the .jsonl (or compressed .jsonl.gz, .jsonl.bz2 or .jsonl.xz)
+                         files, one file per table.
+
+        :param fill_missing_fields: boolean. If truthy, missing fields will be filled in
+                                    with their default value. Otherwise, missing fields
+                                    throw an Exception.
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :return: a PanDat object populated by the matching tables.
+
+        caveats: Missing tables always throw an Exception.
+                 Table names are matched with case-space insensitivity, but spaces
+                 are respected for field names.
+                 Each line is either a list of the table's field values (primary key fields first)
+                 or a dictionary keyed by field name.
+                 An incomplete last line (i.e. one that is still being appended) is ignored.
+                 +- "inf", "-inf" strings will be converted to +-float("inf")
+        """
+        if tables is not None or fields is not None:
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                                   read=lambda pdf: pdf.json.create_pan_dat_from_jsonl(dir_path, fill_missing_fields))
+        verify(os.path.isdir(dir_path), "%s not a directory path"%dir_path)
+        rtn = {}
+        for t in self.pan_dat_factory.all_tables:
+            file_path = _jsonl_file_path(dir_path, t)
+            verify(file_path, "Unable to recognize table %s" % t)
+            fields = list(all_fields(self.pan_dat_factory, t))
+            values = list(_jsonl_values(file_path))
+            verify(all(dictish(_) or (containerish(_) and len(_) == len(fields)) for _ in values),
+                   "Each row of %s needs to either be a dictionary, or a list of %s values"%(file_path, len(fields)))
+            if not any(map(dictish, values)):
+                rtn[t] = pd.DataFrame(values, columns=fields)
+            else:
+                values = [_ if dictish(_) else dict(zip(fields, _)) for _ in values]
+                rtn[t] = pd.DataFrame.from_records(values, columns=self._jsonl_columns(t, values))
+        missing_fields = {(t, f) for t in rtn for f in all_fields(self.pan_dat_factory, t)
+                          if f not in rtn[t].columns}
+        if fill_missing_fields:
+            for t,f in missing_fields:
+                rtn[t][f] = self.pan_dat_factory.default_values[t][f]
+        verify(fill_missing_fields or not missing_fields,
+               "The following (table, field) pairs are missing fields.\n%s" % [(t, f) for t,f in missing_fields])
+        for t, df in rtn.items():
+            for f in self._inf_candidates(t, df):
+                df[f] = df[f].mask(df[f] == "inf", float("inf")).mask(df[f] == "-inf", -float("inf")).infer_objects()
+        rtn = self.pan_dat_factory.PanDat(**rtn)
+        msg = []
+        assert self.pan_dat_factory.good_pan_dat_object(rtn, msg.append), str(msg)
+        return rtn
+    def _jsonl_columns(self, table, records):
+        """
+        the columns for a table read from dictionary rows - the schema fields that appear, followed
+        by any other keys in the order they were first seen
+        """
+        keys = {}
+        for record in records:
+            for k in record:
+                keys.setdefault(k, len(keys))
+        fields = [f for f in all_fields(self.pan_dat_factory, table) if f in keys]
+        return fields + sorted(set(keys).difference(fields), key=keys.get)
+    def write_jsonl_directory(self, pan_dat, dir_path, case_space_table_names=False, append=False):
+        """
+        write the PanDat data to a directory of JSON Lines files, one .jsonl file per table
+
+        :param pan_dat: the PanDat object to write
+
+        :param dir_path: the directory in which to write the .jsonl files. Will be created if need be.
+
+        :param case_space_table_names: boolean - make best guesses how to add spaces and upper case
+                                       characters to table names
+
+        :param append: boolean - if truthy, the rows are appended to any existing files
+
+        :return:
+
+        caveats:  Tables with a defined schema are written as lists of field values, one row per line.
+                  Tables without a defined schema are written as dictionaries.
+                  +-float("inf") will be converted to "inf", "-inf"
+        """
+        msg = []
+        verify(self.pan_dat_factory.good_pan_dat_object(pan_dat, msg.append),
+               "pan_dat not a good object for this factory : %s"%"\n".join(msg))
+        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        if not os.path.isdir(dir_path):
+            os.mkdir(dir_path)
+        case_space_table_names = case_space_table_names and \
+                                 len(set(self.pan_dat_factory.all_tables)) == \
+                                 len(set(map(case_space_to_pretty, self.pan_dat_factory.all_tables)))
+        for t in self.pan_dat_factory.all_tables:
+            fields = list(all_fields(self.pan_dat_factory, t))
+            df = getattr(pan_dat, t)
+            df = (df[fields] if fields else df).replace(float("inf"), "inf").replace(-float("inf"), "-inf")
+            rows = self._json_structure(df, "split" if fields else "records", False)
+            file_path = os.path.join(dir_path, (case_space_to_pretty(t) if case_space_table_names else t) + ".jsonl")
+            _write_jsonl(file_path, rows["data"] if fields else rows, append, _json_default)
+
+    def _json_structure(self, df, orient, index):
+        """
+        the json ready structure that df.to_json(orient=orient) would encode, built directly from
+        the DataFrame. Nulls become None and datetimes become epoch milliseconds, as with to_json.
+        Unlike to_json, floats keep their full precision.
+        """
+        df = df.copy(deep=False)
+        for c, dtype in zip(df.columns, df.dtypes):
+            if dtype.kind in "mM":
+                epoch_ms = pd.Series(df[c].values.astype("int64") // 10**6, index=df.index).astype(object)
+                df[c] = epoch_ms.where(df[c].notnull(), None)
+        rows = df.astype(object).where(df.notnull(), None).values.tolist()
+        columns = list(df.columns)
+        if orient == "split":
+            return dict({"columns": columns, "data": rows}, **({"index": df.index.tolist()} if index else {}))
+        if orient == "records":
+            return [dict(zip(columns, row)) for row in rows]
+        index_keys = list(map(str, df.index))
+        return {c: dict(zip(index_keys, (row[i] for row in rows))) for i, c in enumerate(columns)}
 
 class CsvPanFactory(freezable_factory(object, "_isFrozen")):
     """
@@ -268,17 +545,27 @@ class CsvPanFactory(freezable_factory(object, "_isFrozen")):
         """
         self.pan_dat_factory = pan_dat_factory
         self._isFrozen = True
-    def create_pan_dat(self, dir_path, fill_missing_fields=False, **kwargs):
+    def create_pan_dat(self, dir_path, fill_missing_fields=False, threads=1, tables=None, fields=None, **kwargs):
         """
         Create a PanDat object from a SQLite database file
 
-        :param db_file_path: the directory containing the .csv files.
+        :param db_file_path: the directory containing the .csv files, or a .zip archive of them.
 
         :param fill_missing_fields: boolean. If truthy, missing fields will be filled in
                                     with their default value. Otherwise, missing fields
                                     throw an Exception.
 
-        :param kwargs: additional named arguments to pass to pandas.read_csv
+        :param threads: positive integer. Large csv files are split into (at most) this many chunks,
+                        which are parsed in parallel.
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param kwargs: additional named arguments to pass to pandas.read_csv (such as engine)
 
         :return: a PanDat object populated by the matching tables.
 
@@ -286,10 +573,24 @@ class CsvPanFactory(freezable_factory(object, "_isFrozen")):
                  Table names are matched with case-space insensitivity, but spaces
                  are respected for field names.
                  (ticdat supports whitespace in field names but not table names).
+                 Unless kwargs says otherwise, only the columns of the schema fields are read
+                 (for tables whose fields are specified), fields whose data types allow only strings
+                 are read as strings, fields whose data types allow only non-integer numbers are read
+                 as floats and non-nullable integer fields are read as integers (unless they have blank or
+                 non-integer entries). The numeric fields are parsed with pandas type inference and
+                 cast afterwards, so a bad entry is left for find_data_type_failures to report.
+                 A file is only split into chunks if kwargs holds nothing more than engine, sep,
+                 delimiter or encoding and the file has no quoted values.
+                 Files compressed as .csv.gz, .csv.bz2 or .csv.xz are decompressed as they are read.
         """
-        verify(os.path.isdir(dir_path), "%s not a directory path"%dir_path)
-        tbl_names = self._get_table_names(dir_path)
-        rtn = {t: pd.read_csv(f, **kwargs) for t,f in tbl_names.items()}
+        if tables is not None or fields is not None:
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                read=lambda pdf: pdf.csv.create_pan_dat(dir_path, fill_missing_fields, threads, **kwargs))
+        verify(os.path.isdir(dir_path) or os.path.isfile(dir_path), "%s not a directory path"%dir_path)
+        verify(isinstance(threads, int) and threads >= 1, "threads needs to be a positive integer")
+        data_dir = _DataDirectory(dir_path)
+        tbl_names = self._get_table_names(data_dir)
+        rtn = {t: self._read_csv(t, data_dir, f, threads, kwargs) for t,f in tbl_names.items()}
         missing_fields = {(t, f) for t in rtn for f in all_fields(self.pan_dat_factory, t)
                           if f not in rtn[t].columns}
         if fill_missing_fields:
@@ -302,37 +603,86 @@ class CsvPanFactory(freezable_factory(object, "_isFrozen")):
         msg = []
         assert self.pan_dat_factory.good_pan_dat_object(rtn, msg.append), str(msg)
         return rtn
-    def _get_table_names(self, dir_path):
+    def _read_csv(self, table, data_dir, file_name, threads, kwargs):
+        """
+        read one csv file with the usecols and string dtypes implied by the schema, in parallel chunks if
+        it's large enough, and then cast the numeric fields in memory.
+        """
+        suffix = _compression_suffix(file_name)
+        file_path = None if data_dir.is_zip else os.path.join(data_dir.path, file_name)
+        def read_csv(kwargs_):
+            if file_path:
+                return pd.read_csv(file_path, **kwargs_)
+            with data_dir.open_binary(file_name) as f:
+                return pd.read_csv(f, **dict({"compression": _compressions.get(suffix)}, **kwargs_))
+        hints = {}
+        fields = set(all_fields(self.pan_dat_factory, table))
+        if fields:
+            hints["usecols"] = lambda c : c in fields
+        dtype, numbers = {}, {}
+        for f, dt in self.pan_dat_factory.data_types.get(table, {}).items():
+            if not dt.number_allowed and dt.strings_allowed:
+                dtype[f] = str
+            elif dt.number_allowed and not dt.strings_allowed and "dtype" not in kwargs:
+                numbers[f] = "int64" if dt.must_be_int and not dt.nullable else "float64"
+        if dtype:
+            hints["dtype"] = dtype
+        kwargs_ = dict(hints, **kwargs)
+        rtn = None
+        if threads > 1 and file_path and not suffix and \
+           set(kwargs).issubset({"engine", "sep", "delimiter", "encoding"}):
+            rtn = _read_csv_chunks(file_path, threads, kwargs_)
+        if rtn is None:
+            rtn = read_csv(kwargs_)
+        for f, type_ in numbers.items():
+            # a column with a bad entry is parsed as objects, and left for find_data_type_failures
+            if f in rtn.columns and rtn[f].dtype.kind in "iuf":
+                if type_ == "float64":
+                    rtn[f] = rtn[f].astype(float)
+                elif rtn[f].dtype.kind == "f" and rtn[f].notnull().all() and (rtn[f] % 1 == 0).all():
+                    rtn[f] = rtn[f].astype("int64")
+        return rtn
+    def _get_table_names(self, data_dir):
         rtn = {}
+        file_names = data_dir.file_names()
         for table in self.pan_dat_factory.all_tables:
-            rtn[table] = [path for f in os.listdir(dir_path) for path in [os.path.join(dir_path, f)]
-                          if os.path.isfile(path) and
-                          f.lower().replace(" ", "_") == "%s.csv"%table.lower()]
+            names = {"%s.csv%s"%(table.lower(), _) for _ in [""] + list(_compressions)}
+            rtn[table] = [f for f in file_names if f.lower().replace(" ", "_") in names]
             verify(len(rtn[table]) >= 1, "Unable to recognize table %s" % table)
             verify(len(rtn[table]) <= 1, "Multiple possible csv files found for table %s" % table)
             rtn[table] = rtn[table][0]
         return rtn
-    def write_directory(self, pan_dat, dir_path, case_space_table_names=False, index=False, **kwargs):
+    def write_directory(self, pan_dat, dir_path, case_space_table_names=False, index=False, compression=None,
+                        compress_threads=1, **kwargs):
         """
         write the PanDat data to a collection of csv files
 
         :param pan_dat: the PanDat object to write
 
-        :param dir_path: the directory in which to write the csv files
-                             Set to falsey if using con argument.
+        :param dir_path: the directory in which to write the csv files. If it ends with .zip, then
+                         a zip archive of the csv files is written instead.
 
         :param case_space_table_names: boolean - make best guesses how to add spaces and upper case
                                        characters to table names
 
         :param index: boolean - whether or not to write the index.
 
+        :param compression: None, "gz" (or "gzip"), "bz2" or "xz". If not None, each file is compressed,
+                            with the matching suffix appended to its .csv extension.
+                            (Ignored for zip archives, whose members are always deflated).
+
+        :param compress_threads: positive integer. The number of threads used to compress each file.
+
         :param kwargs: additional named arguments to pass to pandas.to_csv
 
         :return:
 
         caveats: The row names (index) isn't written (unless kwargs indicates it should be).
         """
-        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        is_zip = dir_path.lower().endswith(".zip")
+        verify(is_zip or not os.path.isfile(dir_path), "A file is not a valid directory path")
+        suffixes = {None: "", "gz": ".gz", "gzip": ".gz", "bz2": ".bz2", "xz": ".xz"}
+        verify(compression in suffixes, "compression needs to be None, gz, bz2 or xz")
         msg = []
         verify(self.pan_dat_factory.good_pan_dat_object(pan_dat, msg.append),
                "pan_dat not a good object for this factory : %s"%"\n".join(msg))
@@ -341,11 +691,22 @@ class CsvPanFactory(freezable_factory(object, "_isFrozen")):
         case_space_table_names = case_space_table_names and \
                                  len(set(self.pan_dat_factory.all_tables)) == \
                                  len(set(map(case_space_to_pretty, self.pan_dat_factory.all_tables)))
+        file_name = lambda t : (case_space_to_pretty(t) if case_space_table_names else t) + ".csv"
+        if is_zip:
+            with _zip_writer(dir_path) as zf:
+                for t in self.pan_dat_factory.all_tables :
+                    with _open_zip_member(zf, file_name(t)) as f:
+                        getattr(pan_dat, t).to_csv(f, **kwargs)
+            return
         if not os.path.isdir(dir_path) :
             os.mkdir(dir_path)
         for t in self.pan_dat_factory.all_tables :
-            f = os.path.join(dir_path, (case_space_to_pretty(t) if case_space_table_names else t) + ".csv")
-            getattr(pan_dat, t).to_csv(f, **kwargs)
+            f = os.path.join(dir_path, file_name(t) + suffixes[compression])
+            if not compression:
+                getattr(pan_dat, t).to_csv(f, **kwargs)
+                continue
+            with _open_data_file(f, "w", compress_threads) as f_:
+                getattr(pan_dat, t).to_csv(f_, **kwargs)
 
 class SqlPanFactory(freezable_factory(object, "_isFrozen")):
     """
@@ -365,7 +726,8 @@ class SqlPanFactory(freezable_factory(object, "_isFrozen")):
         """
         self.pan_dat_factory = pan_dat_factory
         self._isFrozen = True
-    def create_pan_dat(self, db_file_path, con=None, fill_missing_fields=False):
+    def create_pan_dat(self, db_file_path, con=None, fill_missing_fields=False, chunksize=None, where=None,
+                       tables=None, fields=None):
         """
         Create a PanDat object from a SQLite database file
 
@@ -378,24 +740,54 @@ class SqlPanFactory(freezable_factory(object, "_isFrozen")):
                                     with their default value. Otherwise, missing fields
                                     throw an Exception.
 
+        :param chunksize: None or a positive integer. If an integer, each table is read this many rows
+                          at a time, and the chunks are concatenated as they arrive.
+
+        :param where: None or a dictionary mapping table names to SQL where clauses. Only the rows
+                      matching the where clause are read for those tables. A clause can be a string,
+                      or a (clause, parameters) pair whose clause uses ? for the parameters.
+                      Ex: {"foods": ("[cost] > ?", [2])}
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
         :return: a PanDat object populated by the matching tables.
 
         caveats: Missing tables always throw an Exception.
                  Table names are matched with case-space insensitivity, but spaces
                  are respected for field names.
                  (ticdat supports whitespace in field names but not table names).
+                 Only the fields in the schema are read (unless the table has no defined fields).
+                 Fields whose data types only allow non-integer numbers are read as floats.
         """
+        if tables is not None or fields is not None:
+            where = {t: w for t, w in (where or {}).items() if tables is None or t in tables}
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                read=lambda pdf: pdf.sql.create_pan_dat(db_file_path, con, fill_missing_fields, chunksize, where))
         verify(bool(db_file_path) != bool(con),
                "use either the con argument or the db_file_path argument but not both")
         if db_file_path:
             verify(os.path.exists(db_file_path) and not os.path.isdir(db_file_path),
                    "%s not a file path"%db_file_path)
+        verify(chunksize is None or (isinstance(chunksize, int) and chunksize > 0),
+               "chunksize needs to be None or a positive integer")
+        where = where or {}
+        verify(dictish(where) and all(stringish(_) or (containerish(_) and len(_) == 2 and stringish(_[0])
+                                                        and containerish(_[1])) for _ in where.values()),
+               "where needs to be a dictionary mapping table names to where clauses or (clause, parameters) pairs")
+        where = {t: (w, ()) if stringish(w) else tuple(w) for t, w in where.items()}
+        bad_tables = set(where).difference(self.pan_dat_factory.all_tables)
+        verify(not bad_tables, "Unrecognized tables in where : %s"%list(bad_tables))
         rtn = {}
         con_maker = lambda: _sql_con(db_file_path) if db_file_path else _DummyContextManager(con)
         with con_maker() as _:
             con_ = con or _
             for t, s in self._get_table_names(con_).items():
-                rtn[t] = pd.read_sql(sql="Select * from [%s]"%s, con=con_)
+                rtn[t] = self._read_table(con_, t, s, chunksize, *where.get(t, (None, ())))
         missing_fields = {(t, f) for t in rtn for f in all_fields(self.pan_dat_factory, t)
                           if f not in rtn[t].columns}
         if fill_missing_fields:
@@ -407,21 +799,53 @@ class SqlPanFactory(freezable_factory(object, "_isFrozen")):
         msg = []
         assert self.pan_dat_factory.good_pan_dat_object(rtn, msg.append), str(msg)
         return rtn
+    def _read_table(self, con, table, sql_table, chunksize, where, parameters):
+        """
+        read the schema fields of a SQL table, casting each chunk to the dtypes implied by the data types
+        """
+        columns = _sql_columns(con, sql_table)
+        select = [f for f in all_fields(self.pan_dat_factory, table) if f in columns] or columns
+        sql = "Select %s from [%s]"%(", ".join(_brackets(select)), sql_table)
+        if where:
+            sql += " where %s"%where
+        floats = [f for f, dt in self.pan_dat_factory.data_types.get(table, {}).items()
+                  if f in select and dt.number_allowed and not dt.strings_allowed and not dt.must_be_int]
+        def typed(df):
+            for f in floats:
+                try:
+                    df[f] = df[f].astype(float)
+                except (TypeError, ValueError):
+                    pass # the data type failure will be reported by find_data_type_failures
+            return df
+        if not chunksize:
+            return typed(pd.read_sql(sql=sql, con=con, params=list(parameters)))
+        chunks = [typed(df) for df in pd.read_sql(sql=sql, con=con, params=list(parameters), chunksize=chunksize)]
+        if not chunks:
+            return typed(pd.DataFrame(columns=select))
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
     def _get_table_names(self, con):
         rtn = {}
+        try:
+            catalog = _sql_catalog(con)
+        except Exception:
+            catalog = None # not a SQLite connection, so fall back to probing the candidate names
         def try_name(name):
             try :
-                con.execute("Select * from [%s]"%name)
+                con.execute("Select * from [%s] where 0"%name)
             except :
                 return False
             return True
         for table in self.pan_dat_factory.all_tables:
-            rtn[table] = [t for t in all_underscore_replacements(table) if try_name(t)]
+            if catalog is not None:
+                rtn[table] = _matching_table_names(catalog, table)
+            else:
+                rtn[table] = [t for t in all_underscore_replacements(table) if try_name(t)]
             verify(len(rtn[table]) >= 1, "Unable to recognize table %s" % table)
             verify(len(rtn[table]) <= 1, "Multiple possible tables found for table %s" % table)
             rtn[table] = rtn[table][0]
         return rtn
-    def write_file(self, pan_dat, db_file_path, con=None, if_exists='replace', case_space_table_names=False):
+    def write_file(self, pan_dat, db_file_path, con=None, if_exists='replace', case_space_table_names=False,
+                   bulk=False, chunksize=None, pragmas=None, extra_indexes=None):
         """
 
         write the PanDat data to an excel file
@@ -439,10 +863,27 @@ class SqlPanFactory(freezable_factory(object, "_isFrozen")):
         :param case_space_table_names: boolean - make best guesses how to add spaces and upper case
                                           characters to table names
 
+        :param bulk: boolean. If truthy, the tables are created from the schema of the PanDatFactory
+                     (with primary keys) and the rows are loaded with executemany in a single transaction.
+                     Only SQLite files and sqlite3.Connection objects support bulk writing.
+
+        :param chunksize: None or a positive integer. The number of rows inserted at a time.
+
+        :param pragmas: optional dictionary of PRAGMA settings to apply to the connection before bulk
+                        writing, as with TicDatFactory.sql.write_db_data. Only for bulk writing.
+
+        :param extra_indexes: optional dictionary of table name to a list of field name lists. Each
+                              field name list will be indexed, along with the foreign key fields.
+                              Only for bulk writing.
+
         :return:
 
-        caveats: The row names (index) isn't written. The default pandas schema generation is used,
-                 and thus foreign key relationships aren't written.
+        caveats: The row names (index) isn't written. Unless bulk is truthy, the default pandas schema
+                 generation is used, and thus primary keys and foreign key relationships aren't written.
+                 When bulk is truthy, the foreign key fields are indexed after the rows are loaded,
+                 and then ANALYZE is run so the query planner can make use of the indexes. Duplicated
+                 primary keys will throw an Exception. Pragmas applied to a con argument remain in
+                 effect on that connection.
         """
         # The code to generate foreign keys is written and tested as part of TicDatFactory, and
         # thus this shortcoming could be easily rectified if need be).
@@ -458,12 +899,59 @@ class SqlPanFactory(freezable_factory(object, "_isFrozen")):
         case_space_table_names = case_space_table_names and \
                                  len(set(self.pan_dat_factory.all_tables)) == \
                                  len(set(map(case_space_to_pretty, self.pan_dat_factory.all_tables)))
+        verify(if_exists in ("fail", "replace", "append"), "if_exists needs to be 'fail', 'replace' or 'append'")
+        verify(chunksize is None or (isinstance(chunksize, int) and chunksize > 0),
+               "chunksize needs to be None or a positive integer")
+        verify(not bulk or db_file_path or (sql and isinstance(con, sql.Connection)),
+               "bulk writing needs either a SQLite file path or a sqlite3.Connection")
+        verify(bulk or not (pragmas or extra_indexes), "pragmas and extra_indexes are only for bulk writing")
+        table_names = {t: case_space_to_pretty(t) if case_space_table_names else t
+                       for t in self.pan_dat_factory.all_tables}
         con_maker = lambda: _sql_con(db_file_path) if db_file_path else _DummyContextManager(con)
         with con_maker() as _:
             con_ = con or _
+            if bulk:
+                self._bulk_write(pan_dat, con_, table_names, if_exists, chunksize or _write_batch_size,
+                                 pragmas, extra_indexes)
+                return
             for t in self.pan_dat_factory.all_tables:
-                getattr(pan_dat, t).to_sql(name=case_space_to_pretty(t) if case_space_table_names else t,
-                                           con=con_, if_exists=if_exists, index=False)
+                getattr(pan_dat, t).to_sql(name=table_names[t], con=con_, if_exists=if_exists, index=False,
+                                           chunksize=chunksize)
+    def _sql_type(self, table, field):
+        dt = self.pan_dat_factory.data_types.get(table, {}).get(field)
+        if not dt or (dt.number_allowed and dt.strings_allowed):
+            return ""
+        if not dt.number_allowed:
+            return " TEXT"
+        # INT rather than INTEGER, so a single primary key field doesn't become an alias for the rowid
+        return " INT" if dt.must_be_int else " FLOAT"
+    def _bulk_write(self, pan_dat, con, table_names, if_exists, chunksize, pragmas, extra_indexes):
+        pdf = self.pan_dat_factory
+        existing = {_[0].lower() for _ in con.execute("Select name from sqlite_master where type='table'")}
+        index_sql = _index_sql(pdf, [(fk.native_table, fk.nativefields()) for fk in pdf.foreign_keys],
+                               pdf.all_tables, extra_indexes, table_names)
+        _set_pragmas(con, pragmas)
+        try:
+            with con:
+                for t, name in table_names.items():
+                    df = getattr(pan_dat, t)
+                    fields = list(all_fields(pdf, t)) or list(df.columns)
+                    verify(if_exists != "fail" or name.lower() not in existing, "Table %s already exists"%name)
+                    if if_exists == "replace":
+                        con.execute("DROP TABLE IF EXISTS [%s]"%name)
+                    columns = ["[%s]%s"%(f, self._sql_type(t, f)) for f in fields]
+                    if pdf.primary_key_fields.get(t):
+                        columns.append("PRIMARY KEY(%s)"%",".join(_brackets(pdf.primary_key_fields[t])))
+                    con.execute("CREATE TABLE IF NOT EXISTS [%s] (%s)"%(name, ", ".join(columns)))
+                    insert = "INSERT INTO [%s] (%s) VALUES (%s)"%(name, ",".join(_brackets(fields)),
+                                                                  ",".join("?" for _ in fields))
+                    for i in range(0, len(df), chunksize):
+                        con.executemany(insert, _sql_rows(df.iloc[i:i+chunksize], fields))
+                for str_ in index_sql:
+                    con.execute(str_)
+                con.execute("ANALYZE")
+        except sql.IntegrityError as e:
+            raise TicDatError("Unable to bulk write the data : %s"%e)
 
 class XlsPanFactory(freezable_factory(object, "_isFrozen")):
     """
@@ -484,7 +972,7 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
         self.pan_dat_factory = pan_dat_factory
         self._isFrozen = True
 
-    def create_pan_dat(self, xls_file_path, fill_missing_fields=False):
+    def create_pan_dat(self, xls_file_path, fill_missing_fields=False, tables=None, fields=None):
         """
         Create a PanDat object from an Excel file
 
@@ -495,6 +983,13 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
                                     with their default value. Otherwise, missing fields
                                     throw an Exception.
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
         :return: a PanDat object populated by the matching sheets.
 
         caveats: Missing sheets resolve to an empty table, but missing fields
@@ -502,10 +997,19 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
                  Table names are matched to sheets with with case-space insensitivity, but spaces and
                  case are respected for field names.
                  (ticdat supports whitespace in field names but not table names).
+                 The workbook is parsed once for all the sheets. Only the columns of the schema
+                 fields are read (for tables whose fields are specified). Fields whose data types
+                 allow only strings are read as strings, and fields whose data types allow only
+                 non-integer numbers are read as floats (unless that fails, in which case
+                 the sheet is read with pandas type inference).
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                                   read=lambda pdf: pdf.xls.create_pan_dat(xls_file_path, fill_missing_fields))
         rtn = {}
-        for t, s in self._get_sheet_names(xls_file_path).items():
-            rtn[t] = pd.read_excel(xls_file_path, s)
+        with self._excel_file(xls_file_path) as xl:
+            for t, s in self._get_sheet_names(xl).items():
+                rtn[t] = self._parse_sheet(xl, t, s)
         missing_tables = {t for t in self.pan_dat_factory.all_tables if t not in rtn}
         if missing_tables:
             print ("The following table names could not be found in the %s file.\n%s\n"%
@@ -521,12 +1025,37 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
         msg = []
         assert self.pan_dat_factory.good_pan_dat_object(rtn, msg.append), str(msg)
         return rtn
-    def _get_sheet_names(self, xls_file_path):
-        sheets = defaultdict(list)
+    def _excel_file(self, xls_file_path):
         try :
-            xl = pd.ExcelFile(xls_file_path)
+            return pd.ExcelFile(xls_file_path)
         except Exception as e:
-            raise TicDatError("Unable to open %s as xls file : %s"%(xls_file_path, e.message))
+            raise TicDatError("Unable to open %s as xls file : %s"%(xls_file_path, e))
+    def _parse_sheet(self, xl, table, sheet_name):
+        """
+        parse one sheet of an already opened ExcelFile, reading only the fields of the table
+        (if the schema lists them) and with the dtypes implied by the data types.
+        Falls back to a plain parse if the sheet can't be read that way.
+        """
+        fields = set(all_fields(self.pan_dat_factory, table))
+        kwargs = {}
+        if fields:
+            kwargs["usecols"] = lambda c : c in fields
+        dtype = {}
+        for f, dt in self.pan_dat_factory.data_types.get(table, {}).items():
+            if not dt.number_allowed and dt.strings_allowed:
+                dtype[f] = str
+            elif dt.number_allowed and not dt.strings_allowed and not dt.must_be_int:
+                dtype[f] = float
+        if dtype:
+            kwargs["dtype"] = dtype
+        if kwargs:
+            try:
+                return xl.parse(sheet_name, **kwargs)
+            except (TypeError, ValueError):
+                pass # the data type failures will be reported by find_data_type_failures
+        return xl.parse(sheet_name)
+    def _get_sheet_names(self, xl):
+        sheets = defaultdict(list)
         for table, sheet in product(self.pan_dat_factory.all_tables, xl.sheet_names) :
             if table.lower()[:_longest_sheet] == sheet.lower().replace(' ', '_')[:_longest_sheet]:
                 sheets[table].append(sheet)
@@ -535,7 +1064,7 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
                ",".join(duplicated_sheets))
         sheets = FrozenDict({k:v[0] for k,v in sheets.items()})
         return sheets
-    def write_file(self, pan_dat, file_path, case_space_sheet_names=False):
+    def write_file(self, pan_dat, file_path, case_space_sheet_names=False, constant_memory=False):
         """
         write the panDat data to an excel file
 
@@ -546,9 +1075,16 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
         :param case_space_sheet_names: boolean - make best guesses how to add spaces and upper case
                                       characters to sheet names
 
+        :param constant_memory: boolean. Only for ".xlsx" files. Should each row be flushed
+                                to disk as it is written, rather than holding the entire
+                                workbook in memory?
+
         :return:
 
         caveats: The row names (index) isn't written.
+                 ".xlsx" files are written row by row with xlsxwriter (if installed), the same as
+                 with TicDat objects. Null values are written as empty cells and
+                 +/- float("inf") as "inf"/"-inf". Other file types are written by pandas.
         """
         msg = []
         verify(self.pan_dat_factory.good_pan_dat_object(pan_dat, msg.append),
@@ -557,8 +1093,152 @@ class XlsPanFactory(freezable_factory(object, "_isFrozen")):
         case_space_sheet_names = case_space_sheet_names and \
                                  len(set(self.pan_dat_factory.all_tables)) == \
                                  len(set(map(case_space_to_pretty, self.pan_dat_factory.all_tables)))
+        sheet_name = lambda t : case_space_to_pretty(t) if case_space_sheet_names else t
+        if file_path.endswith(".xlsx") and xls.xlsx:
+            xls._release_workbooks(file_path)
+            xls._write_xlsx_book(file_path, ((sheet_name(t), list(getattr(pan_dat, t).columns),
+                                              self._xlsx_rows(getattr(pan_dat, t)))
+                                             for t in self.pan_dat_factory.all_tables),
+                                 constant_memory, {"default_date_format": "yyyy-mm-dd hh:mm:ss"})
+            return
         writer = pd.ExcelWriter(file_path)
         for t in self.pan_dat_factory.all_tables:
-            getattr(pan_dat, t).to_excel(writer, case_space_to_pretty(t) if case_space_sheet_names else t,
-                                         index=False)
+            getattr(pan_dat, t).to_excel(writer, sheet_name(t), index=False)
         writer.save()
+    def _xlsx_rows(self, df):
+        """
+        the rows of the DataFrame as tuples of python objects, with nulls replaced by None and
+        infinity replaced by "inf"/"-inf", ready to be written by xls._write_xlsx_book
+        """
+        df = df.replace([float("inf"), -float("inf")], ["inf", "-inf"])
+        return df.astype(object).where(df.notnull(), None).itertuples(index=False, name=None)
+
+class ParquetPanFactory(freezable_factory(object, "_isFrozen")):
+    """
+    Primary class for reading/writing Parquet files with PanDat objects.
+    Don't create this object explicitly. A ParquetPanFactory will
+    automatically be associated with the parquet attribute of the parent
+    PanDatFactory.
+    """
+    def __init__(self, pan_dat_factory):
+        """
+        Don't create this object explicitly. A ParquetPanFactory will
+        automatically be associated with the parquet attribute of the parent
+        PanDatFactory.
+
+        :param pan_dat_factory:
+
+        :return:
+        """
+        self.pan_dat_factory = pan_dat_factory
+        self._isFrozen = True
+    def create_pan_dat(self, dir_path, fill_missing_fields=False, filters=None, tables=None, fields=None):
+        """
+        Create a PanDat object from a directory of Parquet files
+
+        :param dir_path: the directory containing the .parquet files (or dataset directories), one per table.
+
+        :param fill_missing_fields: boolean. If truthy, missing fields will be filled in
+                                    with their default value. Otherwise, missing fields
+                                    throw an Exception.
+
+        :param filters: None or a dictionary mapping table names to lists of (field, op, value) triplets,
+                        where field is a primary key field and op is one of ==, !=, <, <=, >, >=, in, not in.
+                        Only the rows satisfying all the triplets are read. Row groups (and partitions)
+                        that can't hold such rows are skipped entirely.
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :return: a PanDat object populated by the matching tables.
+
+        caveats: Missing tables always throw an Exception.
+                 Table names are matched with case-space insensitivity, but spaces
+                 are respected for field names.
+                 (ticdat supports whitespace in field names but not table names).
+                 Only the columns of the schema fields are read (for tables whose fields are specified).
+                 The files are memory mapped, and Arrow converts each column to the DataFrame without
+                 creating Python objects for numeric data.
+        """
+        if tables is not None or fields is not None:
+            filters = {t: f for t, f in (filters or {}).items() if tables is None or t in tables}
+            return _projected_read(self.pan_dat_factory, tables, fields,
+                                   read=lambda pdf: pdf.parquet.create_pan_dat(dir_path, fill_missing_fields, filters))
+        verify(parquettd.pq, "pyarrow needs to be installed to use this subroutine")
+        verify(os.path.isdir(dir_path), "%s not a directory path"%dir_path)
+        pdf = self.pan_dat_factory
+        filters = filters or {}
+        verify(dictish(filters), "filters should be a dictionary")
+        for t, f in filters.items():
+            verify(t in pdf.all_tables and pdf.primary_key_fields.get(t),
+                   "%s is not a table with primary key fields"%t)
+            parquettd._verify_filters(f, t, pdf.primary_key_fields[t])
+        rtn = {}
+        for t in pdf.all_tables:
+            path = parquettd._parquet_path(dir_path, t)
+            verify(path, "Unable to recognize table %s" % t)
+            source = parquettd._ParquetSource(path, filters.get(t))
+            fields = list(all_fields(pdf, t))
+            rtn[t] = source.read([f for f in fields if f in source.columns] if fields else None)
+        missing_fields = {(t, f) for t in rtn for f in all_fields(pdf, t) if f not in rtn[t].columns}
+        if fill_missing_fields:
+            for t,f in missing_fields:
+                rtn[t][f] = pdf.default_values[t][f]
+        verify(fill_missing_fields or not missing_fields,
+               "The following (table, field) pairs are missing fields.\n%s" % [(t, f) for t,f in missing_fields])
+        rtn = pdf.PanDat(**rtn)
+        msg = []
+        assert pdf.good_pan_dat_object(rtn, msg.append), str(msg)
+        return rtn
+    def write_directory(self, pan_dat, dir_path, case_space_table_names=False, compression="snappy",
+                        partition_cols=None):
+        """
+        write the PanDat data to a collection of Parquet files
+
+        :param pan_dat: the PanDat object to write
+
+        :param dir_path: the directory in which to write the .parquet files. Will be created if need be.
+
+        :param case_space_table_names: boolean - make best guesses how to add spaces and upper case
+                                       characters to table names
+
+        :param compression: the Parquet compression codec (such as "snappy", "gzip" or None)
+
+        :param partition_cols: None or a dictionary mapping table names to lists of fields. These tables
+                               are written as dataset directories, partitioned by these fields.
+
+        :return:
+
+        caveats: The row names (index) aren't written. Each column needs to hold a single data type,
+                 since Parquet files are typed by column. Dataset directories can't be overwritten.
+        """
+        verify(parquettd.pq, "pyarrow needs to be installed to use this subroutine")
+        msg = []
+        verify(self.pan_dat_factory.good_pan_dat_object(pan_dat, msg.append),
+               "pan_dat not a good object for this factory : %s"%"\n".join(msg))
+        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        partition_cols = partition_cols or {}
+        verify(dictish(partition_cols) and set(partition_cols).issubset(self.pan_dat_factory.all_tables),
+               "partition_cols should be a dictionary keyed by table names")
+        for t, fields in partition_cols.items():
+            verify(containerish(fields) and fields and set(fields).issubset(getattr(pan_dat, t).columns),
+                   "partition_cols for %s should be a list of its fields"%t)
+        case_space_table_names = case_space_table_names and \
+                                 len(set(self.pan_dat_factory.all_tables)) == \
+                                 len(set(map(case_space_to_pretty, self.pan_dat_factory.all_tables)))
+        if not os.path.isdir(dir_path):
+            os.mkdir(dir_path)
+        for t in self.pan_dat_factory.all_tables:
+            name = case_space_to_pretty(t) if case_space_table_names else t
+            table = parquettd._arrow_table_from_pandas(getattr(pan_dat, t), t)
+            if t in partition_cols:
+                path = os.path.join(dir_path, name)
+                verify(not os.path.exists(path), "The %s dataset directory already exists"%path)
+                parquettd.pq.write_to_dataset(table, path, partition_cols=list(partition_cols[t]),
+                                              compression=compression)
+            else:
+                parquettd.pq.write_table(table, os.path.join(dir_path, name + ".parquet"), compression=compression)
@@ -0,0 +1,299 @@
+"""
+Read/write ticDat objects from/to Parquet files. Requires the pyarrow package
+PEP8
+"""
+
+import os
+import operator
+from ticdat.utils import freezable_factory, TicDatError, verify, containerish, dictish, stringish, pd
+from ticdat.utils import _projected_read
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except:
+    pa = pq = None
+try:
+    import pyarrow.dataset as ds
+except:
+    ds = None # older pyarrow, only the legacy pq.ParquetDataset is available
+
+_can_unit_test = pq
+
+_filter_ops = {"==": operator.eq, "=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+               ">": operator.gt, ">=": operator.ge, "in": lambda s, v: s.isin(list(v)),
+               "not in": lambda s, v: ~s.isin(list(v))}
+
+def _parquet_path(dir_path, table):
+    """
+    the <table>.parquet file (or <table> dataset directory) for the table, matched with case-space insensitivity
+    """
+    rtn = [os.path.join(dir_path, f) for f in os.listdir(dir_path)
+           if f.lower().replace(" ", "_") in (table.lower(), "%s.parquet"%table.lower())]
+    verify(len(rtn) <= 1, "Multiple possible parquet files found for table %s"%table)
+    if rtn:
+        return rtn[0]
+
+def _verify_filters(filters, table, fields):
+    verify(containerish(filters) and not stringish(filters) and not dictish(filters),
+           "The filters for %s should be a list of (field, op, value) triplets"%table)
+    for f in filters:
+        verify(containerish(f) and len(f) == 3, "%s is not a (field, op, value) triplet"%(f,))
+        verify(f[0] in fields, "%s is not a primary key field of %s, and thus can't be filtered on"%(f[0], table))
+        verify(f[1] in _filter_ops, "%s is not one of the filter operators %s"%(f[1], sorted(_filter_ops)))
+        verify(f[1] not in ("in", "not in") or (containerish(f[2]) and not stringish(f[2])),
+               "The %s operator needs a collection of values"%f[1])
+
+def _might_match(statistics, op, value):
+    """
+    could a row group whose column has these statistics hold a row that satisfies the predicate?
+    """
+    if statistics is None or not statistics.has_min_max:
+        return True
+    lo, hi = statistics.min, statistics.max
+    try:
+        if op in ("==", "="):
+            return lo <= value <= hi
+        if op == "in":
+            return any(lo <= v <= hi for v in value)
+        if op == "<":
+            return lo < value
+        if op == "<=":
+            return lo <= value
+        if op == ">":
+            return hi > value
+        if op == ">=":
+            return hi >= value
+    except TypeError: # the filter value isn't comparable with the column, so nothing can be ruled out
+        pass
+    return True
+
+class _ParquetSource(object):
+    """
+    a parquet file or dataset directory, opened so its column names can be checked before any data is read
+    """
+    def __init__(self, path, filters):
+        self.path, self.filters = path, filters or ()
+        if os.path.isdir(path) and ds:
+            self._file = None
+            self._dataset = ds.dataset(path, format="parquet", partitioning="hive")
+            partitioning = self._dataset.partitioning
+            self._partition_names = set(partitioning.schema.names) if partitioning else set()
+            self.columns = self._dataset.schema.names
+        elif os.path.isdir(path):
+            self._file = None
+            self._dataset = pq.ParquetDataset(path, memory_map=True)
+            partitions = self._dataset.partitions
+            self._partition_names = set(partitions.partition_names) if partitions else set()
+            self.columns = self._dataset.schema.to_arrow_schema().names + sorted(self._partition_names)
+        else:
+            self._dataset = None
+            self._file = pq.ParquetFile(path, memory_map=True)
+            self.columns = self._file.schema.names
+        self.columns = [c for c in self.columns if c != "__index_level_0__"]
+    def _row_groups(self):
+        meta = self._file.metadata
+        rtn = []
+        for i in range(meta.num_row_groups):
+            row_group = meta.row_group(i)
+            stats = {row_group.column(j).path_in_schema: row_group.column(j).statistics
+                     for j in range(row_group.num_columns)}
+            if all(_might_match(stats.get(f), op, v) for f, op, v in self.filters):
+                rtn.append(i)
+        return rtn
+    def _partition_expression(self):
+        """
+        the pyarrow.dataset expression for the filters on partition keys, so that the partitions they rule
+        out are never opened. The remaining filters are applied once the rows are read.
+        """
+        rtn = None
+        for f, op, v in self.filters:
+            if f not in self._partition_names:
+                continue
+            field = ds.field(f)
+            expression = field.isin(list(v)) if op == "in" else ~field.isin(list(v)) if op == "not in" \
+                         else _filter_ops[op](field, v)
+            rtn = expression if rtn is None else rtn & expression
+        return rtn
+    def read(self, columns=None):
+        """
+        read the columns into a DataFrame, skipping the row groups (or partitions) that the statistics
+        (or partition keys) rule out, and then applying the filters to the remaining rows.
+        """
+        if self._file:
+            table = self._file.read_row_groups(self._row_groups(), columns=columns) if self.filters else \
+                    self._file.read(columns=columns)
+        elif ds:
+            try:
+                table = self._dataset.to_table(columns=columns, filter=self._partition_expression())
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, TypeError):
+                # a partition key whose type doesn't match the filter value can't be pruned
+                table = self._dataset.to_table(columns=columns)
+        else:
+            # pyarrow casts each partition key to the type of the filter value, and wants sets for in, not in
+            partition_filters = [(f, op, set(v) if op in ("in", "not in") else v) for f, op, v in self.filters
+                                 if f in self._partition_names and
+                                 len({type(_) for _ in (v if op in ("in", "not in") else [v])}) == 1]
+            try:
+                dataset = pq.ParquetDataset(self.path, memory_map=True, filters=partition_filters) \
+                          if partition_filters else self._dataset
+            except IndexError: # every partition was ruled out
+                dataset = None
+            if not dataset:
+                return pd.DataFrame(columns=columns or self.columns)
+            table = dataset.read(columns=columns)
+        rtn = table.to_pandas(use_threads=True)
+        for c in rtn.columns:
+            if str(rtn[c].dtype) == "category": # partition keys come back as categories
+                rtn[c] = rtn[c].astype(rtn[c].cat.categories.dtype)
+        if self.filters:
+            mask = pd.Series(True, index=rtn.index)
+            for f, op, v in self.filters:
+                mask &= _filter_ops[op](rtn[f], v)
+            rtn = rtn[mask].reset_index(drop=True)
+        return rtn
+
+def _arrow_table(columns, names, table_name):
+    try:
+        return pa.Table.from_arrays([pa.array(c) for c in columns], names=list(names))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError) as e:
+        raise TicDatError("Unable to write %s to parquet. Each column needs a single data type : %s"%
+                          (table_name, e))
+
+def _arrow_table_from_pandas(df, table_name):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError) as e:
+        raise TicDatError("Unable to write %s to parquet. Each column needs a single data type : %s"%
+                          (table_name, e))
+
+class ParquetTicFactory(freezable_factory(object, "_isFrozen")) :
+    """
+    Primary class for reading/writing Parquet files with TicDat objects.
+    Your system will need the pyarrow package if you want to use this class.
+    Don't create this object explicitly. A ParquetTicFactory will
+    automatically be associated with the parquet attribute of the parent
+    TicDatFactory.
+    """
+    def __init__(self, tic_dat_factory):
+        """
+        Don't create this object explicitly. A ParquetTicFactory will
+        automatically be associated with the parquet attribute of the parent
+        TicDatFactory.
+
+        :param tic_dat_factory:
+
+        :return:
+        """
+        self.tic_dat_factory = tic_dat_factory
+        self._isFrozen = True
+    def create_tic_dat(self, dir_path, freeze_it = False, filters = None, tables = None, fields = None):
+        """
+        Create a TicDat object from the Parquet files in a directory
+
+        :param dir_path: the directory containing the .parquet files (or dataset directories), one per table.
+
+        :param freeze_it: boolean. should the returned object be frozen?
+
+        :param filters: None or a dictionary mapping table names to lists of (field, op, value) triplets,
+                        where field is a primary key field and op is one of ==, !=, <, <=, >, >=, in, not in.
+                        Only the rows satisfying all the triplets are read. Row groups (and partitions)
+                        that can't hold such rows are skipped entirely.
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :return: a TicDat object populated by the matching files.
+
+        caveats: Missing files resolve to an empty table, but missing fields on
+                 matching files throw an Exception.
+                 Table names are matched with case-space insensitivity.
+                 Only the fields of the schema are read.
+        """
+        if tables is not None or fields is not None:
+            filters = {t: f for t, f in (filters or {}).items() if tables is None or t in tables}
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.parquet.create_tic_dat(dir_path, filters=filters))
+        verify(pq, "pyarrow needs to be installed to use this subroutine")
+        verify(os.path.isdir(dir_path), "Invalid directory path %s"%dir_path)
+        tdf = self.tic_dat_factory
+        filters = filters or {}
+        verify(dictish(filters), "filters should be a dictionary")
+        for t, f in filters.items():
+            verify(t in tdf.all_tables and t not in tdf.generic_tables,
+                   "%s is not a table with primary key fields"%t)
+            _verify_filters(f, t, tdf.primary_key_fields.get(t, ()))
+        rtn, missing_tables = {}, []
+        for t in tdf.all_tables:
+            path = _parquet_path(dir_path, t)
+            if not path:
+                missing_tables.append(t)
+                continue
+            source = _ParquetSource(path, filters.get(t))
+            if t in tdf.generic_tables:
+                rtn[t] = source.read()
+                continue
+            pks, dfs = tdf.primary_key_fields.get(t, ()), tdf.data_fields.get(t, ())
+            missing_fields = [f for f in pks + dfs if f not in source.columns]
+            verify(not missing_fields, "The following fields are missing from %s\n%s"%(path, missing_fields))
+            df = source.read(list(pks + dfs))
+            rows = df.astype(object).where(df.notnull(), None).values.tolist()
+            if pks:
+                rtn[t] = {(row[0] if len(pks) == 1 else tuple(row[:len(pks)])): row[len(pks):] for row in rows}
+            else:
+                rtn[t] = rows
+        if missing_tables:
+            print ("The following table names could not be found in the %s directory.\n%s\n"%
+                   (dir_path,"\n".join(missing_tables)))
+        rtn = tdf.TicDat(**rtn)
+        if freeze_it:
+            return tdf.freeze_me(rtn)
+        return rtn
+    def write_directory(self, tic_dat, dir_path, allow_overwrite = False, compression = "snappy"):
+        """
+        write the ticDat data to a collection of Parquet files, one .parquet file per table
+
+        :param tic_dat: the data object
+
+        :param dir_path: the directory in which to write the .parquet files. Will be created if need be.
+
+        :param allow_overwrite: boolean - are we allowed to overwrite existing files?
+
+        :param compression: the Parquet compression codec (such as "snappy", "gzip" or None)
+
+        :return:
+
+        caveats: Each field needs to hold a single data type (apart from None),
+                 since Parquet files are typed by column.
+        """
+        verify(pq, "pyarrow needs to be installed to use this subroutine")
+        msg = []
+        if not self.tic_dat_factory.good_tic_dat_object(tic_dat, lambda m : msg.append(m)) :
+            raise TicDatError("Not a valid TicDat object for this schema : " + " : ".join(msg))
+        verify(not os.path.isfile(dir_path), "A file is not a valid directory path")
+        tdf = self.tic_dat_factory
+        file_paths = {t: os.path.join(dir_path, "%s.parquet"%t) for t in tdf.all_tables}
+        if not allow_overwrite:
+            for t, f in file_paths.items():
+                verify(not os.path.exists(f), "The %s path exists and overwrite is not allowed"%f)
+        if not os.path.isdir(dir_path):
+            os.mkdir(dir_path)
+        for t in tdf.all_tables:
+            _t = getattr(tic_dat, t)
+            if t in tdf.generic_tables:
+                table = _arrow_table_from_pandas(_t, t)
+            else:
+                pks, dfs = tdf.primary_key_fields.get(t, ()), tdf.data_fields.get(t, ())
+                if dictish(_t):
+                    keys = [(k,) if len(pks) == 1 else k for k in _t]
+                    columns = [[k[i] for k in keys] for i in range(len(pks))] + \
+                              [[row[f] for row in _t.values()] for f in dfs]
+                else:
+                    rows = list(_t if containerish(_t) else _t())
+                    columns = [[row[f] for row in rows] for f in dfs]
+                table = _arrow_table(columns, pks + dfs, t)
+            pq.write_table(table, file_paths[t], compression=compression)
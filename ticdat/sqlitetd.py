@@ -3,10 +3,18 @@ Read/write ticDat objects from SQLite files. Requires the sqlite3 module
 PEP8
 """
 import os
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import islice
+import collections as clt
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import threading
 from ticdat.utils import freezable_factory, TicDatError, verify, stringish, dictish, containerish, numericish
-from ticdat.utils import FrozenDict, all_underscore_replacements, find_duplicates
-from ticdat.utils import create_duplicate_focused_tdf, create_generic_free, safe_apply
+from ticdat.utils import FrozenDict, find_duplicates, _open_data_file, _projected_read
+from ticdat.utils import _KeyCountingDict, _loaded_duplicates
+from ticdat.utils import create_duplicate_focused_tdf, create_generic_free, safe_apply, td_row_factory
 
 try:
     import sqlite3 as sql
@@ -49,15 +57,318 @@ def _insert_format(x) :
         return "null"
     return  str(x)
 
-def _sql_con(dbFile, foreign_keys = True) :
-    con = sql.connect(dbFile)
-    con.execute("PRAGMA foreign_keys = %s"%("ON" if foreign_keys else "OFF"))
-    con.commit() # remember - either close or commit to push changes!!
-    return con
-
 def _brackets(l) :
     return ["[%s]"%_ for _ in l]
 
+_write_batch_size = 10000
+_sql_file_batch_size = 500
+_script_chars = 2**20
+
+def _sql_scripts(f):
+    """
+    stream the statements of a sql text file as scripts of complete statements,
+    each roughly _script_chars long. Semicolons inside quoted values don't split a
+    statement. Any incomplete text left at the end of the file is returned as a final
+    script, so that executing it reports the problem.
+    """
+    buffer, size = [], 0
+    for line in f:
+        buffer.append(line)
+        size += len(line)
+        # only a line ending with a semicolon can end a statement, so only then is the buffer joined
+        if size >= _script_chars and line.rstrip().endswith(";"):
+            script = "".join(buffer)
+            if sql.complete_statement(script):
+                yield script
+                buffer, size = [], 0
+    script = "".join(buffer)
+    if script.strip():
+        yield script
+
+def _execute_batches(con, sql_str, rows):
+    rows = iter(rows)
+    batch = list(islice(rows, _write_batch_size))
+    while batch:
+        con.executemany(sql_str, batch)
+        batch = list(islice(rows, _write_batch_size))
+
+def _has_unique_constraint(con, table, fields):
+    """
+    does the table have a PRIMARY KEY or (non partial) UNIQUE constraint on exactly these fields?
+    """
+    fields = {f.lower() for f in fields}
+    if {r[1].lower() for r in con.execute("PRAGMA table_info([%s])"%table) if r[5]} == fields:
+        return True
+    for index in con.execute("PRAGMA index_list([%s])"%table).fetchall():
+        if index[2] and not (len(index) > 4 and index[4]) and \
+           {(r[2] or "").lower() for r in con.execute("PRAGMA index_info([%s])"%index[1])} == fields:
+            return True
+    return False
+
+def _index_sql(factory, foreign_key_fields, tables, extra_indexes = None, table_names = None):
+    """
+    the CREATE INDEX statements for the foreign key (child) fields of the tables, along with any
+    extra indexes. Used by both the TicDat and PanDat SQLite writers.
+
+    :param factory: the TicDatFactory or PanDatFactory being written
+
+    :param foreign_key_fields: iterable of (native table, native fields) pairs, one for each foreign key
+
+    :param tables: the tables to index
+
+    :param extra_indexes: optional dictionary of table name to a list of field name lists
+
+    :param table_names: optional dictionary mapping table names to the names written to the file
+
+    :return: a tuple of sql strings
+    """
+    verify(dictish(extra_indexes or {}), "extra_indexes should be a dictionary")
+    table_names = table_names or {}
+    indexes = [(t, tuple(fields)) for t, fields in foreign_key_fields if t in tables]
+    for t, field_lists in (extra_indexes or {}).items():
+        verify(t in factory.all_tables, "Unrecognized table name %s for extra_indexes"%t)
+        verify(containerish(field_lists) and all(containerish(_) and not stringish(_) and _
+                                                 for _ in field_lists),
+               "extra_indexes for %s should be a list of field name lists"%t)
+        for fields in field_lists:
+            for f in fields:
+                verify(f in factory.primary_key_fields.get(t, ()) + factory.data_fields.get(t, ()),
+                       "%s is not a field of %s"%(f, t))
+            if t in tables:
+                indexes.append((t, tuple(fields)))
+    rtn, index_names = [], set()
+    for t, fields in indexes:
+        name = "idx_%s__%s"%(table_names.get(t, t), "__".join(fields))
+        # the primary key index already covers any of its leading fields
+        if set(factory.primary_key_fields.get(t, ())[:len(fields)]) != set(fields) and \
+                name not in index_names:
+            index_names.add(name)
+            rtn.append("CREATE INDEX IF NOT EXISTS [%s] ON [%s] (%s);"%
+                       (name, table_names.get(t, t), ",".join(_brackets(fields))))
+    return tuple(rtn)
+
+def _set_pragmas(con, pragmas):
+    for k,v in (pragmas or {}).items():
+        verify(stringish(k) and k.replace("_", "").isalnum(), "%s is not a valid pragma name"%k)
+        verify(stringish(v) or numericish(v), "%s is not a valid value for pragma %s"%(v, k))
+        con.execute("PRAGMA %s = %s"%(k, v))
+
+def _sql_catalog(con):
+    """
+    read the table and column names directly from the SQLite schema catalog.
+    No table is ever selected from, so this is fast even for very large databases.
+
+    :param con: an open connection (sqlite3.Connection or sqlalchemy.engine.Engine)
+
+    :return: a dictionary mapping table (and view) names to tuples of column names. SQLite's own
+             internal tables (i.e. sqlite_stat1) are skipped.
+    """
+    rtn = {}
+    names = [row[0] for row in con.execute(
+             "Select name from sqlite_master where type in ('table', 'view')")
+             if not row[0].lower().startswith("sqlite_")]
+    try:
+        # pragma_table_info as a table-valued function requires SQLite 3.16 or later
+        for tbl, fld in con.execute("Select m.name, p.name from sqlite_master m, " +
+                                    "pragma_table_info(m.name) p " +
+                                    "where m.type in ('table', 'view') order by m.name, p.cid"):
+            rtn.setdefault(tbl, []).append(fld)
+    except Exception:
+        for tbl in names:
+            rtn[tbl] = [row[1] for row in con.execute("PRAGMA table_info([%s])"%tbl)]
+    return {t: tuple(rtn.get(t, ())) for t in names}
+
+def _matching_table_names(catalog, table):
+    """
+    the catalog names that match table, case insensitive and with spaces treated as underscores
+    """
+    return [t for t in catalog if t.lower().replace(" ", "_") == table.lower()]
+
+def _missing_catalog_fields(catalog, table_name, fields):
+    columns = {_.lower() for _ in catalog.get(table_name, ())}
+    return [f for f in fields if f.lower() not in columns]
+
+_cached_statements = 256
+_session_cache_size = 4
+
+def _file_identity(db_file_path):
+    try:
+        st = os.stat(db_file_path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+class _SqlSession(object):
+    """
+    a connection to a SQLite file that is reused by the readers and writers of this thread.
+    Don't create this object explicitly. Use _session instead.
+    """
+    def __init__(self, db_file_path):
+        self.db_file_path = db_file_path
+        self.con = sql.connect(db_file_path, cached_statements=_cached_statements)
+        self.con.execute("PRAGMA foreign_keys = OFF")
+        self._identity = _file_identity(db_file_path)
+        self._catalog, self._schema_version = None, None
+    def is_valid(self):
+        # a deleted and recreated file gets a new inode, so the old connection is stale
+        return bool(self._identity) and _file_identity(self.db_file_path) == self._identity
+    def catalog(self):
+        """
+        the _sql_catalog of the file, re-read only when the SQLite schema version changes
+        """
+        schema_version = next(self.con.execute("PRAGMA schema_version"))[0]
+        if self._catalog is None or schema_version != self._schema_version:
+            self._catalog, self._schema_version = _sql_catalog(self.con), schema_version
+        return self._catalog
+    def close(self):
+        self.con.close()
+
+_thread_sessions = threading.local()
+
+def _sessions():
+    if not hasattr(_thread_sessions, "sessions"):
+        _thread_sessions.sessions = OrderedDict()
+    return _thread_sessions.sessions
+
+def _session(db_file_path):
+    """
+    get the _SqlSession for a SQLite file path, creating one if need be
+
+    :param db_file_path: the path of the SQLite file. Will be created if it doesn't exist.
+
+    :return: a _SqlSession that is shared by all the callers of this thread. Only the
+             _session_cache_size most recently used sessions are kept open. The others are closed.
+    """
+    sessions = _sessions()
+    key = os.path.abspath(db_file_path)
+    rtn = sessions.pop(key, None)
+    if rtn and not rtn.is_valid():
+        rtn.close()
+        rtn = None
+    sessions[key] = rtn = rtn or _SqlSession(key)
+    while len(sessions) > _session_cache_size:
+        sessions.popitem(last=False)[1].close()
+    return rtn
+
+def _release_session(db_file_path=None):
+    sessions = _sessions()
+    for key in ([os.path.abspath(db_file_path)] if db_file_path else list(sessions)):
+        if key in sessions:
+            sessions.pop(key).close()
+
+class _LazyTable(object):
+    """
+    read-only proxy for a table of a SQLite file. Don't create this object explicitly.
+    Use SQLiteTicFactory.create_lazy_tic_dat instead.
+    """
+    def __init__(self, db_file_path, table, table_name, primary_key_fields, data_fields, row_factory,
+                 materialize_on_full_scan, conditions=(), parameters=()):
+        self._db_file_path, self._table, self._table_name = db_file_path, table, table_name
+        self._pks, self._dfs = tuple(primary_key_fields), tuple(data_fields)
+        self._row_factory = row_factory
+        self._materialize_on_full_scan = materialize_on_full_scan
+        self._conditions, self._parameters = tuple(conditions), tuple(parameters)
+        self._materialized = None
+    def _make_row(self, data):
+        rtn = self._row_factory(list(map(_read_data_format, data)))
+        rtn._dataFrozen = True
+        rtn._attributesFrozen = True
+        return rtn
+    def _select(self, fields, extra_conditions=(), extra_parameters=(), suffix=""):
+        conditions = self._conditions + tuple(extra_conditions)
+        return _session(self._db_file_path).con.execute("Select %s from [%s]%s%s"%(", ".join(fields), self._table_name,
+                                 (" where " + " and ".join("(%s)"%_ for _ in conditions)) if conditions
+                                 else "", suffix), self._parameters + tuple(extra_parameters))
+    def _scan(self):
+        if self._materialized is not None:
+            return self._materialized
+        rtn = self._full_scan()
+        if self._materialize_on_full_scan:
+            self._materialized = rtn
+        return rtn
+    def where(self, condition=None, parameters=(), **field_values):
+        """
+        create a new proxy restricted to the matching rows. The filtering is pushed into the SQL.
+
+        :param condition: optional SQL boolean expression, referring to fields in [brackets]
+                          and using ? for parameters. Ex: "[cost] > ? and [name] like ?"
+
+        :param parameters: the values bound to the ? placeholders of condition
+
+        :param field_values: field name to value. A row matches if the field equals the value, or,
+                             for a container (non string) value, is one of the values.
+
+        :return: a _LazyTable that only sees the matching rows
+        """
+        conditions, params = list(self._conditions), list(self._parameters)
+        if condition is not None:
+            verify(stringish(condition), "condition should be a string")
+            conditions.append(condition)
+            params.extend(parameters)
+        for f,v in field_values.items():
+            verify(f in self._pks + self._dfs, "%s is not a field of %s"%(f, self._table))
+            if containerish(v):
+                v = list(v)
+                conditions.append("[%s] in (%s)"%(f, ",".join("?" for _ in v)) if v else "0")
+                params.extend(v)
+            else:
+                conditions.append("[%s] = ?"%f)
+                params.append(v)
+        return type(self)(self._db_file_path, self._table, self._table_name, self._pks, self._dfs,
+                          self._row_factory, self._materialize_on_full_scan, conditions, params)
+    def __len__(self):
+        if self._materialized is not None:
+            return len(self._materialized)
+        return next(self._select(["count(*)"]))[0]
+    def __iter__(self):
+        return iter(self._scan())
+    def __setitem__(self, key, value):
+        raise TicDatError("%s is a read-only lazy table"%self._table)
+    def __delitem__(self, key):
+        raise TicDatError("%s is a read-only lazy table"%self._table)
+    def __repr__(self):
+        return "td_lazy:[%s]"%self._table
+
+class _LazyTicDatDict(_LazyTable, Mapping):
+    def _full_scan(self):
+        rtn = {}
+        for row in self._select(_brackets(self._pks + self._dfs)):
+            pk = row[:len(self._pks)]
+            rtn[pk[0] if len(pk) == 1 else tuple(pk)] = self._make_row(row[len(self._pks):])
+        return rtn
+    def _key_conditions(self, key):
+        if len(self._pks) == 1:
+            key = (key,)
+        if not (containerish(key) and len(key) == len(self._pks)):
+            return None
+        return ["[%s] = ?"%f for f in self._pks], tuple(key)
+    def __getitem__(self, key):
+        if self._materialized is not None:
+            return self._materialized[key]
+        conditions = self._key_conditions(key)
+        if conditions:
+            for row in self._select(_brackets(self._dfs) or ["1"], conditions[0], conditions[1], " limit 1"):
+                return self._make_row(row if self._dfs else ())
+        raise KeyError(key)
+    def __contains__(self, key):
+        if self._materialized is not None:
+            return key in self._materialized
+        conditions = self._key_conditions(key)
+        return bool(conditions) and \
+               any(True for _ in self._select(["1"], conditions[0], conditions[1], " limit 1"))
+    def keys(self):
+        return self._scan().keys()
+    def values(self):
+        return self._scan().values()
+    def items(self):
+        return self._scan().items()
+
+class _LazyTicDatList(_LazyTable):
+    def _full_scan(self):
+        return tuple(self._make_row(row) for row in self._select(_brackets(self._dfs)))
+    def __contains__(self, item):
+        return item in self._scan()
+
 class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
     """
     Primary class for reading/writing SQLite files with TicDat objects.
@@ -81,7 +392,8 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
             return lambda *args, **kwargs : self.tic_dat_factory.freeze_me(
                     self.tic_dat_factory.TicDat(*args, **kwargs))
         return self.tic_dat_factory.TicDat
-    def create_tic_dat(self, db_file_path, freeze_it = False):
+    def create_tic_dat(self, db_file_path, freeze_it = False, tables = None, fields = None,
+                       duplicates_handler = None):
         """
         Create a TicDat object from a SQLite database file
 
@@ -89,14 +401,85 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param duplicates_handler: None, or a function that is passed the duplicated primary keys found
+                                   while the data is loaded, as a dictionary in the same format as the one
+                                   returned by find_duplicates.
+
         :return: a TicDat object populated by the matching tables.
 
         caveats : "inf" and "-inf" (case insensitive) are read as floats
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                                   read=lambda tdf: tdf.sql.create_tic_dat(db_file_path,
+                                                                           duplicates_handler=duplicates_handler))
+        verify(sql, "sqlite3 needs to be installed to use this subroutine")
+        dat = self._create_tic_dat(db_file_path, duplicates_handler is not None)
+        if duplicates_handler:
+            duplicates_handler(_loaded_duplicates(dat))
+        return self._Rtn(freeze_it)(**dat)
+    def create_lazy_tic_dat(self, db_file_path, materialize_on_full_scan = False):
+        """
+        Create a frozen TicDat object whose tables are read-only proxies over a SQLite database file.
+        Rows are only read when they are accessed, so the cost tracks what is actually used.
+
+        :param db_file_path: A SQLite db with a consistent schema.
+
+        :param materialize_on_full_scan: boolean. should a table (or where filtered table) keep
+                                         all of its rows in memory the first time they are all
+                                         read (i.e. by iteration, keys(), values() or items())?
+
+        :return: a frozen TicDat object. Each table supports the usual read-only operations
+                 (len, in, iteration and, for tables with primary keys, [] lookup, keys(), values()
+                 and items()). Primary key lookups are performed as indexed queries. Each table
+                 also has a where function that pushes filtering into the SQL. For example
+                 dat.foods.where("[cost] < ?", [2]) or dat.nutrition_quantities.where(food="milk")
+
+        caveats : "inf" and "-inf" (case insensitive) are read as floats
+                  The tables query the connection this thread shares for the file (see release_connections),
+                  which is reopened as needed. The file shouldn't be changed while the object is in use.
+                  Foreign key links are not created for lazy tables.
+                  Generic tables are not supported.
+        """
         verify(sql, "sqlite3 needs to be installed to use this subroutine")
-        return self._Rtn(freeze_it)(**self._create_tic_dat(db_file_path))
+        tdf = self.tic_dat_factory
+        verify(not tdf.generic_tables, "generic_tables are not compatible with create_lazy_tic_dat")
+        table_names = self._check_tables_fields(db_file_path, tdf.all_tables)
+        rtn = tdf.TicDat(**{t:self._create_gen_obj(db_file_path, t, table_names[t])
+                            for t in tdf.generator_tables})
+        for t in set(tdf.all_tables).difference(tdf.generator_tables):
+            pks, dfs = tdf.primary_key_fields.get(t, ()), tdf.data_fields.get(t, ())
+            row_factory = td_row_factory(t, pks, dfs, tdf.default_values.get(t, {}))
+            setattr(rtn, t, (_LazyTicDatDict if pks else _LazyTicDatList)(
+                db_file_path, t, table_names[t], pks, dfs, row_factory, materialize_on_full_scan))
+        rtn._isFrozen = True
+        return rtn
+    def release_connections(self, db_file_path = None):
+        """
+        Close the connections this thread holds open for SQLite files.
+
+        :param db_file_path: the SQLite file to release. If falsey, all the files are released.
+
+        :return:
+
+        caveats : The readers (including lazy TicDat objects) reuse one connection per file (per thread),
+                  along with its cached table and field names. A connection is reopened automatically if
+                  its file is deleted or replaced. Each thread keeps only a few files open, closing
+                  the least recently used connections as other files are read. The writers release the
+                  connection to the file they write once they're done. Generator tables open and close a
+                  connection of their own each time they're iterated.
+        """
+        verify(sql, "sqlite3 needs to be installed to use this subroutine")
+        _release_session(db_file_path)
     def create_tic_dat_from_sql(self, sql_file_path, includes_schema = False,
-                                freeze_it = False):
+                                freeze_it = False, tables = None, fields = None):
         """
         Create a TicDat object from an SQLite sql text file
 
@@ -106,8 +489,18 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
         :return: a TicDat object populated by the db created from the SQL
         """
+        if tables is not None or fields is not None:
+            return _projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                read=lambda tdf: tdf.TicDat(**self._create_tic_dat_from_sql(sql_file_path, includes_schema, tdf)))
         verify(sql, "sqlite3 needs to be installed to use this subroutine")
         return self._Rtn(freeze_it)(**self._create_tic_dat_from_sql(
                     sql_file_path, includes_schema))
@@ -133,7 +526,7 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
         for fk in self.tic_dat_factory.foreign_keys:
             rtn[fk.native_table].add(fk)
         return FrozenDict({k:tuple(v) for k,v in rtn.items()})
-    def _create_tic_dat_from_sql(self, sql_file_path, includes_schema):
+    def _create_tic_dat_from_sql(self, sql_file_path, includes_schema, projected_tdf = None):
         verify(os.path.exists(sql_file_path), "%s isn't a valid file path"%sql_file_path)
         verify(not self.tic_dat_factory.generator_tables,
                "recovery of generator tables from sql files not yet implemented")
@@ -143,66 +536,59 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
                 for str in self._get_schema_sql(set(tdf.all_tables).
                                                 difference(tdf.generic_tables)):
                     con.execute(str)
-            with open(sql_file_path, "r") as f:
-                for str in f.read().split(";"):
-                    con.execute(str)
-            return self._create_tic_dat_from_con(con,
-                        {t:t for t in self.tic_dat_factory.all_tables})
-    def _get_table_names(self, db_file_path, tables):
+            with _open_data_file(sql_file_path, "r") as f:
+                for script in _sql_scripts(f):
+                    con.executescript(script)
+            # the whole script needs the full schema, but only the tables of projected_tdf need to be read
+            reader = (projected_tdf or tdf).sql
+            return reader._create_tic_dat_from_con(con, {t:t for t in reader.tic_dat_factory.all_tables})
+    def _get_table_names(self, db_file_path, tables, catalog):
         rtn = {}
-        with sql.connect(db_file_path) as con:
-            def try_name(name):
-                try :
-                    con.execute("Select * from [%s]"%name)
-                except :
-                    return False
-                return True
-            for table in tables:
-                rtn[table] = [t for t in all_underscore_replacements(table) if try_name(t)]
-                verify(len(rtn[table]) >= 1, "Unable to recognize table %s in SQLite file %s"%
-                                  (table, db_file_path))
-                verify(len(rtn[table]) <= 1, "Duplicate tables found for table %s in SQLite file %s"%
-                                  (table, db_file_path))
-                rtn[table] = rtn[table][0]
+        for table in tables:
+            rtn[table] = _matching_table_names(catalog, table)
+            verify(len(rtn[table]) >= 1, "Unable to recognize table %s in SQLite file %s"%
+                              (table, db_file_path))
+            verify(len(rtn[table]) <= 1, "Duplicate tables found for table %s in SQLite file %s"%
+                              (table, db_file_path))
+            rtn[table] = rtn[table][0]
         return rtn
     def _check_tables_fields(self, db_file_path, tables):
         tdf = self.tic_dat_factory
         TDE = TicDatError
         verify(os.path.exists(db_file_path), "%s isn't a valid file path"%db_file_path)
         try :
-            with sql.connect(db_file_path) as _:
-                pass
+            catalog = _session(db_file_path).catalog()
         except Exception as e:
-            raise TDE("Unable to open %s as SQLite file : %s"%(db_file_path, e.message))
-        table_names = self._get_table_names(db_file_path, tables)
-        with sql.connect(db_file_path) as con:
-            for table in tables :
-                for field in tdf.primary_key_fields.get(table, ()) + \
-                             tdf.data_fields.get(table, ()):
-                    try :
-                        con.execute("Select [%s] from [%s]"%(field,table_names[table]))
-                    except :
-                        raise TDE("Unable to recognize field %s in table %s for file %s"%
-                                  (field, table, db_file_path))
+            raise TDE("Unable to open %s as SQLite file : %s"%(db_file_path, e))
+        table_names = self._get_table_names(db_file_path, tables, catalog)
+        for table in tables :
+            for field in _missing_catalog_fields(catalog, table_names[table],
+                            tdf.primary_key_fields.get(table, ()) + tdf.data_fields.get(table, ())):
+                raise TDE("Unable to recognize field %s in table %s for file %s"%
+                          (field, table, db_file_path))
         return table_names
     def _create_gen_obj(self, db_file_path, table, table_name):
         tdf = self.tic_dat_factory
         def tableObj() :
             assert (not tdf.primary_key_fields.get(table)) and (tdf.data_fields.get(table))
-            with sql.connect(db_file_path) as con:
+            # the caller can do anything between rows (including reading other files, which might close
+            # a shared session), so each iteration has a connection of its own
+            con = sql.connect(db_file_path)
+            try:
                 for row in con.execute("Select %s from [%s]"%
                         (", ".join(_brackets(tdf.data_fields[table])), table_name)):
                     yield list(map(_read_data_format, row))
+            finally:
+                con.close()
         return tableObj
-    def _create_tic_dat(self, db_file_path):
+    def _create_tic_dat(self, db_file_path, count_duplicates = False):
         tdf = self.tic_dat_factory
         table_names = self._check_tables_fields(db_file_path, tdf.all_tables)
-        with sql.connect(db_file_path) as con:
-            rtn = self._create_tic_dat_from_con(con, table_names)
+        rtn = self._create_tic_dat_from_con(_session(db_file_path).con, table_names, count_duplicates)
         for table in tdf.generator_tables :
             rtn[table] = self._create_gen_obj(db_file_path, table, table_names[table])
         return rtn
-    def _create_tic_dat_from_con(self, con, table_names):
+    def _create_tic_dat_from_con(self, con, table_names, count_duplicates = False):
         tdf = self.tic_dat_factory
         rtn = {}
         for table in set(tdf.all_tables).difference(tdf.generator_tables) :
@@ -210,7 +596,8 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
             if not fields:
                 assert table in tdf.generic_tables
                 fields = tuple(x[1] for x in con.execute("PRAGMA table_info(%s)"%table))
-            rtn[table]= {} if tdf.primary_key_fields.get(table, ())  else []
+            rtn[table]= (_KeyCountingDict() if count_duplicates else {}) \
+                        if tdf.primary_key_fields.get(table, ())  else []
             for row in con.execute("Select %s from [%s]"%(", ".join(_brackets(fields)),
                                                           table_names[table])):
                 if table in tdf.generic_tables:
@@ -262,48 +649,76 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
             str += ",\n".join(strl) + "\n);"
             rtn.append(str)
         return tuple(rtn)
-    def _get_data(self, tic_dat, as_sql):
-        rtn = []
-        for t in self.tic_dat_factory.all_tables:
-            _t = getattr(tic_dat, t)
-            if dictish(_t) :
-                primarykeys = tuple(self.tic_dat_factory.primary_key_fields[t])
-                for pkrow, sqldatarow in _t.items() :
-                    _items = list(sqldatarow.items())
-                    fields = primarykeys + tuple(x[0] for x in _items)
-                    datarow = ((pkrow,) if len(primarykeys)==1 else pkrow) + \
-                              tuple(x[1] for x in _items)
-                    assert len(datarow) == len(fields)
-                    str = "INSERT INTO [%s] (%s) VALUES (%s)"%(t, ",".join(_brackets(fields)),
-                          ",".join("%s" if as_sql else "?" for _ in fields))
-                    if as_sql:
-                        rtn.append((str%tuple(map(_insert_format, datarow))) + ";")
-                    else:
-                        rtn.append((str, datarow))
-            else :
-                for sqldatarow in (_t if containerish(_t) else _t()) :
-                    k,v = zip(*sqldatarow.items())
-                    str = "INSERT INTO [%s] (%s) VALUES (%s)"%\
-                             (t, ",".join(_brackets(k)), ",".join(
-                                ["%s" if as_sql else "?"]*len(sqldatarow)))
-                    if as_sql:
-                        rtn.append((str%tuple(map(_insert_format, v))) + ";")
-                    else:
-                        rtn.append((str,v))
-        return tuple(rtn)
-    def write_db_schema(self, db_file_path):
+    def _get_sql_data(self, tic_dat):
+        """
+        yields multi-row INSERT statements, each covering at most _sql_file_batch_size rows
+        """
+        tdf = self.tic_dat_factory
+        for t in tdf.all_tables:
+            fields = tdf.primary_key_fields.get(t, ()) + tdf.data_fields.get(t, ())
+            if not fields:
+                continue
+            str = "INSERT INTO [%s] (%s) VALUES\n"%(t, ",".join(_brackets(fields)))
+            rows = self._table_rows(tic_dat, t)
+            batch = list(islice(rows, _sql_file_batch_size))
+            while batch:
+                yield str + ",\n".join("(%s)"%",".join(map(_insert_format, row)) for row in batch) + ";"
+                batch = list(islice(rows, _sql_file_batch_size))
+    def _get_index_sql(self, tables, extra_indexes = None):
+        """
+        the CREATE INDEX statements for the foreign key (child) fields of the tables,
+        along with any extra indexes.
+
+        :param tables: the tables to index
+
+        :param extra_indexes: optional dictionary of table name to a list of field name lists
+
+        :return: a tuple of sql strings
+        """
+        fks = self._fks()
+        return _index_sql(self.tic_dat_factory, [(t, tuple(fk.nativetoforeignmapping()))
+                                                 for t in self._ordered_tables() if t in tables
+                                                 for fk in fks.get(t, ())],
+                          tables, extra_indexes)
+    def write_db_schema(self, db_file_path, extra_indexes = None):
         """
         :param db_file_path: the file path of the SQLite database to create
 
+        :param extra_indexes: optional dictionary of table name to a list of field name lists.
+                              Each field name list will be indexed. The foreign key fields
+                              of the schema are always indexed.
+
         :return:
         """
         verify(not self.tic_dat_factory.generic_tables,
                "generic_tables are not compatible with write_db_schema. " +
                "Use write_db_data instead.")
-        with _sql_con(db_file_path, foreign_keys=False) as con:
-            for str in self._get_schema_sql(self.tic_dat_factory.all_tables):
-                con.execute(str)
-    def write_db_data(self, tic_dat, db_file_path, allow_overwrite = False):
+        self._write_db_schema(db_file_path, extra_indexes, include_indexes=True)
+    def _write_db_schema(self, db_file_path, extra_indexes, include_indexes):
+        all_tables = self.tic_dat_factory.all_tables
+        index_sql = self._get_index_sql(all_tables, extra_indexes)
+        try:
+            with _session(db_file_path).con as con:
+                for str in self._get_schema_sql(all_tables) + (index_sql if include_indexes else ()):
+                    con.execute(str)
+        finally:
+            _release_session(db_file_path)
+    def _table_rows(self, tic_dat, t):
+        """
+        yields the rows of a table as tuples, primary key fields first and then data fields
+        """
+        tdf = self.tic_dat_factory
+        _t = getattr(tic_dat, t)
+        dfs = tdf.data_fields.get(t, ())
+        if dictish(_t):
+            one_pk = len(tdf.primary_key_fields[t]) == 1
+            for pk, row in _t.items():
+                yield ((pk,) if one_pk else tuple(pk)) + tuple(row[f] for f in dfs)
+        else:
+            for row in (_t if containerish(_t) else _t()):
+                yield tuple(row[f] for f in dfs)
+    def write_db_data(self, tic_dat, db_file_path, allow_overwrite = False, pragmas = None,
+                      extra_indexes = None):
         """
         write the ticDat data to an SQLite database file
 
@@ -313,9 +728,20 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param allow_overwrite: boolean - are we allowed to overwrite pre-existing data
 
+        :param pragmas: optional dictionary of PRAGMA settings to apply to the connection
+                        before writing. For example, {"journal_mode": "WAL", "synchronous": "OFF"}
+                        can speed up very large writes at the expense of crash safety.
+
+        :param extra_indexes: optional dictionary of table name to a list of field name lists.
+                              Each field name list will be indexed, as will the foreign key fields
+                              of the schema.
+
         :return:
 
         caveats : float("inf"), float("-inf") are written as "inf", "-inf"
+                  All the tables are written in a single transaction, one prepared INSERT
+                  statement per table. The indexes are created after the data is loaded,
+                  and then ANALYZE is run so the query planner can make use of them.
         """
         verify(sql, "sqlite3 needs to be installed to use this subroutine")
         msg = []
@@ -324,33 +750,145 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
         verify(not os.path.isdir(db_file_path), "A directory is not a valid SQLite file path")
         if self.tic_dat_factory.generic_tables:
              dat, tdf = create_generic_free(tic_dat, self.tic_dat_factory)
-             return tdf.sql.write_db_data(dat, db_file_path, allow_overwrite)
+             return tdf.sql.write_db_data(dat, db_file_path, allow_overwrite, pragmas, extra_indexes)
+        index_sql = self._get_index_sql(self.tic_dat_factory.all_tables, extra_indexes)
         if not os.path.exists(db_file_path) :
-            self.write_db_schema(db_file_path)
+            self._write_db_schema(db_file_path, extra_indexes, include_indexes=False)
         table_names = self._check_tables_fields(db_file_path, self.tic_dat_factory.all_tables)
-        with _sql_con(db_file_path, foreign_keys=False) as con:
-            for t in self.tic_dat_factory.all_tables:
-                verify(table_names[t] == t, "Failed to find table %s in path %s"%
-                                            (t, db_file_path))
-                verify(allow_overwrite or not any(True for _ in  con.execute("Select * from %s"%t)),
-                        "allow_overwrite is False, but there are already data records in %s"%t)
-                con.execute("Delete from %s"%t) if allow_overwrite else None
-            for sql_str, data in self._get_data(tic_dat, as_sql=False):
-                con.execute(sql_str, list(data))
+        con = _session(db_file_path).con
+        try:
+            _set_pragmas(con, pragmas)
+            with con:
+                for t in self.tic_dat_factory.all_tables:
+                    verify(table_names[t] == t, "Failed to find table %s in path %s"%
+                                                (t, db_file_path))
+                    verify(allow_overwrite or not any(True for _ in  con.execute("Select * from %s"%t)),
+                            "allow_overwrite is False, but there are already data records in %s"%t)
+                    con.execute("Delete from %s"%t) if allow_overwrite else None
+                for t in self.tic_dat_factory.all_tables:
+                    fields = self.tic_dat_factory.primary_key_fields.get(t, ()) + \
+                             self.tic_dat_factory.data_fields.get(t, ())
+                    if not fields:
+                        continue
+                    str = "INSERT INTO [%s] (%s) VALUES (%s)"%(t, ",".join(_brackets(fields)),
+                                                               ",".join("?" for _ in fields))
+                    _execute_batches(con, str, self._table_rows(tic_dat, t))
+                for str in index_sql:
+                    con.execute(str)
+                con.execute("ANALYZE")
+        finally:
+            # don't hold the file open once it's written (nor let the pragmas linger on the connection)
+            _release_session(db_file_path)
+
+    def write_db_delta(self, tic_dat, db_file_path, pragmas = None):
+        """
+        incrementally update an SQLite database file so that it matches the ticDat data.
+        Only the rows that differ are inserted, updated or deleted.
+
+        :param tic_dat: the data object to write
+
+        :param db_file_path: the file path of the SQLite database to update. If it doesn't exist,
+                             it is created and all the rows are inserted.
+
+        :param pragmas: optional dictionary of PRAGMA settings, as with write_db_data
+
+        :return: a dictionary keyed by table name. Each value is itself a dictionary with the
+                 number of rows "inserted", "updated" and "deleted" for that table.
+
+        caveats : Tables with primary keys are compared row by row using the primary key. Tables
+                  without primary keys are rewritten in full if they've changed at all.
+                  The existing database can't have duplicate primary keys.
+                  All the tables are updated in a single transaction.
+        """
+        verify(sql, "sqlite3 needs to be installed to use this subroutine")
+        msg = []
+        if not self.tic_dat_factory.good_tic_dat_object(tic_dat, lambda m : msg.append(m)) :
+            raise TicDatError("Not a valid TicDat object for this schema : " + " : ".join(msg))
+        verify(not os.path.isdir(db_file_path), "A directory is not a valid SQLite file path")
+        if self.tic_dat_factory.generic_tables:
+             dat, tdf = create_generic_free(tic_dat, self.tic_dat_factory)
+             return tdf.sql.write_db_delta(dat, db_file_path, pragmas)
+        index_sql = ()
+        if not os.path.exists(db_file_path) :
+            # as with write_db_data, the indexes of a new file are created after the data is loaded
+            self._write_db_schema(db_file_path, None, include_indexes=False)
+            index_sql = self._get_index_sql(self.tic_dat_factory.all_tables)
+        table_names = self._check_tables_fields(db_file_path, self.tic_dat_factory.all_tables)
+        rtn = {}
+        con = _session(db_file_path).con
+        try:
+            _set_pragmas(con, pragmas)
+            with con:
+                for t in self.tic_dat_factory.all_tables:
+                    verify(table_names[t] == t, "Failed to find table %s in path %s"%
+                                                (t, db_file_path))
+                    rtn[t] = self._write_table_delta(con, tic_dat, t)
+                for str in index_sql:
+                    con.execute(str)
+                if index_sql:
+                    con.execute("ANALYZE")
+        finally:
+            _release_session(db_file_path)
+        return rtn
+    def _write_table_delta(self, con, tic_dat, t):
+        pks = self.tic_dat_factory.primary_key_fields.get(t, ())
+        dfs = self.tic_dat_factory.data_fields.get(t, ())
+        rtn = {"inserted": 0, "updated": 0, "deleted": 0}
+        fields = pks + dfs
+        if not fields:
+            return rtn
+        insert_str = "INSERT INTO [%s] (%s) VALUES (%s)"%(t, ",".join(_brackets(fields)),
+                                                          ",".join("?" for _ in fields))
+        # the data fields are compared as they'd be read back, so that "inf", "true" and the like
+        # (which might have been written as strings) match their float and boolean counterparts
+        normalized = lambda data : tuple(map(_read_data_format, data))
+        new_rows = list(self._table_rows(tic_dat, t))
+        old_rows = list(con.execute("Select %s from [%s]"%(", ".join(_brackets(fields)), t)))
+        if not pks:
+            if clt.Counter(map(normalized, old_rows)) != clt.Counter(map(normalized, new_rows)):
+                con.execute("Delete from [%s]"%t)
+                _execute_batches(con, insert_str, new_rows)
+                rtn["deleted"], rtn["inserted"] = len(old_rows), len(new_rows)
+            return rtn
+        old = {row[:len(pks)]:normalized(row[len(pks):]) for row in old_rows}
+        verify(len(old) == len(old_rows), "Duplicate primary keys found in table %s. "%t +
+               "Use write_db_data with allow_overwrite=True instead.")
+        new = {row[:len(pks)]:row[len(pks):] for row in new_rows}
+        where = " and ".join("[%s] = ?"%f for f in pks)
+        deletes = [pk for pk in old if pk not in new]
+        inserts = [pk + data for pk, data in new.items() if pk not in old]
+        updates = [pk + data for pk, data in new.items() if pk in old and old[pk] != normalized(data)]
+        _execute_batches(con, "Delete from [%s] where %s"%(t, where), deletes)
+        # upsert needs SQLite 3.24 and a PRIMARY KEY or UNIQUE constraint on exactly the primary key fields,
+        # which files written by pandas or other tools might lack
+        if updates and sql.sqlite_version_info >= (3, 24, 0) and _has_unique_constraint(con, t, pks):
+            _execute_batches(con, insert_str + " ON CONFLICT(%s) DO UPDATE SET %s"%
+                             (",".join(_brackets(pks)), ", ".join("[%s] = excluded.[%s]"%(f, f) for f in dfs)),
+                             inserts + updates)
+        else:
+            _execute_batches(con, insert_str, inserts)
+            _execute_batches(con, "UPDATE [%s] SET %s where %s"%
+                             (t, ", ".join("[%s] = ?"%f for f in dfs), where),
+                             [row[len(pks):] + row[:len(pks)] for row in updates])
+        rtn["deleted"], rtn["inserted"], rtn["updated"] = len(deletes), len(inserts), len(updates)
+        return rtn
 
     def write_sql_file(self, tic_dat, sql_file_path, include_schema = False,
-                       allow_overwrite = False):
+                       allow_overwrite = False, compress_threads = 1):
         """
         write the sql for the ticDat data to a text file
 
         :param tic_dat: the data object to write
 
-        :param sql_file_path: the path of the text file to hold the sql statements for the data
+        :param sql_file_path: the path of the text file to hold the sql statements for the data.
+                              If it ends with ".gz", ".bz2" or ".xz", the file will be compressed.
 
         :param include_schema: boolean - should we write the schema sql first?
 
         :param allow_overwrite: boolean - are we allowed to overwrite pre-existing file
 
+        :param compress_threads: positive integer. The number of threads used to compress the file.
+
         :return:
 
         caveats : float("inf"), float("-inf") are written as "inf", "-inf"
@@ -362,12 +900,15 @@ class SQLiteTicFactory(freezable_factory(object, "_isFrozen")) :
         if self.tic_dat_factory.generic_tables:
              gt = self.tic_dat_factory.generic_tables
              dat, tdf = create_generic_free(tic_dat, self.tic_dat_factory)
-             return tdf.sql._write_sql_file(dat, sql_file_path, must_schema.union(gt))
-        return self._write_sql_file(tic_dat, sql_file_path, must_schema)
+             return tdf.sql._write_sql_file(dat, sql_file_path, must_schema.union(gt), compress_threads)
+        return self._write_sql_file(tic_dat, sql_file_path, must_schema, compress_threads)
 
-    def _write_sql_file(self, tic_dat, sql_file_path, schema_tables):
-        with open(sql_file_path, "w") as f:
-            for str in self._get_schema_sql(schema_tables) + \
-                       self._get_data(tic_dat, as_sql=True):
+    def _write_sql_file(self, tic_dat, sql_file_path, schema_tables, compress_threads = 1):
+        with _open_data_file(sql_file_path, "w", compress_threads) as f:
+            for str in self._get_schema_sql(schema_tables):
+                f.write(str + "\n")
+            for str in self._get_sql_data(tic_dat):
+                f.write(str + "\n")
+            for str in self._get_index_sql(schema_tables):
                 f.write(str + "\n")
 
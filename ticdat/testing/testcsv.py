@@ -173,6 +173,39 @@ class TestCsv(unittest.TestCase):
         csvTicDat = tdf.csv.create_tic_dat(dirPath, freeze_it=True)
         self.assertFalse(tdf._same_data(ticDat, csvTicDat))
 
+    def testCompression(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
+        for compression in ("gz", "bz2", "xz"):
+            dirPath = os.path.join(_scratchDir, "netflow_" + compression)
+            tdf.csv.write_directory(ticDat, dirPath, compression=compression)
+            self.assertTrue(os.path.exists(os.path.join(dirPath, "arcs.csv." + compression)))
+            self.assertTrue(tdf._same_data(ticDat, tdf.csv.create_tic_dat(dirPath)))
+            self.assertFalse(tdf.csv.find_duplicates(dirPath))
+        # a plain csv file alongside a compressed one is ambiguous
+        tdf.csv.write_directory(ticDat, dirPath, allow_overwrite=True)
+        self.assertTrue(self.firesException(lambda : tdf.csv.create_tic_dat(dirPath)))
+
+        old_block_size = utils._compression_block_size
+        utils._compression_block_size = 64 # so that the file is compressed as several concatenated blocks
+        try:
+            dirPath = os.path.join(_scratchDir, "netflow_threads")
+            tdf.csv.write_directory(ticDat, dirPath, compression="gz", compress_threads=2)
+        finally:
+            utils._compression_block_size = old_block_size
+        self.assertTrue(tdf._same_data(ticDat, tdf.csv.create_tic_dat(dirPath)))
+        self.assertTrue(self.firesException(lambda : tdf.csv.write_directory(ticDat, dirPath, allow_overwrite=True,
+                                                                              compression="zip")))
+
+        zipPath = os.path.join(_scratchDir, "netflow.zip")
+        tdf.csv.write_directory(ticDat, zipPath)
+        self.assertTrue(os.path.isfile(zipPath))
+        self.assertTrue(tdf._same_data(ticDat, tdf.csv.create_tic_dat(zipPath)))
+        self.assertFalse(tdf.csv.find_duplicates(zipPath))
+        self.assertTrue(self.firesException(lambda : tdf.csv.write_directory(ticDat, zipPath)))
+
     def testSilly(self):
         if not self.can_run:
             return
@@ -259,6 +292,12 @@ class TestCsv(unittest.TestCase):
             rowCount = tdf.csv.find_duplicates(dirPath, headers_present=headersPresent)
             self.assertTrue(set(rowCount) == {'a', 'b'} and set(rowCount["a"]) == {1} and rowCount["a"][1]==3)
             self.assertTrue(set(rowCount["b"]) == {(1,20,30)} and rowCount["b"][1,20,30]==2)
+            loadedCount = []
+            ticDatMan = tdf.csv.create_tic_dat(dirPath, headers_present=headersPresent,
+                                               duplicates_handler=loadedCount.append)
+            self.assertTrue(loadedCount == [rowCount] and ticDatMan.b[1,20,30]["bData"] == 12)
+            self.assertTrue(firesException(lambda : tdf.csv.create_tic_dat(dirPath, headers_present=headersPresent,
+                                                duplicates_handler=utils._assert_no_duplicates)))
 
 
 
@@ -1,4 +1,5 @@
 import os
+import ticdat.utils as utils
 import shutil
 from ticdat.ticdatfactory import TicDatFactory
 from ticdat.testing.ticdattestutils import dietData, dietSchema, netflowData, dietSchemaWeirdCase
@@ -6,7 +7,9 @@ from ticdat.testing.ticdattestutils import  netflowSchema, firesException, copyD
 from ticdat.testing.ticdattestutils import sillyMeData, sillyMeSchema, sillyMeDataTwoTables, fail_to_debugger
 from ticdat.testing.ticdattestutils import makeCleanDir, dietSchemaWeirdCase2, copyDataDietWeirdCase2
 import unittest
-from ticdat.jsontd import _can_unit_test, json
+import itertools
+from ticdat.jsontd import _can_unit_test, json, _JsonStream
+from io import StringIO
 
 #@fail_to_debugger
 class TestJson(unittest.TestCase):
@@ -147,6 +150,9 @@ class TestJson(unittest.TestCase):
             tdf2.json.write_file(td, writePath, verbose=verbose)
             dups = tdf.json.find_duplicates(writePath)
             self.assertTrue(dups == {'three': {(1, 2, 2): 2}, 'two': {(1, 2): 3}, 'one': {1: 3, 2: 2}})
+            loaded_dups = []
+            tdf.json.create_tic_dat(writePath, duplicates_handler=loaded_dups.append)
+            self.assertTrue(loaded_dups == [dups])
 
     def testSilly(self):
         if not self.can_run:
@@ -160,6 +166,119 @@ class TestJson(unittest.TestCase):
             self.assertFalse(tdf.json.find_duplicates(writePath))
             self.assertTrue(tdf._same_data(ticDat, jsonTicDat))
 
+    def testStreaming(self):
+        if not self.can_run:
+            return
+        doc = {"a b": [[1, -2.5e3, "x\\\"y"], [True, None, {"k": [1, {}]}]], "empty": [], "e2": {},
+               "unicode": ["\u00e9\u4e2d", 12345678901234567890], "n": 3}
+        text = json.dumps(doc, indent=1)
+        for chunk_size in [1, 2, 3, 7, 1000]:
+            def stream():
+                return _JsonStream(StringIO(text), chunk_size=chunk_size)
+            self.assertTrue(stream().value() == doc)
+            s, rtn = stream(), {}
+            for k in s.keys():
+                if s.peek() == "[":
+                    rtn[k] = list(s.values()) if chunk_size % 2 else [s.value() for _ in s.elements()]
+                elif k == "e2":
+                    s.skip()
+                else:
+                    rtn[k] = s.value()
+            s.verify_end()
+            self.assertTrue(rtn == {k:v for k,v in doc.items() if k != "e2"})
+            s = stream()
+            s.skip()
+            self.assertTrue(s.peek() == "")
+        def skip_all(text, chunk_size):
+            s = _JsonStream(StringIO(text), chunk_size=chunk_size)
+            s.skip()
+            s.verify_end()
+        for bad in ['{"a": [1, 2}', '{"a" [1]}', '{"a": [1]} x', '{"a": [tru]}', '{"a": [1,]}', '{1: 2}']:
+            for chunk_size in [2, 1000]:
+                self.assertTrue(firesException(lambda : skip_all(bad, chunk_size)))
+        for bad in ['[1, 2}', '1]', '[tru]', '[1,]', '[1 2]', '["a]']:
+            for chunk_size in [2, 1000]:
+                self.assertTrue(firesException(lambda : list(_JsonStream(StringIO(bad), chunk_size).values())))
+
+        tdf = TicDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        writePath = os.path.join(makeCleanDir(os.path.join(_scratchDir, "streaming")), "file.json")
+        tdf.json.write_file(ticDat, writePath)
+        with open(writePath, "r") as f:
+            jdict = json.load(f)
+        jdict["not a table"] = [[i, {"deep": list(range(i))}] for i in range(100)]
+        jdict["NUTRITIONquantities"] = jdict.pop("nutritionQuantities")
+        with open(writePath, "w") as f:
+            json.dump(jdict, f)
+        self.assertTrue(tdf._same_data(ticDat, tdf.json.create_tic_dat(writePath)))
+        self.assertFalse(tdf.json.find_duplicates(writePath))
+        with open(writePath, "w") as f:
+            f.write(json.dumps(jdict)[:-20])
+        self.assertTrue(self.firesException(lambda : tdf.json.create_tic_dat(writePath)))
+        with open(writePath, "w") as f:
+            json.dump(dict(jdict, foods=7), f)
+        self.assertTrue(self.firesException(lambda : tdf.json.create_tic_dat(writePath)))
+
+    def testCompact(self):
+        if not self.can_run:
+            return
+        import ticdat.jsontd as jsontd
+        tdf = TicDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        ticDat2 = tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields})
+        ticDat2.foods["inf food"] = float("inf")
+        ticDat2.categories.clear()
+        dirPath = makeCleanDir(os.path.join(_scratchDir, "compact"))
+        old_batch_size = jsontd._json_write_batch_size
+        jsontd._json_write_batch_size = 3
+        try:
+            for verbose, ext, dat in itertools.product([True, False], [".json", ".json.gz", ".json.bz2", ".json.xz"], [ticDat, ticDat2]):
+                compactPath, prettyPath = [os.path.join(dirPath, _ + ext) for _ in ("compact", "pretty")]
+                tdf.json.write_file(dat, compactPath, allow_overwrite=True, verbose=verbose, compact=True)
+                tdf.json.write_file(dat, prettyPath, allow_overwrite=True, verbose=verbose)
+                self.assertTrue(tdf._same_data(dat, tdf.json.create_tic_dat(compactPath)))
+                self.assertTrue(tdf._same_data(dat, tdf.json.create_tic_dat(prettyPath)))
+                self.assertTrue(os.path.getsize(compactPath) < os.path.getsize(prettyPath))
+                with utils._open_data_file(compactPath, "r") as f:
+                    jdict = json.load(f)
+                self.assertTrue({k:v for k,v in jdict.items() if v} == jsontd.make_json_dict(tdf, dat, verbose))
+        finally:
+            jsontd._json_write_batch_size = old_batch_size
+        self.assertTrue(firesException(lambda : tdf.json.write_file(ticDat, compactPath, compact=True)))
+
+    def testJsonLines(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        for verbose in [True, False]:
+            dirPath = os.path.join(_scratchDir, "jsonl_%s"%verbose)
+            tdf.json.write_jsonl_directory(ticDat, dirPath, verbose=verbose)
+            self.assertTrue(set(os.listdir(dirPath)) == {t + ".jsonl" for t in tdf.all_tables})
+            self.assertTrue(tdf._same_data(ticDat, tdf.json.create_tic_dat_from_jsonl(dirPath)))
+            self.assertTrue(firesException(lambda : tdf.json.write_jsonl_directory(ticDat, dirPath)))
+        os.rename(os.path.join(dirPath, "cost.jsonl"), os.path.join(dirPath, "COST.jsonl"))
+        os.remove(os.path.join(dirPath, "inflow.jsonl"))
+        dat = tdf.json.create_tic_dat_from_jsonl(dirPath, freeze_it=True)
+        self.assertTrue(dat.cost and not dat.inflow and len(dat.arcs) == len(ticDat.arcs))
+
+        tdf = TicDatFactory(solution = [[], ["step", "value"]], summary = [["name"], ["value"]])
+        tdf.set_generator_tables(["solution"])
+        dirPath = os.path.join(_scratchDir, "jsonl_gen")
+        tdf.json.write_jsonl_directory(tdf.TicDat(solution = [[1, 1.5]], summary = {"a": 1}), dirPath)
+        dat = tdf.json.create_tic_dat_from_jsonl(dirPath)
+        self.assertTrue([tuple(_.values()) for _ in dat.solution()] == [(1, 1.5)])
+        tdf.json.write_jsonl_directory(tdf.TicDat(solution = lambda : ([i, i*2] for i in range(2, 4))),
+                                       dirPath, append=True)
+        self.assertTrue([(_["step"], _["value"]) for _ in dat.solution()] == [(1, 1.5), (2, 4), (3, 6)])
+        with open(os.path.join(dirPath, "solution.jsonl"), "a") as f:
+            f.write('{"step": 4, "value": 8}\n[5, ')
+        self.assertTrue(len(list(dat.solution())) == 4)
+        with open(os.path.join(dirPath, "solution.jsonl"), "a") as f:
+            f.write('10]\n[6]\n')
+        self.assertTrue(firesException(lambda : list(dat.solution())))
+        self.assertTrue(firesException(lambda : tdf.json.create_tic_dat_from_jsonl(os.path.join(dirPath, "x"))))
+
 _scratchDir = TestJson.__name__ + "_scratch"
 
 # Run the tests.
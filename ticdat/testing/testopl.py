@@ -1,5 +1,5 @@
 import os
-from ticdat.opl import create_opl_text, read_opl_text, opl_run,create_opl_mod_text
+from ticdat.opl import create_opl_text, read_opl_text, opl_run,create_opl_mod_text, write_opl_text
 from ticdat.opl import _can_run_oplrun_tests
 import sys
 from ticdat.ticdatfactory import TicDatFactory
@@ -8,6 +8,7 @@ from ticdat.testing.ticdattestutils import dietData, dietSchema, netflowData, ad
 from ticdat.testing.ticdattestutils import  netflowSchema,sillyMeData, sillyMeSchema
 from ticdat.testing.ticdattestutils import fail_to_debugger, flagged_as_run_alone, get_testing_file_path
 import unittest
+from io import StringIO
 
 #@fail_to_debugger
 class TestOpl(unittest.TestCase):
@@ -128,6 +129,16 @@ class TestOpl(unittest.TestCase):
         oldDatStr = create_opl_text(tdf, oldDat)
         newDat = read_opl_text(tdf, oldDatStr)
         self.assertTrue(tdf._same_data(oldDat, newDat))
+        streamed = StringIO()
+        write_opl_text(tdf, oldDat, streamed)
+        self.assertTrue(streamed.getvalue() == oldDatStr)
+        oldDat = tdf.TicDat(cost={k:dict(v) for k,v in oldDat.cost.items()})
+        oldDat.cost["Pens", "Detroit", "Boston"] = float("inf")
+        streamed = StringIO()
+        write_opl_text(tdf, oldDat, streamed, infinity=1e9)
+        self.assertTrue(streamed.getvalue() == create_opl_text(tdf, oldDat, infinity=1e9))
+        self.assertTrue(streamed.getvalue().startswith("stuffcost = {\n") and "1000000000.0" in streamed.getvalue())
+        self.assertTrue(read_opl_text(tdf, streamed.getvalue()).cost["Pens", "Detroit", "Boston"]["cost"] == 1e9)
 
     def testSilly(self):
         tdf = TicDatFactory(**sillyMeSchema())
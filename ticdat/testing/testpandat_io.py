@@ -4,7 +4,7 @@ from ticdat.utils import DataFrame, numericish, ForeignKey, ForeignKeyMapping
 import ticdat.utils as utils
 from ticdat.testing.ticdattestutils import fail_to_debugger, flagged_as_run_alone, spacesSchema, firesException
 from ticdat.testing.ticdattestutils import netflowSchema, pan_dat_maker, dietSchema, spacesData
-from ticdat.testing.ticdattestutils import makeCleanDir, netflowData, dietData, addDietForeignKeys
+from ticdat.testing.ticdattestutils import makeCleanDir, netflowData, dietData, addDietForeignKeys, addNetflowForeignKeys
 from ticdat.testing.ticdattestutils import sillyMeData, sillyMeSchema, sillyMeDataTwoTables
 from ticdat.ticdatfactory import TicDatFactory
 import ticdat.pandatio as pandatio
@@ -133,6 +133,135 @@ class TestIO(unittest.TestCase):
         panDat2 = pdf.xls.create_pan_dat(filePath)
         self.assertTrue(pdf._same_data(panDat, panDat2))
 
+    def testXlsFastWrite(self):
+        if not self.can_run:
+            return
+        import pandas as pd
+        pdf = PanDatFactory(mixed = [["name"], ["num", "flag", "when", "note"]])
+        df = DataFrame({"name": ["a", "b", "c", "d"], "num": [1.5, float("inf"), float("nan"), -float("inf")],
+                        "flag": [True, False, True, False],
+                        "when": pd.to_datetime(["2017-01-02", "2017-03-04 05:06:07", None, "2018-01-01"]),
+                        "note": ["x", None, "z", "w"]})
+        panDat = pdf.PanDat(mixed = df[["name", "num", "flag", "when", "note"]])
+        pandasPath = os.path.join(_scratchDir, "mixed.xls")
+        pdf.xls.write_file(panDat, pandasPath)
+        for constant_memory in [False, True]:
+            filePath = os.path.join(_scratchDir, "mixed_%s.xlsx"%constant_memory)
+            pdf.xls.write_file(panDat, filePath, constant_memory=constant_memory)
+            self.assertTrue(pd.read_excel(filePath).equals(pd.read_excel(pandasPath)))
+
+        tdf = TicDatFactory(**netflowSchema())
+        pdf = PanDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(netflowSchema(), ticDat)
+        filePath = os.path.join(_scratchDir, "netflow_cm.xlsx")
+        pdf.xls.write_file(panDat, filePath, constant_memory=True)
+        self.assertTrue(pdf._same_data(panDat, pdf.xls.create_pan_dat(filePath)))
+
+    def testXlsParseHints(self):
+        if not self.can_run:
+            return
+        import pandas as pd
+        filePath = os.path.join(_scratchDir, "hints.xlsx")
+        writer = pd.ExcelWriter(filePath)
+        DataFrame({"code": [2134, "x", 17], "cost": [1, 2.5, "inf"], "extra": ["a", "b", "c"]}).to_excel(
+            writer, "table_one", index=False)
+        DataFrame({"code": ["y", 5], "cost": ["bad", 3]}).to_excel(writer, "table two", index=False)
+        writer.save()
+        pdf = PanDatFactory(table_one = [["code"], ["cost"]], table_two = [["code"], ["cost"]])
+        for t in pdf.all_tables:
+            pdf.set_data_type(t, "code", number_allowed=False, strings_allowed="*")
+            pdf.set_data_type(t, "cost", max=float("inf"), inclusive_max=True)
+        dat = pdf.xls.create_pan_dat(filePath)
+        self.assertTrue(list(dat.table_one.columns) == ["code", "cost"])
+        self.assertTrue(list(dat.table_one.code) == ["2134", "x", "17"])
+        self.assertTrue(list(dat.table_one.cost) == [1, 2.5, float("inf")])
+        self.assertTrue(list(dat.table_two.cost) == ["bad", 3])
+        self.assertTrue(pdf.find_data_type_failures(dat))
+        pdf2 = PanDatFactory(table_one = "*")
+        self.assertTrue(list(pdf2.xls.create_pan_dat(filePath).table_one.columns) == ["code", "cost", "extra"])
+
+    def testJsonStreaming(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        pdf = PanDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(netflowSchema(), ticDat)
+        jdict = json.loads(pdf.json.write_file(panDat, ""))
+        jdict["not a table"] = {"data": [[i, list(range(i))] for i in range(50)]}
+        jdict["Inflow"] = jdict.pop("inflow")
+        panDat2 = pdf.json.create_pan_dat(json.dumps(jdict, indent=2))
+        self.assertTrue(pdf._same_data(panDat, panDat2))
+        filePath = os.path.join(_scratchDir, "netflow_stream.json")
+        with open(filePath, "w") as f:
+            json.dump(jdict, f)
+        self.assertTrue(pdf._same_data(panDat, pdf.json.create_pan_dat(filePath)))
+        self.assertTrue(self.firesException(lambda : pdf.json.create_pan_dat(json.dumps(jdict)[:-10])))
+        self.assertTrue(self.firesException(lambda : pdf.json.create_pan_dat(json.dumps(dict(jdict, nodes=[])))))
+
+    def testJsonDirect(self):
+        if not self.can_run:
+            return
+        import pandas as pd
+        pdf = PanDatFactory(mixed = [["name"], ["num", "count", "flag", "when", "note"]])
+        pdf.set_data_type("mixed", "note", number_allowed=False, strings_allowed="*", nullable=True)
+        df = DataFrame({"name": ["a", "b", "c", "d"], "num": [1.5, float("inf"), float("nan"), -float("inf")],
+                        "count": [1, 2, 3, 4], "flag": [True, False, True, False],
+                        "when": pd.to_datetime(["2017-01-02", "2017-03-04 05:06:07", None, "2018-01-01"]),
+                        "note": ["x", None, "inf", "w"]})[["name", "num", "count", "flag", "when", "note"]]
+        inf_free = df.replace(float("inf"), "inf").replace(-float("inf"), "-inf")
+        for orient, index in [("split", False), ("split", True), ("records", True), ("columns", True)]:
+            self.assertTrue(pdf.json._json_structure(inf_free, orient, index) ==
+                            {k:v for k,v in json.loads(inf_free.to_json(orient=orient)).items()
+                             if index or k != "index"} if orient != "records" else
+                            json.loads(inf_free.to_json(orient=orient)))
+        panDat = pdf.PanDat(mixed=df)
+        for orient in ["split", "records", "columns"]:
+            panDat2 = pdf.json.create_pan_dat(pdf.json.write_file(panDat, "", orient=orient), orient=orient)
+            self.assertTrue(list(panDat2.mixed.num) [:2] == [1.5, float("inf")] and
+                            list(panDat2.mixed.note) == ["x", None, "inf", "w"])
+            self.assertTrue(list(panDat2.mixed["count"]) == [1, 2, 3, 4])
+            value = json.loads(pdf.json.write_file(panDat, "", orient=orient))["mixed"]
+            # read_json also turns "inf" into a number, which create_pan_dat does afterwards
+            self.assertTrue(pdf.json._json_frame(value, orient, {}).drop("num", axis=1).equals(
+                pd.read_json(json.dumps(value), orient=orient).drop("num", axis=1)))
+        panDat3 = pdf.json.create_pan_dat(pdf.json.write_file(panDat, "", orient="split"),
+                                          orient="split", convert_dates=["when"])
+        self.assertTrue(list(panDat3.mixed.when)[1] == df.when[1])
+
+    def testJsonLines(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**dietSchema())
+        pdf = PanDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(dietSchema(), ticDat)
+        dirPath = os.path.join(_scratchDir, "diet_jsonl")
+        pdf.json.write_jsonl_directory(panDat, dirPath)
+        self.assertTrue(pdf._same_data(panDat, pdf.json.create_pan_dat_from_jsonl(dirPath)))
+        tdf.json.write_jsonl_directory(ticDat, dirPath, allow_overwrite=True, verbose=True)
+        self.assertTrue(pdf._same_data(panDat, pdf.json.create_pan_dat_from_jsonl(dirPath)))
+        pdf.json.write_jsonl_directory(panDat, dirPath, append=True)
+        self.assertTrue(len(pdf.json.create_pan_dat_from_jsonl(dirPath).foods) == 2 * len(panDat.foods))
+
+        pdf2 = PanDatFactory(**{t:'*' for t in pdf.all_tables})
+        dirPath = os.path.join(_scratchDir, "diet_jsonl_2")
+        pdf2.json.write_jsonl_directory(panDat, dirPath, case_space_table_names=True)
+        self.assertTrue(pdf._same_data(panDat, pdf2.json.create_pan_dat_from_jsonl(dirPath)))
+        self.assertTrue(pdf._same_data(panDat, pdf.json.create_pan_dat_from_jsonl(dirPath)))
+        os.remove(os.path.join(dirPath, "Foods.jsonl"))
+        self.assertTrue(self.firesException(lambda : pdf.json.create_pan_dat_from_jsonl(dirPath)))
+
+        pdf = PanDatFactory(table=[["name"], ["cost", "extra"]])
+        dirPath = os.path.join(_scratchDir, "jsonl_inf")
+        os.mkdir(dirPath)
+        with open(os.path.join(dirPath, "table.jsonl"), "w") as f:
+            f.write('{"name": "a", "cost": "inf"}\n{"name": "b", "cost": 2}\n')
+        self.assertTrue(self.firesException(lambda : pdf.json.create_pan_dat_from_jsonl(dirPath)))
+        dat = pdf.json.create_pan_dat_from_jsonl(dirPath, fill_missing_fields=True)
+        self.assertTrue(list(dat.table.cost) == [float("inf"), 2] and list(dat.table.extra) == [0, 0])
+
     def testDefaultAdd(self):
         if not self.can_run:
             return
@@ -229,6 +358,126 @@ class TestIO(unittest.TestCase):
         sqlPanDat = pdf2.sql.create_pan_dat(filePath)
         self.assertTrue(pdf._same_data(panDat, sqlPanDat))
 
+    def testSqlChunked(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**dietSchema())
+        pdf = PanDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(dietSchema(), ticDat)
+        filePath = os.path.join(_scratchDir, "diet_chunked.db")
+        pdf.sql.write_file(panDat, filePath)
+        for chunksize in [1, 2, 1000]:
+            self.assertTrue(pdf._same_data(panDat, pdf.sql.create_pan_dat(filePath, chunksize=chunksize)))
+        self.assertTrue(self.firesException(lambda : pdf.sql.create_pan_dat(filePath, chunksize=0)))
+        self.assertTrue(self.firesException(lambda : pdf.sql.create_pan_dat(filePath, where={"nah": "1"})))
+
+        panDat2 = pdf.sql.create_pan_dat(filePath, chunksize=2, where={"foods": "[cost] > 2"})
+        self.assertTrue(set(panDat2.foods["name"]) == {n for n,r in ticDat.foods.items() if r["cost"] > 2})
+        self.assertTrue(len(panDat2.nutritionQuantities) == len(panDat.nutritionQuantities))
+        panDat3 = pdf.sql.create_pan_dat(filePath, where={"foods": ("[cost] > ?", [2])})
+        self.assertTrue(pdf._same_data(panDat2, panDat3))
+        panDat3 = pdf.sql.create_pan_dat(filePath, chunksize=2, where={"foods": ("[name] in (?, ?)", ("milk", "nah"))})
+        self.assertTrue(list(panDat3.foods["name"]) == ["milk"])
+        self.assertTrue(self.firesException(lambda : pdf.sql.create_pan_dat(filePath, where={"foods": ("0",)})))
+        panDat2 = pdf.sql.create_pan_dat(filePath, chunksize=2, where={"foods": "0"})
+        self.assertTrue(list(panDat2.foods.columns) == ["name", "cost"] and not len(panDat2.foods))
+
+        pdf = PanDatFactory(table=[["name"], ["amount"]])
+        pdf.set_data_type("table", "amount", nullable=True)
+        with pandatio.sql.connect(filePath) as con:
+            con.execute("Create Table [table] (name text, amount, other text)")
+            con.executemany("Insert Into [table] Values (?, ?, ?)",
+                            [["a", None, "x"], ["b", None, "y"], ["c", 3, "z"]])
+        for chunksize in [None, 2]:
+            panDat2 = pdf.sql.create_pan_dat(filePath, chunksize=chunksize)
+            self.assertTrue(list(panDat2.table.columns) == ["name", "amount"])
+            self.assertTrue(str(panDat2.table["amount"].dtype) == "float64")
+            self.assertTrue(list(panDat2.table["amount"].fillna(-1)) == [-1, -1, 3])
+        pdf = PanDatFactory(table="*")
+        self.assertTrue(list(pdf.sql.create_pan_dat(filePath).table.columns) == ["name", "amount", "other"])
+
+    def testProjectedRead(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        pdf = PanDatFactory(**netflowSchema())
+        pdf.set_default_value("arcs", "capacity", 12)
+        ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
+        panDat = pan_dat_maker(netflowSchema(), ticDat)
+        dirPath = os.path.join(_scratchDir, "netflow_projected")
+        pdf.csv.write_directory(panDat, dirPath)
+        filePath = os.path.join(_scratchDir, "netflow_projected.db")
+        pdf.sql.write_file(panDat, filePath)
+        jsonPath = os.path.join(_scratchDir, "netflow_projected.json")
+        pdf.json.write_file(panDat, jsonPath)
+        os.remove(os.path.join(dirPath, "cost.csv")) # skipped tables needn't exist
+        self.assertTrue(self.firesException(lambda : pdf.csv.create_pan_dat(dirPath)))
+        for read in [lambda **kw : pdf.csv.create_pan_dat(dirPath, **kw),
+                     lambda **kw : pdf.sql.create_pan_dat(filePath, **kw),
+                     lambda **kw : pdf.json.create_pan_dat(jsonPath, **kw)]:
+            dat = read(tables=["arcs", "nodes"], fields={"arcs": []})
+            self.assertTrue(pdf.good_pan_dat_object(dat))
+            self.assertTrue(list(dat.cost.columns) == ["commodity", "source", "destination", "cost"])
+            self.assertTrue(not len(dat.cost) and not len(dat.inflow) and len(dat.nodes) == len(panDat.nodes))
+            self.assertTrue(list(dat.arcs.columns) == ["source", "destination", "capacity"])
+            self.assertTrue(len(dat.arcs) == len(panDat.arcs) and set(dat.arcs["capacity"]) == {12})
+            dat = read(fields={"arcs": ["capacity"]}, tables=["arcs", "inflow"])
+            self.assertTrue(pdf._same_data(pdf.PanDat(arcs=panDat.arcs, inflow=panDat.inflow), dat))
+        self.assertTrue(self.firesException(lambda : pdf.csv.create_pan_dat(dirPath, fields={"arcs": ["nah"]})))
+
+    def testSqlBulk(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        pdf = PanDatFactory(**netflowSchema())
+        addNetflowForeignKeys(pdf)
+        pdf.set_data_type("arcs", "capacity", must_be_int=True)
+        pdf.set_data_type("commodities", "name", number_allowed=False, strings_allowed='*')
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(netflowSchema(), ticDat)
+        filePath = os.path.join(_scratchDir, "netflow_bulk.db")
+        pdf.sql.write_file(panDat, filePath, bulk=True, chunksize=3)
+        self.assertTrue(pdf._same_data(panDat, pdf.sql.create_pan_dat(filePath)))
+        with pandatio.sql.connect(filePath) as con:
+            self.assertTrue({r[1]:(r[2], r[5]) for r in con.execute("PRAGMA table_info([arcs])")} ==
+                            {"source": ("", 1), "destination": ("", 2), "capacity": ("INT", 0)})
+            self.assertTrue([r[2] for r in con.execute("PRAGMA table_info([commodities])")] == ["TEXT"])
+            indexes = {r[0] for r in con.execute("Select tbl_name from sqlite_master where type='index'")}
+            self.assertTrue({"cost", "inflow"}.issubset(indexes))
+            self.assertTrue(firesException(lambda : con.execute("Insert Into arcs Values ('Detroit', 'Boston', 1)")))
+
+        self.assertTrue(self.firesException(lambda : pdf.sql.write_file(panDat, filePath, bulk=True, if_exists="fail")))
+        pdf.sql.write_file(panDat, filePath, bulk=True) # replace is the default
+        self.assertTrue(pdf._same_data(panDat, pdf.sql.create_pan_dat(filePath)))
+        pdf.sql.write_file(panDat, filePath, bulk=True, pragmas={"journal_mode": "WAL"},
+                           extra_indexes={"arcs": [["capacity"]], "cost": [["cost", "source"]]})
+        self.assertTrue(pdf._same_data(panDat, pdf.sql.create_pan_dat(filePath)))
+        tdf2 = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf2)
+        with pandatio.sql.connect(filePath) as con:
+            self.assertTrue(list(con.execute("PRAGMA journal_mode"))[0][0].lower() == "wal")
+            # the same indexes as the TicDat writer creates
+            self.assertTrue({r[0] for r in con.execute("Select name from sqlite_master where type='index'")
+                             if not r[0].startswith("sqlite_autoindex")} ==
+                            {_.split("[")[1].split("]")[0] for _ in tdf2.sql._get_index_sql(tdf2.all_tables,
+                                {"arcs": [["capacity"]], "cost": [["cost", "source"]]})})
+        self.assertTrue(self.firesException(lambda : pdf.sql.write_file(panDat, filePath,
+                                                                        pragmas={"synchronous": "OFF"})))
+        self.assertTrue(self.firesException(lambda : pdf.sql.write_file(panDat, filePath, bulk=True,
+                                                                        extra_indexes={"arcs": [["nope"]]})))
+        panDat.arcs = panDat.arcs.append(panDat.arcs.iloc[:1])
+        ex = self.firesException(lambda : pdf.sql.write_file(panDat, filePath, bulk=True))
+        self.assertTrue("UNIQUE" in ex)
+
+        pdf2 = PanDatFactory(**{t:'*' for t in pdf.all_tables})
+        with pandatio.sql.connect(filePath) as con:
+            pdf2.sql.write_file(panDat, None, con=con, bulk=True, case_space_table_names=True)
+            pdf2.sql.write_file(panDat, None, con=con, bulk=True, case_space_table_names=True, if_exists="append")
+        panDat2 = pdf2.sql.create_pan_dat(filePath)
+        self.assertTrue(len(panDat2.arcs) == 2 * len(panDat.arcs) and len(panDat2.cost) == 2 * len(panDat.cost))
+        self.assertTrue(self.firesException(lambda : pdf.sql.write_file(panDat, None, con=object(), bulk=True)))
+
     def testSqlSpacey(self):
         if not self.can_run:
             return
@@ -335,6 +584,89 @@ class TestIO(unittest.TestCase):
         panDat2 = pdf.csv.create_pan_dat(dirPath, decimal=",")
         self.assertTrue(pdf._same_data(panDat, panDat2))
 
+    def testCsvHintsAndChunks(self):
+        if not self.can_run:
+            return
+        pdf = PanDatFactory(table=[["name"], ["cost", "count", "code"]])
+        pdf.set_data_type("table", "name", number_allowed=False, strings_allowed='*')
+        pdf.set_data_type("table", "cost")
+        pdf.set_data_type("table", "count", must_be_int=True)
+        pdf.set_data_type("table", "code", number_allowed=False, strings_allowed='*')
+        dirPath = os.path.join(_scratchDir, "csv_hints")
+        os.mkdir(dirPath)
+        filePath = os.path.join(dirPath, "table.csv")
+        with open(filePath, "w") as f:
+            f.write("name,cost,count,code,junk\n")
+            for i in range(1000):
+                f.write("%s,%s,%s,00%s,%s\n"%(i, i if i%2 else "inf", i, i, i))
+        orig_chunk_size = pandatio._csv_min_chunk_size
+        try:
+            pandatio._csv_min_chunk_size = 1000
+            for threads in [1, 4]:
+                df = pdf.csv.create_pan_dat(dirPath, threads=threads).table
+                self.assertTrue(list(df.columns) == ["name", "cost", "count", "code"])
+                self.assertTrue(list(map(str, df.dtypes)) == ["object", "float64", "int64", "object"])
+                self.assertTrue(list(df["name"]) == list(map(str, range(1000))))
+                self.assertTrue(list(df["code"])[:2] == ["000", "001"] and df["cost"][0] == float("inf"))
+            df = pdf.csv.create_pan_dat(dirPath, threads=4, usecols=["name", "cost", "count", "code"]).table
+            self.assertTrue(list(df["name"])[:2] == ["0", "1"])
+            self.assertTrue(self.firesException(lambda : pdf.csv.create_pan_dat(dirPath, threads=0)))
+
+            with open(filePath, "a") as f:
+                f.write('x,1,,"2",1\n')
+            df = pdf.csv.create_pan_dat(dirPath, threads=4).table
+            self.assertTrue(len(df) == 1001 and str(df["count"].dtype) == "float64")
+            self.assertTrue(list(df["code"])[-1] == "2")
+
+            pdf = PanDatFactory(table=[["name"], ["cost", "count", "code"]])
+            with open(filePath, "a") as f:
+                f.write('y,1,1,abc,1\n')
+            with open(filePath) as f:
+                text = f.read().replace('"', '')
+            with open(filePath, "w") as f:
+                f.write(text)
+            for threads in [1, 4]:
+                df = pdf.csv.create_pan_dat(dirPath, threads=threads).table
+                self.assertTrue(len(df) == 1002 and list(df["code"])[-2:] == ["2", "abc"])
+        finally:
+            pandatio._csv_min_chunk_size = orig_chunk_size
+
+        pdf = PanDatFactory(table=[["name"], ["cost", "count"]])
+        pdf.set_data_type("table", "cost")
+        pdf.set_data_type("table", "count", must_be_int=True)
+        with open(filePath, "w") as f:
+            f.write("name,cost,count\na,1,2.0\nb,2,3\n")
+        df = pdf.csv.create_pan_dat(dirPath).table
+        self.assertTrue(list(map(str, df.dtypes)) == ["object", "float64", "int64"] and list(df["count"]) == [2, 3])
+        with open(filePath, "a") as f:
+            f.write("c,abc,4.5\n")
+        panDat = pdf.csv.create_pan_dat(dirPath)
+        self.assertTrue(str(panDat.table["count"].dtype) == "float64")
+        self.assertTrue(set(pdf.find_data_type_failures(panDat)) == {("table", "cost"), ("table", "count")})
+
+    def testCsvCompression(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        pdf = PanDatFactory(**netflowSchema())
+        ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
+        panDat = pan_dat_maker(netflowSchema(), ticDat)
+        for compression, threads in [("gz", 1), ("bz2", 2), ("xz", 1)]:
+            dirPath = os.path.join(_scratchDir, "netflow_" + compression)
+            pdf.csv.write_directory(panDat, dirPath, compression=compression, compress_threads=threads)
+            self.assertTrue(os.path.exists(os.path.join(dirPath, "arcs.csv." + compression)))
+            self.assertTrue(pdf._same_data(panDat, pdf.csv.create_pan_dat(dirPath)))
+            # the TicDat and PanDat readers agree on the compressed files
+            self.assertTrue(tdf._same_data(ticDat, tdf.csv.create_tic_dat(dirPath)))
+        self.assertTrue(self.firesException(lambda : pdf.csv.write_directory(panDat, dirPath, compression="zip")))
+
+        zipPath = os.path.join(_scratchDir, "netflow.zip")
+        pdf.csv.write_directory(panDat, zipPath)
+        self.assertTrue(pdf._same_data(panDat, pdf.csv.create_pan_dat(zipPath)))
+        self.assertTrue(tdf._same_data(ticDat, tdf.csv.create_tic_dat(zipPath)))
+        tdf.csv.write_directory(ticDat, zipPath, allow_overwrite=True)
+        self.assertTrue(pdf._same_data(panDat, pdf.csv.create_pan_dat(zipPath)))
+
     def testCsvSpacey(self):
         if not self.can_run:
             return
@@ -0,0 +1,133 @@
+import os
+import ticdat.utils as utils
+import shutil
+from ticdat.ticdatfactory import TicDatFactory
+from ticdat.pandatfactory import PanDatFactory
+from ticdat.testing.ticdattestutils import dietData, dietSchema, netflowData, netflowSchema, firesException
+from ticdat.testing.ticdattestutils import makeCleanDir, fail_to_debugger, pan_dat_maker
+import unittest
+from ticdat.parquettd import _can_unit_test
+
+#@fail_to_debugger
+class TestParquet(unittest.TestCase):
+    can_run = False
+
+    @classmethod
+    def setUpClass(cls):
+        makeCleanDir(_scratchDir)
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(_scratchDir)
+    def firesException(self, f):
+        e = firesException(f)
+        if e :
+            self.assertTrue("TicDatError" in e.__class__.__name__)
+            return str(e)
+    def testDiet(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        dirPath = os.path.join(_scratchDir, "diet")
+        tdf.parquet.write_directory(ticDat, dirPath)
+        self.assertTrue(self.firesException(lambda : tdf.parquet.write_directory(ticDat, dirPath)))
+        tdf.parquet.write_directory(ticDat, dirPath, allow_overwrite=True, compression="gzip")
+        parquetTicDat = tdf.parquet.create_tic_dat(dirPath, freeze_it=True)
+        self.assertTrue(tdf._same_data(ticDat, parquetTicDat))
+        self.assertTrue(parquetTicDat.categories["protein"]["maxNutrition"] == float("inf"))
+
+        parquetTicDat = tdf.parquet.create_tic_dat(dirPath, filters={"foods":[("name", "in", ["milk", "pizza"])],
+            "nutritionQuantities": [("food", "==", "milk"), ("category", "!=", "fat")]})
+        self.assertTrue(set(parquetTicDat.foods) == {"milk", "pizza"})
+        self.assertTrue(set(parquetTicDat.nutritionQuantities) ==
+                        {k for k in ticDat.nutritionQuantities if k[0] == "milk" and k[1] != "fat"})
+        self.assertTrue(tdf._same_data(tdf.TicDat(categories=ticDat.categories),
+                                       tdf.TicDat(categories=parquetTicDat.categories)))
+        self.assertTrue(self.firesException(lambda : tdf.parquet.create_tic_dat(dirPath,
+                                                     filters={"foods":[("cost", ">", 1)]})))
+        self.assertTrue(self.firesException(lambda : tdf.parquet.create_tic_dat(dirPath,
+                                                     filters={"foods":[("name", "like", "m")]})))
+
+        os.remove(os.path.join(dirPath, "foods.parquet"))
+        self.assertTrue(len(tdf.parquet.create_tic_dat(dirPath).foods) == 0)
+        tdf2 = TicDatFactory(**dict(dietSchema(), categories=[["name"], ["minNutrition", "maxNutrition", "extra"]]))
+        self.assertTrue(self.firesException(lambda : tdf2.parquet.create_tic_dat(dirPath)))
+
+        tdf3 = TicDatFactory(**{t:'*' for t in tdf.all_tables})
+        dat3 = tdf3.parquet.create_tic_dat(dirPath)
+        self.assertTrue(set(dat3.categories["name"]) == set(ticDat.categories))
+
+    def testNetflowAndRowGroups(self):
+        if not self.can_run:
+            return
+        import pyarrow.parquet as pq
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        dirPath = os.path.join(_scratchDir, "netflow")
+        tdf.parquet.write_directory(ticDat, dirPath)
+        self.assertTrue(tdf._same_data(ticDat, tdf.parquet.create_tic_dat(dirPath)))
+
+        tdf = TicDatFactory(table=[["a"], ["b"]], other=[[], ["c", "d"]])
+        dat = tdf.TicDat(table={i: [i*2] for i in range(100)}, other=[[1, "x"], [2, None]])
+        tdf.parquet.write_directory(dat, dirPath, allow_overwrite=True)
+        pq.write_table(pq.read_table(os.path.join(dirPath, "table.parquet")),
+                       os.path.join(dirPath, "table.parquet"), row_group_size=10)
+        self.assertTrue(tdf._same_data(dat, tdf.parquet.create_tic_dat(dirPath)))
+        dat2 = tdf.parquet.create_tic_dat(dirPath, filters={"table": [("a", ">=", 35), ("a", "<", 42)]})
+        self.assertTrue(set(dat2.table) == set(range(35, 42)) and dat2.table[40]["b"] == 80)
+        self.assertTrue(list(dat2.other) and dat2.other[1]["d"] is None)
+
+        self.assertTrue(self.firesException(lambda : tdf.parquet.write_directory(
+            tdf.TicDat(table={1: ["x"], 2: [2]}), dirPath, allow_overwrite=True)))
+
+    def testPanDat(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**dietSchema())
+        pdf = PanDatFactory(**dietSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(dietData(),t) for t in tdf.primary_key_fields}))
+        panDat = pan_dat_maker(dietSchema(), ticDat)
+        dirPath = os.path.join(_scratchDir, "diet_pan")
+        pdf.parquet.write_directory(panDat, dirPath)
+        self.assertTrue(pdf._same_data(panDat, pdf.parquet.create_pan_dat(dirPath)))
+        tdf.parquet.write_directory(ticDat, dirPath, allow_overwrite=True)
+        self.assertTrue(pdf._same_data(panDat, pdf.parquet.create_pan_dat(dirPath)))
+        self.assertTrue(tdf._same_data(ticDat, tdf.parquet.create_tic_dat(dirPath)))
+
+        panDat2 = pdf.parquet.create_pan_dat(dirPath, filters={"nutritionQuantities": [("food", "==", "milk")]})
+        self.assertTrue(set(panDat2.nutritionQuantities["food"]) == {"milk"} and
+                        len(panDat2.nutritionQuantities) == len(ticDat.categories))
+
+        dirPath = os.path.join(_scratchDir, "diet_pan_partitioned")
+        pdf.parquet.write_directory(panDat, dirPath, case_space_table_names=True,
+                                    partition_cols={"nutritionQuantities": ["food"]})
+        self.assertTrue(os.path.isdir(os.path.join(dirPath, "NutritionQuantities")))
+        self.assertTrue(pdf._same_data(panDat, pdf.parquet.create_pan_dat(dirPath)))
+        panDat2 = pdf.parquet.create_pan_dat(dirPath, filters={"nutritionQuantities": [("food", "in", ["milk"])]})
+        self.assertTrue(set(panDat2.nutritionQuantities["food"]) == {"milk"} and
+                        len(panDat2.nutritionQuantities) == len(ticDat.categories))
+        panDat2 = pdf.parquet.create_pan_dat(dirPath, filters={"nutritionQuantities": [("food", "==", "nah")]})
+        self.assertTrue(list(panDat2.nutritionQuantities.columns) == ["food", "category", "qty"] and
+                        not len(panDat2.nutritionQuantities))
+        self.assertTrue(self.firesException(lambda : pdf.parquet.write_directory(panDat, dirPath,
+                                            case_space_table_names=True,
+                                            partition_cols={"nutritionQuantities": ["food"]})))
+
+        pdf2 = PanDatFactory(**dict(dietSchema(), foods=[["name"], ["cost", "extra"]]))
+        pdf2.set_default_value("foods", "extra", 3)
+        self.assertTrue(self.firesException(lambda : pdf2.parquet.create_pan_dat(dirPath)))
+        self.assertTrue(set(pdf2.parquet.create_pan_dat(dirPath, fill_missing_fields=True).foods["extra"]) == {3})
+        pdf3 = PanDatFactory(**{t:'*' for t in pdf.all_tables})
+        self.assertTrue(pdf._same_data(panDat, pdf3.parquet.create_pan_dat(dirPath)))
+
+_scratchDir = TestParquet.__name__ + "_scratch"
+
+# Run the tests.
+if __name__ == "__main__":
+    if not utils.DataFrame :
+        print("!!!!!!!!!FAILING PARQUET UNIT TESTS DUE TO FAILURE TO LOAD PANDAS LIBRARIES!!!!!!!!")
+    elif not _can_unit_test :
+        print("!!!!!!!!!FAILING PARQUET UNIT TESTS DUE TO FAILURE TO LOAD PYARROW LIBRARIES!!!!!!!!")
+    else:
+        TestParquet.can_run = True
+    unittest.main()
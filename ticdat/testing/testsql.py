@@ -7,6 +7,7 @@ from ticdat.testing.ticdattestutils import makeCleanPath, addNetflowForeignKeys,
 from ticdat.testing.ticdattestutils import spacesData, spacesSchema, dietSchemaWeirdCase, dietSchemaWeirdCase2
 from ticdat.testing.ticdattestutils import copyDataDietWeirdCase, copyDataDietWeirdCase2, am_on_windows
 from ticdat.sqlitetd import _can_unit_test, sql
+import ticdat.sqlitetd as sqlitetd
 
 import shutil
 import unittest
@@ -81,6 +82,15 @@ class TestSql(unittest.TestCase):
         tdf2.sql.write_db_data(td, f)
         dups = tdf.sql.find_duplicates(f)
         self.assertTrue(dups ==  {'three': {(1, 2, 2): 2}, 'two': {(1, 2): 3}, 'one': {1: 3, 2: 2}})
+        loaded_dups = []
+        dat = tdf.sql.create_tic_dat(f, duplicates_handler=loaded_dups.append)
+        self.assertTrue(loaded_dups == [dups] and len(dat.one) == 3)
+        loaded_dups = []
+        dat = tdf.sql.create_tic_dat(f, tables=["two"], duplicates_handler=loaded_dups.append)
+        self.assertTrue(loaded_dups == [{'two': {(1, 2): 3}}] and not dat.one)
+        loaded_dups = []
+        tdf.sql.create_tic_dat(f, tables=["one"], fields={"one": []}, duplicates_handler=loaded_dups.append)
+        self.assertTrue(loaded_dups == [{'one': {1: 3, 2: 2}}])
 
     def testDiet(self):
         if not self.can_run:
@@ -310,6 +320,266 @@ class TestSql(unittest.TestCase):
         tdf.sql.write_sql_file(dat, filePath)
         self.assertTrue(firesException(lambda : tdf.sql.create_tic_dat_from_sql(filePath)))
 
+    def testLazy(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**dietSchema())
+        dat = tdf.copy_tic_dat(dietData())
+        filePath = makeCleanPath(os.path.join(_scratchDir, "lazy.db"))
+        tdf.sql.write_db_data(dat, filePath)
+        for materialize in [False, True]:
+            lazy = tdf.sql.create_lazy_tic_dat(filePath, materialize_on_full_scan=materialize)
+            self.assertTrue(lazy._isFrozen)
+            self.assertTrue(len(lazy.foods) == len(dat.foods))
+            self.assertTrue("milk" in lazy.foods and "boger" not in lazy.foods)
+            self.assertTrue(lazy.foods["milk"]["cost"] == dat.foods["milk"]["cost"])
+            self.assertTrue(lazy.categories["fat"]["maxNutrition"] == 65)
+            self.assertTrue(("milk", "fat") in lazy.nutritionQuantities)
+            self.assertTrue(lazy.nutritionQuantities["milk", "fat"]["qty"] ==
+                            dat.nutritionQuantities["milk", "fat"]["qty"])
+            self.assertTrue(firesException(lambda : lazy.foods["boger"]))
+            self.assertTrue(firesException(lambda : lazy.nutritionQuantities["milk"]))
+            self.assertTrue(self.firesException(lambda : lazy.foods.__setitem__("boger", 1)))
+            def changeit():
+                lazy.foods["milk"]["cost"] = 12
+            self.assertTrue(firesException(changeit))
+            self.assertTrue(tdf._same_data(dat, tdf.copy_tic_dat(lazy)))
+            self.assertTrue(bool(lazy.foods._materialized) == materialize)
+
+            milk = lazy.nutritionQuantities.where(food="milk")
+            self.assertTrue(set(milk) == {k for k in dat.nutritionQuantities if k[0] == "milk"})
+            self.assertTrue(len(milk) == len(dat.categories) and ("hot dog", "fat") not in milk)
+            cheap = lazy.foods.where("[cost] < ?", [2], name=["milk", "fries", "boger"])
+            self.assertTrue(set(cheap.keys()) == {k for k,v in dat.foods.items()
+                                                  if v["cost"] < 2 and k in ["milk", "fries"]})
+            self.assertTrue(len(lazy.foods.where(name=[])) == 0)
+            self.assertTrue(self.firesException(lambda : lazy.foods.where(boger=1)))
+
+        lazy = tdf.sql.create_lazy_tic_dat(filePath)
+        self.assertTrue(lazy.foods["milk"]["cost"] == dat.foods["milk"]["cost"])
+        self.assertTrue(os.path.abspath(filePath) in sqlitetd._sessions())
+        tdf.sql.release_connections(filePath)
+        self.assertFalse(os.path.abspath(filePath) in sqlitetd._sessions())
+        self.assertTrue(len(lazy.foods) == len(dat.foods) and "milk" in lazy.foods)
+        tdf.sql.release_connections(filePath)
+
+        tdf = TicDatFactory(a=[["k"], []], b=[[], ["x", "y"]])
+        tdf.set_generator_tables(["b"])
+        dat = tdf.TicDat(a=[[1], [2]], b=[[1, "inf"], [2, "y"]])
+        filePath = makeCleanPath(os.path.join(_scratchDir, "lazy2.db"))
+        tdf.sql.write_db_data(dat, filePath)
+        lazy = tdf.sql.create_lazy_tic_dat(filePath)
+        self.assertTrue(set(lazy.a) == {1, 2} and not lazy.a[1])
+        self.assertTrue(sorted(r["x"] for r in lazy.b()) == [1, 2])
+        tdf = TicDatFactory(a=[["k"], []], b=[[], ["x", "y"]])
+        lazy = tdf.sql.create_lazy_tic_dat(filePath)
+        self.assertTrue(len(lazy.b) == 2 and len(lazy.b.where(x=1)) == 1)
+        self.assertTrue([r["y"] for r in lazy.b.where(x=1)] == [float("inf")])
+
+    def testDelta(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        dat = tdf.copy_tic_dat(netflowData())
+        filePath = makeCleanPath(os.path.join(_scratchDir, "delta.db"))
+        counts = tdf.sql.write_db_delta(dat, filePath)
+        self.assertTrue(counts["cost"] == {"inserted": len(dat.cost), "updated": 0, "deleted": 0})
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        self.assertFalse(any(any(v.values()) for v in tdf.sql.write_db_delta(dat, filePath).values()))
+
+        dat.inflow["Pens", "Nowhere"] = 123
+        dat.arcs["Detroit", "Boston"]["capacity"] = float("inf")
+        del dat.cost["Pens", "Detroit", "New York"]
+        dat.cost["Pens", "Denver", "Nowhere"] = 77
+        dat.cost["Pencils", "Denver", "Seattle"]["cost"] += 1
+        counts = tdf.sql.write_db_delta(dat, filePath)
+        self.assertTrue(counts["inflow"] == {"inserted": 1, "updated": 0, "deleted": 0})
+        self.assertTrue(counts["arcs"] == {"inserted": 0, "updated": 1, "deleted": 0})
+        self.assertTrue(counts["cost"] == {"inserted": 1, "updated": 1, "deleted": 1})
+        self.assertFalse(any(any(counts[t].values()) for t in ["commodities", "nodes"]))
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        tdf = TicDatFactory(a=[[], ["x", "y"]])
+        filePath = makeCleanPath(os.path.join(_scratchDir, "delta2.db"))
+        tdf.sql.write_db_delta(tdf.TicDat(a=[[1, 2], [1, 2], [3, 4]]), filePath)
+        self.assertTrue(tdf.sql.write_db_delta(tdf.TicDat(a=[[1, 2], [3, 4], [1, 2]]), filePath)["a"] ==
+                        {"inserted": 0, "updated": 0, "deleted": 0})
+        dat = tdf.TicDat(a=[[1, 2], [3, 4]])
+        self.assertTrue(tdf.sql.write_db_delta(dat, filePath)["a"] ==
+                        {"inserted": 2, "updated": 0, "deleted": 3})
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        tdf2 = TicDatFactory(a=[["x"], ["y"]])
+        tdf.sql.write_db_data(tdf.TicDat(a=[[1, 2], [1, 3]]), filePath, allow_overwrite=True)
+        self.assertTrue("Duplicate primary keys" in self.firesException(lambda :
+                        tdf2.sql.write_db_delta(tdf2.TicDat(a={1:2}), filePath)))
+        tdf.sql.write_db_data(tdf.TicDat(a=[[5, 6]]), filePath, allow_overwrite=True)
+        self.assertTrue(tdf2.sql.write_db_delta(tdf2.TicDat(a={1:2}), filePath)["a"] ==
+                        {"inserted": 1, "updated": 0, "deleted": 1})
+
+        tdf = TicDatFactory(b=[["k"], ["v", "w"]], c=[[], ["x"]])
+        original_version = sqlitetd.sql.sqlite_version_info
+        try:
+            for version in [original_version, (3, 23, 0)]: # with and without upsert
+                sqlitetd.sql.sqlite_version_info = version
+                filePath = makeCleanPath(os.path.join(_scratchDir, "delta3.db"))
+                with_strings = tdf.TicDat(b={1:["inf", 2], 2:["True", 3.0], 3:[1, 1]}, c=[["-inf"], [1]])
+                tdf.sql.write_db_delta(with_strings, filePath)
+                counts = tdf.sql.write_db_delta(with_strings, filePath)
+                self.assertFalse(any(any(v.values()) for v in counts.values()))
+                counts = tdf.sql.write_db_delta(tdf.TicDat(b={1:[float("inf"), 2.0], 2:[True, 3], 3:[1, 1]},
+                                                           c=[[1.0], [-float("inf")]]), filePath)
+                self.assertFalse(any(any(v.values()) for v in counts.values()))
+                dat = tdf.TicDat(b={1:[float("inf"), 2.0], 2:[False, 3], 4:[5, 6]}, c=[[1.0]])
+                counts = tdf.sql.write_db_delta(dat, filePath)
+                self.assertTrue(counts["b"] == {"inserted": 1, "updated": 1, "deleted": 1})
+                self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        finally:
+            sqlitetd.sql.sqlite_version_info = original_version
+
+        tdf = TicDatFactory(a=[["k"], ["v"]])
+        for constraint in ["", ", unique (k)", ", primary key (k)"]:
+            filePath = makeCleanPath(os.path.join(_scratchDir, "delta4.db"))
+            with sql.connect(filePath) as con:
+                con.execute("create table a (k, v%s)"%constraint)
+                con.executemany("insert into a values (?, ?)", [(1, 2), (3, 4)])
+            con.close()
+            with sql.connect(filePath) as con:
+                self.assertTrue(sqlitetd._has_unique_constraint(con, "a", ["k"]) == bool(constraint))
+            con.close()
+            dat = tdf.TicDat(a={1:5, 3:4, 6:7})
+            self.assertTrue(tdf.sql.write_db_delta(dat, filePath)["a"] ==
+                            {"inserted": 1, "updated": 1, "deleted": 0})
+            self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        filePath = makeCleanPath(os.path.join(_scratchDir, "delta5.db"))
+        tdf.sql.write_db_delta(tdf.copy_tic_dat(netflowData()), filePath)
+        with sql.connect(filePath) as con:
+            index_names = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        con.close()
+        self.assertTrue(index_names.issuperset(s.split("[")[1].split("]")[0]
+                                               for s in tdf.sql._get_index_sql(tdf.all_tables)))
+
+    def testIndexes(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        dat = tdf.copy_tic_dat(netflowData())
+        index_sql = tdf.sql._get_index_sql(tdf.all_tables)
+        # the leading primary key fields (i.e. arcs.source, cost.commodity) are already indexed
+        self.assertTrue({s.split("[")[1].split("]")[0] for s in index_sql} ==
+                        {"idx_arcs__destination", "idx_cost__source", "idx_cost__destination",
+                         "idx_inflow__node"})
+        def indexes(filePath):
+            with sql.connect(filePath) as con:
+                return {r[0] for r in con.execute("Select name from sqlite_master where type = 'index' " +
+                                                  "and sql is not null")}
+        filePath = makeCleanPath(os.path.join(_scratchDir, "indexes.db"))
+        tdf.sql.write_db_data(dat, filePath, extra_indexes={"cost": [["cost"]], "arcs":[["capacity", "source"]]})
+        self.assertTrue(indexes(filePath) == {s.split("[")[1].split("]")[0] for s in index_sql}.union(
+                        ["idx_cost__cost", "idx_arcs__capacity__source"]))
+        with sql.connect(filePath) as con:
+            self.assertTrue(any(True for _ in con.execute("Select * from sqlite_stat1")))
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        tdf.sql.write_db_data(dat, filePath, allow_overwrite=True)
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        filePath = makeCleanPath(os.path.join(_scratchDir, "indexes2.db"))
+        tdf.sql.write_db_schema(filePath)
+        self.assertTrue(indexes(filePath) == {s.split("[")[1].split("]")[0] for s in index_sql})
+        self.assertTrue("boger is not a field of cost" in self.firesException(lambda :
+                        tdf.sql.write_db_schema(filePath, extra_indexes={"cost":[["boger"]]})))
+        self.assertTrue(self.firesException(lambda : tdf.sql.write_db_schema(filePath,
+                                                                             extra_indexes={"cost":["cost"]})))
+
+        filePath = makeCleanPath(os.path.join(_scratchDir, "indexes.sql"))
+        tdf.sql.write_sql_file(dat, filePath, include_schema=True)
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat_from_sql(filePath, includes_schema=True)))
+
+    def testSessions(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(a=[["k"], ["v"]], b=[[], ["x"]])
+        tdf.set_generator_tables(["b"])
+        dat = tdf.TicDat(a={1:2, 3:4}, b=[[5], [6]])
+        filePath = makeCleanPath(os.path.join(_scratchDir, "sessions.db"))
+        tdf.sql.write_db_data(dat, filePath)
+        self.assertFalse(os.path.abspath(filePath) in sqlitetd._sessions()) # the writers don't hold the file open
+        session = sqlitetd._session(filePath)
+        catalog = session.catalog()
+        dat2 = tdf.sql.create_tic_dat(filePath)
+        self.assertTrue(tdf._same_data(dat, dat2))
+        self.assertTrue(sqlitetd._session(filePath) is session and session.catalog() is catalog)
+        self.assertTrue(sorted(r["x"] for r in dat2.b()) == sorted(r["x"] for r in dat2.b()) == [5, 6])
+        self.assertTrue(sqlitetd._session(filePath) is session)
+
+        with sql.connect(filePath) as con:
+            con.execute("create table c (y)")
+        self.assertTrue(session.catalog() is not catalog and "c" in session.catalog())
+
+        makeCleanPath(filePath)
+        tdf.sql.write_db_data(dat, filePath)
+        self.assertTrue(sqlitetd._session(filePath) is not session)
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        self.assertTrue(firesException(lambda : session.con.execute("select 1")))
+
+        session = sqlitetd._session(filePath)
+        tdf.sql.release_connections(filePath)
+        self.assertTrue(firesException(lambda : session.con.execute("select 1")))
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        tdf.sql.release_connections()
+        self.assertFalse(sqlitetd._sessions())
+
+        paths = [makeCleanPath(os.path.join(_scratchDir, "sessions%s.db"%i)) for i in range(10)]
+        for path in paths:
+            tdf.sql.write_db_data(dat, path)
+        first = sqlitetd._session(paths[0])
+        rows = []
+        for r in tdf.sql.create_tic_dat(paths[0]).b():
+            rows.append(r["x"])
+            for path in paths[1:]: # reading other files while a generator table is being iterated
+                self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(path)))
+            self.assertTrue(len(sqlitetd._sessions()) == sqlitetd._session_cache_size)
+        self.assertTrue(sorted(rows) == [5, 6])
+        self.assertTrue(list(sqlitetd._sessions()) == [os.path.abspath(p) for p in paths[-sqlitetd._session_cache_size:]])
+        self.assertTrue(firesException(lambda : first.con.execute("select 1")))
+        tdf.sql.release_connections()
+
+    def testSqlFileStreaming(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(a=[["k"], ["v", "w"]], b=[[], ["x"]])
+        dat = tdf.TicDat(a={i:["semi;colon %s;"%i, i if i%7 else float("inf")] for i in range(1300)},
+                         b=[["x;%s"%i] for i in range(5)])
+        filePath = makeCleanPath(os.path.join(_scratchDir, "streaming.sql"))
+        tdf.sql.write_sql_file(dat, filePath, include_schema=True)
+        with open(filePath) as f:
+            self.assertTrue(sum(l.startswith("INSERT INTO") for l in f) == 4)
+        orig_chars = sqlitetd._script_chars
+        try:
+            for chars in [orig_chars, 100]:
+                sqlitetd._script_chars = chars
+                self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat_from_sql(filePath, True)))
+        finally:
+            sqlitetd._script_chars = orig_chars
+        with open(filePath) as f:
+            scripts = list(sqlitetd._sql_scripts(f))
+        self.assertTrue(len(scripts) == 1 and all(map(sql.complete_statement, scripts)))
+
+        with open(filePath, "a") as f:
+            f.write("INSERT INTO [b] ([x]) VALUES ('unfinished")
+        self.assertTrue(firesException(lambda : tdf.sql.create_tic_dat_from_sql(filePath, True)))
+
+        for ext, threads in [(".gz", 1), (".bz2", 2), (".xz", 1)]:
+            compressedPath = filePath + ext
+            tdf.sql.write_sql_file(dat, compressedPath, include_schema=True, compress_threads=threads)
+            self.assertTrue(os.path.getsize(compressedPath) < os.path.getsize(filePath))
+            self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat_from_sql(compressedPath, True)))
+
     def testSpacey(self):
         if not self.can_run:
             return
@@ -326,6 +596,115 @@ class TestSql(unittest.TestCase):
         dat3 = tdf.sql.create_tic_dat(filePath, freeze_it=True)
         self.assertTrue(tdf._same_data(dat, dat3))
 
+    def testCatalog(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(a_long_table_name=[["Key_One", "key_two"],["some_data"]], b=[[], ["x"]])
+        dat = tdf.TicDat(a_long_table_name={(1, "one"): 1.5, (2, "two"): 2.5}, b=[[1], [2]])
+        filePath = makeCleanPath(os.path.join(_scratchDir, "catalog.db"))
+        tdf.sql.write_db_data(dat, filePath)
+        with sql.connect(filePath) as con:
+            con.execute("ALTER TABLE a_long_table_name RENAME TO [A long_Table NAME]")
+            con.execute("create view c as select * from b")
+            catalog = sqlitetd._sql_catalog(con)
+        self.assertTrue(catalog == {"A long_Table NAME": ("Key_One", "key_two", "some_data"),
+                                    "b": ("x",), "c": ("x",)})
+        self.assertTrue(sqlitetd._matching_table_names(catalog, "a_long_table_name") == ["A long_Table NAME"])
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        tdf2 = TicDatFactory(a_long_table_name=[["key_one", "KEY_TWO"],["Some_Data"]], c=[[], ["x"]])
+        dat2 = tdf2.sql.create_tic_dat(filePath)
+        self.assertTrue({k:r["Some_Data"] for k,r in dat2.a_long_table_name.items()} ==
+                        {(1, "one"): 1.5, (2, "two"): 2.5})
+        self.assertTrue(sorted(r["x"] for r in dat2.c) == [1, 2])
+
+        tdf3 = TicDatFactory(a_long_table_name=[["key_one", "key_two"],["other_data"]])
+        self.assertTrue("Unable to recognize field other_data in table a_long_table_name" in
+                        self.firesException(lambda : tdf3.sql.create_tic_dat(filePath)))
+        with sql.connect(filePath) as con:
+            con.execute("create table a_long_table_name(boger)")
+        self.assertTrue("Duplicate tables found for table a_long_table_name" in
+                        self.firesException(lambda : tdf.sql.create_tic_dat(filePath)))
+
+    def testProjectedRead(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        addNetflowForeignKeys(tdf)
+        tdf.enable_foreign_key_links()
+        tdf.set_default_value("arcs", "capacity", 12)
+        ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
+        filePath = makeCleanPath(os.path.join(_scratchDir, "projected.db"))
+        tdf.sql.write_db_data(ticDat, filePath)
+        sqlFilePath = makeCleanPath(os.path.join(_scratchDir, "projected.sql"))
+        tdf.sql.write_sql_file(ticDat, sqlFilePath)
+        with sql.connect(filePath) as con: # the skipped table can't be read, but doesn't need to be
+            con.execute("DROP TABLE [cost]")
+            con.execute("CREATE TABLE [cost] (junk)")
+        self.assertTrue(self.firesException(lambda : tdf.sql.create_tic_dat(filePath)))
+        rows = lambda t : {k:dict(v) for k,v in t.items()}
+        for read in [lambda **kw : tdf.sql.create_tic_dat(filePath, **kw),
+                     lambda **kw : tdf.sql.create_tic_dat_from_sql(sqlFilePath, **kw)]:
+            dat = read(tables=["arcs", "nodes"], freeze_it=True)
+            self.assertTrue(not dat.cost and not dat.inflow and getattr(dat, "_isFrozen", False))
+            self.assertTrue(rows(dat.arcs) == rows(ticDat.arcs) and set(dat.nodes) == set(ticDat.nodes))
+            self.assertTrue(dat.nodes["Detroit"].arcs_source) # the full schema's foreign key links
+            dat = read(tables=["arcs", "inflow"], fields={"arcs": []})
+            self.assertTrue(set(dat.arcs) == set(ticDat.arcs) and all(r["capacity"] == 12 for r in dat.arcs.values()))
+            self.assertTrue(not dat.nodes and rows(dat.inflow) == rows(ticDat.inflow) and not getattr(dat, "_isFrozen", False))
+            dat = read(fields={"arcs": ["capacity"]}, tables=["arcs"])
+            self.assertTrue(rows(dat.arcs) == rows(ticDat.arcs))
+        for bad_args in [{"tables": ["arcs", "nah"]}, {"tables": "arcs"}, {"fields": {"cost": ["nah"]}},
+                         {"tables": ["arcs"], "fields": {"nodes": []}}, {"fields": ["arcs"]}]:
+            self.assertTrue(self.firesException(lambda : tdf.sql.create_tic_dat(filePath, **bad_args)))
+
+    def testBulkWrite(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(flows=[["source", "destination", "commodity"], ["quantity", "cost"]],
+                            nodes=[["name"], []], log=[[], ["a", "b"]])
+        n = 20
+        dat = tdf.TicDat(nodes=[["n%s"%i] for i in range(n)], log=[[i, "a%s"%i] for i in range(50)])
+        for i in range(n):
+            for j in range(n):
+                for k in range(30):
+                    dat.flows["n%s"%i, "n%s"%j, k] = [i*j*k, float("inf") if k == 3 else 0.5]
+        self.assertTrue(len(dat.flows) == n*n*30 > sqlitetd._write_batch_size)
+
+        filePath = makeCleanPath(os.path.join(_scratchDir, "bulk.db"))
+        tdf.sql.write_db_data(dat, filePath)
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
+        # read the pragmas back on the connection that is doing the writing
+        applied = []
+        original_execute_batches = sqlitetd._execute_batches
+        def execute_batches(con, sql_str, rows):
+            applied.append((list(con.execute("PRAGMA journal_mode"))[0][0].lower(),
+                            list(con.execute("PRAGMA synchronous"))[0][0]))
+            return original_execute_batches(con, sql_str, rows)
+        sqlitetd._execute_batches = execute_batches
+        try:
+            filePath = makeCleanPath(os.path.join(_scratchDir, "bulk_fast.db"))
+            tdf.sql.write_db_data(dat, filePath, pragmas={"journal_mode": "WAL", "synchronous": "OFF"},
+                                  extra_indexes={"flows": [["commodity", "cost"]], "log": [["b"]]})
+        finally:
+            sqlitetd._execute_batches = original_execute_batches
+        self.assertTrue(applied and set(applied) == {("wal", 0)}) # synchronous OFF is 0
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        with sql.connect(filePath) as con:
+            indexes = {name: tuple(r[2] for r in con.execute("PRAGMA index_info([%s])"%name))
+                       for name, tbl in con.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")
+                       if tbl in ("flows", "log")}
+            self.assertTrue({("commodity", "cost"), ("b",)}.issubset(indexes.values()))
+            self.assertTrue(list(con.execute("PRAGMA journal_mode"))[0][0].lower() == "wal")
+
+        self.assertTrue("not a valid pragma name" in self.firesException(lambda :
+            tdf.sql.write_db_data(dat, filePath, allow_overwrite=True, pragmas={"synchronous = OFF; --": 1})))
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+        dat.flows["n0", "n0", 0] = [None, -float("inf")]
+        tdf.sql.write_db_data(dat, filePath, allow_overwrite=True, pragmas={"synchronous": "NORMAL"})
+        self.assertTrue(tdf._same_data(dat, tdf.sql.create_tic_dat(filePath)))
+
     def testDefaults(self):
         tdf = TicDatFactory(one=[["a"],["b", "c"]], two=[["a", "b"],["c"]], three=[["a", "b", "c"],[]])
         dat = tdf.TicDat(one=[[1, 2, 3],[4, 5, 6]], two=[[1, 2, 3],[4 ,5, 6]], three=[[1, 2, 3], [4, 5, 6]])
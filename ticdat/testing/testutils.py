@@ -981,6 +981,90 @@ class TestUtils(unittest.TestCase):
         self.assertFalse(tdf._same_data(dataObj, dataObj2, pow(.00001, 3)))
         self.assertTrue(tdf._same_data(dataObj, dataObj2, pow(.00001, 0.333)))
 
+    def testParseCache(self):
+        if not utils.DataFrame:
+            return
+        from ticdat import PanDatFactory
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields})
+        dirPath = os.path.join(_scratchDir, "cached_netflow")
+        tdf.csv.write_directory(ticDat, dirPath)
+        cacheDir = os.path.join(_scratchDir, "parse_cache")
+        cache = utils.ParseCache(cacheDir)
+        entries = lambda : sorted(f for f in os.listdir(cacheDir) if f.endswith(".parsed"))
+        def was_hit(f):
+            old_entries = entries()
+            for e in old_entries: # a hit marks its entry as recently used
+                os.utime(os.path.join(cacheDir, e), (0, 0))
+            rtn = f()
+            return rtn, any(os.path.getmtime(os.path.join(cacheDir, e)) > 0 for e in old_entries)
+
+        dat, hit = was_hit(lambda : cache.read(tdf.csv.create_tic_dat, dirPath, freeze_it=True))
+        self.assertTrue(not hit and len(entries()) == 1 and tdf._same_data(dat, ticDat))
+        dat, hit = was_hit(lambda : cache.read(tdf.csv.create_tic_dat, dirPath, freeze_it=True))
+        self.assertTrue(hit and tdf._same_data(dat, ticDat) and getattr(dat, "_isFrozen", False))
+        dat = cache.read(tdf.csv.create_tic_dat, dirPath)
+        self.assertTrue(len(entries()) == 2 and not getattr(dat, "_isFrozen", False))
+        dat.nodes["extra"] = {} # edits don't leak into the cache
+        self.assertFalse(tdf._same_data(dat, cache.read(tdf.csv.create_tic_dat, dirPath)))
+        self.assertFalse(cache.read(tdf.csv.find_duplicates, dirPath))
+
+        # touching a file without changing it is still a hit, changing its content is not
+        arcsPath = os.path.join(dirPath, "arcs.csv")
+        os.utime(arcsPath, (1, 1))
+        dat, hit = was_hit(lambda : cache.read(tdf.csv.create_tic_dat, dirPath))
+        self.assertTrue(hit and tdf._same_data(dat, ticDat))
+        ticDat.arcs["Detroit", "Boston"]["capacity"] = 123
+        tdf.csv.write_directory(ticDat, dirPath, allow_overwrite=True)
+        dat, hit = was_hit(lambda : cache.read(tdf.csv.create_tic_dat, dirPath))
+        self.assertTrue(not hit and tdf._same_data(dat, ticDat))
+
+        # the full schema is part of the key
+        tdf2 = TicDatFactory(**netflowSchema())
+        tdf2.set_default_value("arcs", "capacity", 10)
+        dat, hit = was_hit(lambda : cache.read(tdf2.csv.create_tic_dat, dirPath))
+        self.assertTrue(not hit and tdf._same_data(dat, ticDat))
+
+        # the duplicates found when parsing are replayed through duplicates_handler on a hit
+        dupsPath = os.path.join(_scratchDir, "cached_dups")
+        TicDatFactory(b=[[], ["k", "v"]]).csv.write_directory(
+            TicDatFactory(b=[[], ["k", "v"]]).TicDat(b=[[1, 2], [1, 3], [4, 5]]), dupsPath)
+        tdf3 = TicDatFactory(b=[["k"], ["v"]])
+        dat, hit = was_hit(lambda : cache.read(tdf3.csv.create_tic_dat, dupsPath))
+        self.assertTrue(not hit and len(dat.b) == 2)
+        found = []
+        # the entry stored without a duplicates report is parsed again (and replaced)
+        cache.read(tdf3.csv.create_tic_dat, dupsPath, duplicates_handler=found.append)
+        self.assertTrue(found == [{"b": {1: 2}}])
+        dat, hit = was_hit(lambda : cache.read(tdf3.csv.create_tic_dat, dupsPath, duplicates_handler=found.append))
+        self.assertTrue(hit and found == [{"b": {1: 2}}] * 2 and len(dat.b) == 2)
+        dat, hit = was_hit(lambda : cache.read(tdf3.csv.create_tic_dat, dupsPath))
+        self.assertTrue(hit and len(dat.b) == 2)
+        for _ in range(2):
+            self.assertTrue(firesException(lambda : cache.read(tdf3.csv.create_tic_dat, dupsPath,
+                                                               duplicates_handler=utils._assert_no_duplicates)))
+
+        pdf = PanDatFactory(**netflowSchema())
+        panDat = pdf.csv.create_pan_dat(dirPath)
+        dat, hit = was_hit(lambda : cache.read(pdf.csv.create_pan_dat, dirPath))
+        self.assertTrue(not hit and pdf._same_data(dat, panDat))
+        dat, hit = was_hit(lambda : cache.read(pdf.csv.create_pan_dat, dirPath))
+        self.assertTrue(hit and pdf._same_data(dat, panDat))
+
+        self.assertTrue(self.firesException(lambda : cache.read(tdf.csv.create_tic_dat, dirPath + "_nope")))
+        self.assertTrue(self.firesException(lambda : cache.read(lambda p : None, dirPath)))
+        self.assertTrue(self.firesException(lambda : utils.ParseCache(arcsPath)))
+
+        # the least recently used entries are evicted once max_size is exceeded
+        sizes = {e:os.path.getsize(os.path.join(cacheDir, e)) for e in entries()}
+        cache = utils.ParseCache(cacheDir, max_size=sum(sizes.values()))
+        newest = entries()
+        cache.read(tdf.csv.create_tic_dat, dirPath, headers_present=True)
+        self.assertTrue(0 < len(entries()) <= len(newest) and
+                        sum(os.path.getsize(os.path.join(cacheDir, e)) for e in entries()) <= cache.max_size)
+        cache.clear()
+        self.assertFalse(os.listdir(cacheDir))
+
 
 
 _scratchDir = TestUtils.__name__ + "_scratch"
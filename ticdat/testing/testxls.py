@@ -6,6 +6,7 @@ from ticdat.testing.ticdattestutils import sillyMeData, sillyMeSchema, makeClean
 from ticdat.testing.ticdattestutils import spacesData, spacesSchema, memo, flagged_as_run_alone
 from ticdat.testing.ticdattestutils import makeCleanPath, sillyMeDataTwoTables
 from ticdat.xls import _can_unit_test
+import ticdat.xls as xls
 import shutil
 import unittest
 
@@ -278,6 +279,9 @@ class TestXls(unittest.TestCase):
         rowCount = tdf.xls.find_duplicates(filePath)
         self.assertTrue(set(rowCount) == {'a', 'b'} and set(rowCount["a"]) == {1} and rowCount["a"][1]==3)
         self.assertTrue(set(rowCount["b"]) == {(1,20,30)} and rowCount["b"][1,20,30]==2)
+        loadedCount = []
+        ticDatMan = tdf.xls.create_tic_dat(filePath, duplicates_handler=loadedCount.append)
+        self.assertTrue(loadedCount == [rowCount] and ticDatMan.b[1,20,30]["bData"] == 12)
 
     def testSpacey(self):
         if not self.can_run:
@@ -389,6 +393,134 @@ class TestXls(unittest.TestCase):
         self.assertTrue(all(isinstance(k[-1], int) for k in dat2.moger))
         self.assertFalse(any(isinstance(k[-1], int) for k in dat3.moger))
 
+    def testStreaming(self):
+        if not self.can_run:
+            return
+        def check(tdf, dat, file_name, **kwargs):
+            filePath = makeCleanPath(os.path.join(_scratchDir, file_name))
+            tdf.xls.write_file(dat, filePath)
+            dat1 = tdf.xls.create_tic_dat(filePath, **kwargs)
+            dat2 = tdf.xls.create_tic_dat(filePath, streaming=True, **kwargs)
+            self.assertTrue(tdf._same_data(dat1, dat2))
+            return dat2
+        tdf = TicDatFactory(**dietSchema())
+        dat = check(tdf, tdf.copy_tic_dat(dietData()), "streamDiet.xlsx")
+        self.assertTrue(tdf._same_data(dat, dietData()))
+        tdf = TicDatFactory(**netflowSchema())
+        check(tdf, tdf.copy_tic_dat(netflowData()), "streamNetflow.xlsx")
+        tdf = TicDatFactory(**spacesSchema())
+        check(tdf, tdf.TicDat(**spacesData()), "streamSpaces.xlsx")
+
+        tdf = TicDatFactory(boger = [[],["the", "big", "boger"]],
+                            woger = [[], ["the", "real", "big", "woger"]])
+        td = tdf.TicDat(boger = ([1, "", 3], ["", "", ""], tdf.data_fields["boger"], [100, "  spaces ", True]),
+                        woger = ([[1, 2, 3, 4]]*4) + [tdf.data_fields["woger"]] +
+                                ([[100, 200, 300, 400]]*5) + [["", "", "", ""]]*3)
+        check(tdf, td, "streamRowOffsets.xlsx", row_offsets={"woger": 5, "boger":3})
+        check(tdf, td, "streamRowOffsets.xlsx", headers_present=False)
+        tdf = TicDatFactory(**tdf.schema())
+        tdf.set_generator_tables(["woger"])
+        filePath = os.path.join(_scratchDir, "streamRowOffsets.xlsx")
+        dat1, dat2 = [tdf.xls.create_tic_dat(filePath, treat_inf_as_infinity=False, streaming=streaming,
+                                             row_offsets={"woger": 5, "boger":3}) for streaming in [False, True]]
+        self.assertTrue(tdf._same_data(dat1, dat2))
+        self.assertTrue([list(r.values()) for r in dat2.woger()] == [[100, 200, 300, 400]]*5)
+        self.assertTrue(len(list(dat2.woger())) == 5)
+
+        tdf = TicDatFactory(a = [["k"], ["v"]])
+        tdf.set_data_type("a", "v", must_be_int=True)
+        dat = check(tdf, tdf.TicDat(a = {"x":1, "y":2.5, "z":"inf"}), "streamInts.xlsx")
+        self.assertTrue(isinstance(dat.a["x"]["v"], int) and dat.a["z"]["v"] == float("inf"))
+        self.assertTrue(self.firesException(lambda : tdf.xls.create_tic_dat(
+                        os.path.join(_scratchDir, "diet.xls"), streaming=True)))
+
+    def testWorkbookCache(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        filePath = os.path.join(_scratchDir, "cache.xlsx")
+        tdf.xls.write_file(ticDat, filePath)
+        # nothing is cached (or kept in memory) outside of a cached_workbooks scope
+        self.assertFalse(tdf.xls.find_duplicates(filePath))
+        self.assertTrue(xls._workbook(filePath) is not xls._workbook(filePath) and not xls._workbook_cache)
+        with tdf.xls.cached_workbooks():
+            book = xls._workbook(filePath)
+            self.assertFalse(tdf.xls.find_duplicates(filePath))
+            self.assertTrue(tdf._same_data(ticDat, tdf.xls.create_tic_dat(filePath)))
+            self.assertTrue(xls._workbook(filePath) is book)
+
+            pairs_tdf = TicDatFactory(pairs = [[], ["x", "y"]])
+            pairsPath = os.path.join(_scratchDir, "cachePairs.xlsx")
+            pairs_tdf.xls.write_file(pairs_tdf.TicDat(pairs = [[1, 2], [3, 4], [5, 6]]), pairsPath)
+            pairs_book = xls._workbook(pairsPath)
+            pairs_tdf = TicDatFactory(pairs = [[], ["x", "y"]])
+            pairs_tdf.set_generator_tables(["pairs"])
+            dat = pairs_tdf.xls.create_tic_dat(pairsPath, treat_inf_as_infinity=False)
+            pairs = lambda : [(_["x"], _["y"]) for _ in dat.pairs()]
+            self.assertTrue(pairs() == pairs() == [(1, 2), (3, 4), (5, 6)])
+            self.assertTrue(xls._workbook(pairsPath) is pairs_book and xls._workbook(filePath) is book)
+            self.assertTrue(xls._workbook(filePath, streaming=True) is not book)
+
+            ticDat2 = tdf.copy_tic_dat(ticDat)
+            ticDat2.arcs["Boston", "Seattle"] = 7
+            tdf.xls.write_file(ticDat2, filePath, allow_overwrite=True)
+            self.assertTrue(tdf._same_data(ticDat2, tdf.xls.create_tic_dat(filePath)))
+            self.assertTrue(xls._workbook(filePath) is not book)
+
+            book = xls._workbook(filePath)
+            with tdf.xls.cached_workbooks(): # scopes can be nested
+                self.assertTrue(xls._workbook(filePath) is book)
+            self.assertTrue(xls._workbook(filePath) is book)
+            tdf.xls.release_workbooks(filePath)
+            self.assertFalse(any(_[0] == os.path.abspath(filePath) for _ in xls._workbook_cache))
+            self.assertTrue(xls._workbook(filePath) is not book)
+            tdf.xls.release_workbooks()
+            self.assertFalse(xls._workbook_cache)
+            xls._workbook(filePath)
+            self.assertTrue(xls._workbook_cache)
+        self.assertFalse(xls._workbook_cache)
+        self.assertTrue(pairs() == [(1, 2), (3, 4), (5, 6)] and not xls._workbook_cache)
+
+    def testConstantMemory(self):
+        if not self.can_run:
+            return
+        tdf = TicDatFactory(**netflowSchema())
+        ticDat = tdf.freeze_me(tdf.TicDat(**{t:getattr(netflowData(),t) for t in tdf.primary_key_fields}))
+        filePath = os.path.join(_scratchDir, "netflowConstant.xlsx")
+        tdf.xls.write_file(ticDat, filePath, constant_memory=True)
+        self.assertTrue(tdf._same_data(ticDat, tdf.xls.create_tic_dat(filePath)))
+
+        tdf = TicDatFactory(a = [["k"], ["big", "small", "name"]], b = [[], ["x", "y"]])
+        tdf.set_data_type("a", "small", max=10, inclusive_max=True)
+        tdf.set_data_type("a", "name", number_allowed=False, strings_allowed="*")
+        dat = tdf.TicDat(a = {1:[float("inf"), 2, "one"], 2:[-float("inf"), 3.5, "two"],
+                              3:[1, float("inf"), "three"]},
+                         b = [[float("inf"), "y"], [1, -float("inf")]])
+        for constant_memory in [True, False]:
+            filePath = os.path.join(_scratchDir, "infs_%s.xlsx"%constant_memory)
+            tdf.xls.write_file(dat, filePath, constant_memory=constant_memory)
+            self.assertTrue(tdf._same_data(dat, tdf.xls.create_tic_dat(filePath)))
+            dat2 = tdf.xls.create_tic_dat(filePath, treat_inf_as_infinity=False)
+            self.assertTrue(dat2.a[1]["big"] == "inf" and dat2.a[2]["big"] == "-inf")
+            self.assertTrue(dat2.a[3]["small"] == "inf")
+            self.assertTrue(tdf.xls.create_tic_dat(filePath, streaming=True).a[2]["big"] == -float("inf"))
+
+    def testSubTuple(self):
+        tdf = TicDatFactory(boger = [["the", "big"], ["boger", "woger", "moger"]])
+        tdf.set_data_type("boger", "big", must_be_int=True)
+        tdf.set_data_type("boger", "moger", must_be_int=True)
+        indicies = {"the":4, "big":0, "boger":2, "woger":1, "moger":3}
+        row = [3.0, "w", 2.5, 7.0, "t"]
+        sub_tuple = lambda fields : tdf.xls._sub_tuple("boger", fields, indicies)
+        self.assertTrue(sub_tuple(("the", "big"))(row) == ("t", 3) and
+                        isinstance(sub_tuple(("the", "big"))(row)[1], int))
+        self.assertTrue(sub_tuple(("boger", "woger"))(row) == (2.5, "w"))
+        self.assertTrue(sub_tuple(("boger",))(row) == 2.5)
+        self.assertTrue(isinstance(sub_tuple(("moger",))(row), int))
+        self.assertTrue(sub_tuple(("moger", "woger"))(["a", "w", 0, 7.5]) == (7.5, "w"))
+        self.assertTrue(sub_tuple(())(row) == ())
+
     def testBiggie(self):
         if not self.can_run:
             return
@@ -15,6 +15,7 @@ import ticdat.csvtd as csv
 import ticdat.sqlitetd as sql
 import ticdat.mdb as mdb
 import ticdat.jsontd as json
+import ticdat.parquettd as parquet
 import ticdat.opalytics as opalytics
 import sys
 try:
@@ -724,6 +725,7 @@ class TicDatFactory(freezable_factory(object, "_isFrozen", {"opl_prepend", "ling
         self.sql = sql.SQLiteTicFactory(self)
         self.mdb = mdb.MdbTicFactory(self)
         self.json = json.JsonTicFactory(self)
+        self.parquet = parquet.ParquetTicFactory(self)
         self.opalytics = opalytics.OpalyticsTicFactory(self)
         self._prepends = {}
         self._isFrozen=True
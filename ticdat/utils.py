@@ -9,7 +9,19 @@ import ticdat
 import getopt
 import sys
 import os
+import io
+import gzip
+import hashlib
+import pickle
+import bz2
+import zipfile
 from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+try:
+    import lzma
+except:
+    lzma = None
 
 try:
     import pandas as pd
@@ -111,6 +123,9 @@ def standard_main(input_schema, solution_schema, solve):
         model will be stored in a directory containing a series of .csv files)
 
     Defaults are input.xlsx, output.xlsx
+
+    The optional "--cache <parse_cache_dir>" command line argument reads the input through a ParseCache
+    stored in that directory, so that repeated runs on unchanged input skip re-parsing it.
     """
     verify(all(isinstance(_, ticdat.TicDatFactory) for _ in (input_schema, solution_schema)) or
            all(isinstance(_, ticdat.PanDatFactory) for _ in (input_schema, solution_schema)),
@@ -126,15 +141,15 @@ def standard_main(input_schema, solution_schema, solve):
 def _standard_main_pandat(input_schema, solution_schema, solve):
     file_name = sys.argv[0]
     def usage():
-        print ("python %s --help --input <input file or dir> --output <output file or dir>"%
-               file_name)
+        print ("python %s --help --input <input file or dir> --output <output file or dir> "
+               "--cache <parse cache dir>"%file_name)
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hi:o:", ["help", "input=", "output="])
+        opts, args = getopt.getopt(sys.argv[1:], "hi:o:c:", ["help", "input=", "output=", "cache="])
     except getopt.GetoptError as err:
         print (str(err))  # will print something like "option -a not recognized"
         usage()
         sys.exit(2)
-    input_file, output_file = "input.xlsx", "output.xlsx"
+    input_file, output_file, cache_dir = "input.xlsx", "output.xlsx", None
     for o, a in opts:
         if o in ("-h", "--help"):
             usage()
@@ -143,6 +158,8 @@ def _standard_main_pandat(input_schema, solution_schema, solve):
             input_file = a
         elif o in ("-o", "--output"):
             output_file = a
+        elif o in ("-c", "--cache"):
+            cache_dir = a
         else:
             verify(False, "unhandled option")
     file_or_dir = lambda f :"file" if any(f.endswith(_) for _ in (".json", ".xls", ".xlsx", ".db")) \
@@ -152,16 +169,18 @@ def _standard_main_pandat(input_schema, solution_schema, solve):
     else:
         print("input %s %s : output %s %s"%(file_or_dir(input_file), input_file,
                                             file_or_dir(output_file), output_file))
+        cache = ParseCache(cache_dir) if cache_dir else None
+        read = cache.read if cache else (lambda reader, path : reader(path))
         dat = None
         if os.path.isfile(input_file) and file_or_dir(input_file) == "file":
             if input_file.endswith(".json"):
-                dat = input_schema.json.create_pan_dat(input_file)
+                dat = read(input_schema.json.create_pan_dat, input_file)
             if input_file.endswith(".xls") or input_file.endswith(".xlsx"):
-                dat = input_schema.xls.create_pan_dat(input_file)
+                dat = read(input_schema.xls.create_pan_dat, input_file)
             if input_file.endswith(".db"):
-                dat = input_schema.sql.create_pan_dat(input_file)
+                dat = read(input_schema.sql.create_pan_dat, input_file)
         elif os.path.isdir(input_file) and file_or_dir(input_file) == "directory":
-            dat = input_schema.csv.create_pan_dat(input_file)
+            dat = read(input_schema.csv.create_pan_dat, input_file)
         verify(dat, "Failed to read from and/or recognize %s"%input_file)
         sln = solve(dat)
         if sln:
@@ -182,15 +201,15 @@ def _standard_main_pandat(input_schema, solution_schema, solve):
 def _standard_main_ticdat(input_schema, solution_schema, solve):
     file_name = sys.argv[0]
     def usage():
-        print ("python %s --help --input <input file or dir> --output <output file or dir>"%
-               file_name)
+        print ("python %s --help --input <input file or dir> --output <output file or dir> "
+               "--cache <parse cache dir>"%file_name)
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hi:o:", ["help", "input=", "output="])
+        opts, args = getopt.getopt(sys.argv[1:], "hi:o:c:", ["help", "input=", "output=", "cache="])
     except getopt.GetoptError as err:
         print (str(err))  # will print something like "option -a not recognized"
         usage()
         sys.exit(2)
-    input_file, output_file = "input.xlsx", "output.xlsx"
+    input_file, output_file, cache_dir = "input.xlsx", "output.xlsx", None
     for o, a in opts:
         if o in ("-h", "--help"):
             usage()
@@ -199,6 +218,8 @@ def _standard_main_ticdat(input_schema, solution_schema, solve):
             input_file = a
         elif o in ("-o", "--output"):
             output_file = a
+        elif o in ("-c", "--cache"):
+            cache_dir = a
         else:
             verify(False, "unhandled option")
     file_or_dir = lambda f :"file" if any(f.endswith(_) for _ in
@@ -209,26 +230,23 @@ def _standard_main_ticdat(input_schema, solution_schema, solve):
     else:
         print("input %s %s : output %s %s"%(file_or_dir(input_file), input_file,
                                             file_or_dir(output_file), output_file))
+        cache = ParseCache(cache_dir) if cache_dir else None
+        read = cache.read if cache else (lambda reader, path, **kwargs : reader(path, **kwargs))
         dat = None
         if os.path.isfile(input_file) and file_or_dir(input_file) == "file":
             if input_file.endswith(".json"):
-                assert not input_schema.json.find_duplicates(input_file), "duplicate rows found"
-                dat = input_schema.json.create_tic_dat(input_file)
+                dat = read(input_schema.json.create_tic_dat, input_file, duplicates_handler=_assert_no_duplicates)
             if input_file.endswith(".xls") or input_file.endswith(".xlsx"):
-                assert not input_schema.xls.find_duplicates(input_file), "duplicate rows found"
-                dat = input_schema.xls.create_tic_dat(input_file)
+                dat = read(input_schema.xls.create_tic_dat, input_file, duplicates_handler=_assert_no_duplicates)
             if input_file.endswith(".db"):
-                assert not input_schema.sql.find_duplicates(input_file), "duplicate rows found"
-                dat = input_schema.sql.create_tic_dat(input_file)
+                dat = read(input_schema.sql.create_tic_dat, input_file, duplicates_handler=_assert_no_duplicates)
             if input_file.endswith(".sql"):
                 # no way to check a .sql file for duplications
-                dat = input_schema.sql.create_tic_dat_from_sql(input_file)
+                dat = read(input_schema.sql.create_tic_dat_from_sql, input_file)
             if input_file.endswith(".mdb") or input_file.endswith(".accdb"):
-                assert not input_schema.mdb.find_duplicates(input_file), "duplicate rows found"
-                dat = input_schema.mdb.create_tic_dat(input_file)
+                dat = read(input_schema.mdb.create_tic_dat, input_file, duplicates_handler=_assert_no_duplicates)
         elif os.path.isdir(input_file) and file_or_dir(input_file) == "directory":
-            assert not input_schema.csv.find_duplicates(input_file), "duplicate rows found"
-            dat = input_schema.csv.create_tic_dat(input_file)
+            dat = read(input_schema.csv.create_tic_dat, input_file, duplicates_handler=_assert_no_duplicates)
         verify(dat, "Failed to read from and/or recognize %s"%input_file)
         sln = solve(dat)
         if sln:
@@ -901,4 +919,420 @@ def per_error(x1, x2) :
     return 0
 
 def nearly_same(x1, x2, epsilon) :
-    return per_error(x1, x2) < epsilon
\ No newline at end of file
+    return per_error(x1, x2) < epsilon
+_compressions = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+_compression_block_size = 2**20
+
+def _compression_suffix(file_name):
+    """
+    the compression suffix (".gz", ".bz2" or ".xz") that file_name ends with, if any
+    """
+    return next((_ for _ in _compressions if file_name.lower().endswith(_)), None)
+
+def _compression_module(suffix):
+    verify(suffix != ".xz" or lzma, "lzma needs to be installed to use .xz files")
+    return {".gz": gzip, ".bz2": bz2, ".xz": lzma}[suffix]
+
+class _ThreadedCompressedWriter(object):
+    """
+    a text file writer that compresses blocks of text in a thread pool, each block as its own
+    compressed stream. The streams are concatenated, which gzip, bz2 and xz readers all read as
+    a single file. The next blocks are compressed while the previous ones are being written.
+    """
+    def __init__(self, file_path, mode, module, threads):
+        self._file = open(file_path, mode[0] + "b")
+        self._compress = module.compress
+        self._threads = threads
+        self._pool = ThreadPool(threads)
+        self._buffer, self._size, self._blocks, self._pending = [], 0, [], None
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= _compression_block_size:
+            self._blocks.append("".join(self._buffer).encode("utf-8"))
+            self._buffer, self._size = [], 0
+            if len(self._blocks) >= self._threads:
+                self._flush_blocks()
+        return len(text)
+    def flush(self):
+        pass
+    def __iter__(self): # pandas only accepts iterable objects as file-like
+        raise io.UnsupportedOperation("not readable")
+    def _write_pending(self):
+        if self._pending:
+            for data in self._pending.get():
+                self._file.write(data)
+            self._pending = None
+    def _flush_blocks(self):
+        self._write_pending()
+        self._pending = self._pool.map_async(self._compress, self._blocks)
+        self._blocks = []
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._buffer:
+                self._blocks.append("".join(self._buffer).encode("utf-8"))
+                self._buffer = []
+            if self._blocks:
+                self._flush_blocks()
+            self._write_pending()
+        finally:
+            self._pool.close()
+            self._file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *excinfo):
+        self.close()
+
+def _open_data_file(file_path, mode="r", compress_threads=1):
+    """
+    open a data file as text. Files ending with .gz, .bz2 or .xz are (de)compressed as they are
+    streamed. When writing a compressed file with compress_threads > 1, blocks of the file are
+    compressed in parallel.
+    """
+    verify(isinstance(compress_threads, int) and compress_threads >= 1,
+           "compress_threads needs to be a positive integer")
+    suffix = _compression_suffix(file_path)
+    if not suffix:
+        return open(file_path, mode)
+    module = _compression_module(suffix)
+    if "r" not in mode and compress_threads > 1:
+        return _ThreadedCompressedWriter(file_path, mode, module, compress_threads)
+    return module.open(file_path, mode + "t", encoding="utf-8")
+
+class _DataDirectory(object):
+    """
+    a directory of data files, or a .zip archive of one. Only the base names of the archive
+    members are considered.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.is_zip = os.path.isfile(path) and zipfile.is_zipfile(path)
+        verify(self.is_zip or os.path.isdir(path), "%s is neither a directory nor a zip archive"%path)
+    def file_names(self):
+        if self.is_zip:
+            with zipfile.ZipFile(self.path) as zf:
+                return [os.path.basename(_) for _ in zf.namelist() if not _.endswith("/")]
+        return [f for f in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, f))]
+    def find(self, table, extension):
+        """
+        the name of the file for the table, matched with case-space insensitivity, with or without
+        a compression suffix
+        """
+        names = {"%s%s%s"%(table.lower(), extension, _) for _ in [""] + list(_compressions)}
+        rtn = [f for f in self.file_names() if f.lower().replace(" ", "_") in names]
+        verify(len(rtn) <= 1, "duplicate %s files found for %s"%(extension, table))
+        if rtn:
+            return rtn[0]
+    def _member(self, zf, name):
+        return next(_ for _ in zf.namelist() if os.path.basename(_) == name and not _.endswith("/"))
+    def open_binary(self, name):
+        """
+        a binary stream of the file's (still compressed) bytes
+        """
+        if not self.is_zip:
+            return open(os.path.join(self.path, name), "rb")
+        zf = zipfile.ZipFile(self.path)
+        try:
+            return zf.open(self._member(zf, name)) # the member keeps the archive file open
+        finally:
+            zf.close()
+    def open(self, name):
+        """
+        a (decompressing) text stream of the file
+        """
+        if not self.is_zip:
+            return _open_data_file(os.path.join(self.path, name))
+        suffix = _compression_suffix(name)
+        if suffix:
+            return _compression_module(suffix).open(self.open_binary(name), "rt", encoding="utf-8")
+        return io.TextIOWrapper(self.open_binary(name), encoding="utf-8")
+
+def _zip_writer(zip_path):
+    verify(sys.version_info >= (3, 6), "Writing to zip archives requires Python 3.6 or later")
+    return zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED)
+
+def _open_zip_member(zf, name):
+    """
+    a text stream that writes a member of a zip archive opened by _zip_writer
+    """
+    return io.TextIOWrapper(zf.open(name, "w"), encoding="utf-8", newline="")
+
+_parse_cache_suffix = ".parsed"
+_parse_cache_hashes = "file_hashes.pickle"
+_hash_block_size = 2**20
+
+def _canonical_repr(x):
+    """
+    a repr that doesn't depend on the iteration order of dictionaries and sets
+    """
+    if dictish(x):
+        return "{%s}"%", ".join(sorted("%s: %s"%(_canonical_repr(k), _canonical_repr(v)) for k,v in x.items()))
+    if isinstance(x, (set, frozenset)):
+        return "{%s}"%", ".join(sorted(map(_canonical_repr, x)))
+    if containerish(x) and not stringish(x):
+        return "[%s]"%", ".join(map(_canonical_repr, x))
+    if callable(x) and hasattr(x, "__name__"): # functions are known by name, not by memory address
+        return "%s.%s"%(getattr(x, "__module__", ""), getattr(x, "__qualname__", x.__name__))
+    return repr(x)
+
+def _content_hash(file_path):
+    rtn = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda : f.read(_hash_block_size), b""):
+            rtn.update(block)
+    return rtn.hexdigest()
+
+def _source_files(path):
+    """
+    the files that make up a data source - either the file itself, or every file beneath the directory
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(root, f) for root, dirs, files in os.walk(path) for f in files)
+
+class ParseCache(object):
+    """
+    An opt-in, on-disk cache of parsed input data, for when the same input files are read
+    again and again.
+
+    ex: cache = ParseCache("parse_cache")
+        dat = cache.read(tdf.csv.create_tic_dat, "input_dir", freeze_it=True)
+
+    The first read parses the input as usual and stores the result in a fast binary (pickle) form.
+    Later reads with the same reader, arguments and schema return the stored result, so long as the
+    source files are unchanged.
+    """
+    def __init__(self, cache_dir, max_size = 2**30):
+        """
+        :param cache_dir: the directory holding the cached results. Will be created if need be.
+
+        :param max_size: the maximum number of bytes of cached results. When exceeded, the least recently
+                         used results are evicted.
+        """
+        verify(not os.path.isfile(cache_dir), "A file is not a valid cache directory path")
+        verify(numericish(max_size) and max_size > 0, "max_size needs to be a positive number")
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir, self.max_size = cache_dir, max_size
+    def read(self, reader, path, *args, **kwargs):
+        """
+        read a data source, returning the cached result when the source is unchanged
+
+        :param reader: a reading function of a TicDatFactory or PanDatFactory
+                       (such as tdf.csv.create_tic_dat or pdf.sql.create_pan_dat)
+
+        :param path: the file or directory path passed to the reader
+
+        :param args: any additional positional arguments for the reader
+
+        :param kwargs: any named arguments for the reader
+
+        :return: the result of reader(path, *args, **kwargs)
+
+        caveats: The cache key combines the reader, the full schema (including data types, default values and
+                 foreign keys), the other arguments, and the path, size and content hash of every source file
+                 (every file beneath path, if path is a directory). The content hash is only recomputed when
+                 the size or modification time of a file changes.
+                 Schemas with generator tables, and results that can't be pickled, are read without caching.
+                 Each read returns a new object, so the returned data can be edited without affecting the cache.
+                 A duplicates_handler argument is passed the duplicates found when the source was parsed,
+                 even when the result is returned from the cache.
+        """
+        sub_factory = getattr(reader, "__self__", None)
+        factory = getattr(sub_factory, "tic_dat_factory", getattr(sub_factory, "pan_dat_factory", None))
+        verify(callable(reader) and factory is not None,
+               "reader needs to be a reading function of a TicDatFactory or PanDatFactory")
+        verify(stringish(path) and os.path.exists(path), "%s isn't a valid file or directory path"%path)
+        if getattr(factory, "generator_tables", None):
+            return reader(path, *args, **kwargs)
+        # the duplicates report is cached along with the data, and replayed through the handler
+        duplicates_handler = kwargs.pop("duplicates_handler", None)
+        entry_path = os.path.join(self.cache_dir, self._key(factory, reader, path, args, kwargs) +
+                                  _parse_cache_suffix)
+        loaded = self._load(factory, entry_path)
+        if loaded is not None and (duplicates_handler is None or loaded[1] is not None):
+            if duplicates_handler:
+                duplicates_handler(loaded[1])
+            return loaded[0]
+        duplicates = []
+        if duplicates_handler:
+            kwargs["duplicates_handler"] = duplicates.append
+        rtn = reader(path, *args, **kwargs)
+        self._store(factory, entry_path, rtn, duplicates[0] if duplicates else None)
+        if duplicates:
+            duplicates_handler(duplicates[0])
+        return rtn
+    def clear(self):
+        """
+        remove all the cached results
+        """
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(_parse_cache_suffix) or f == _parse_cache_hashes:
+                os.remove(os.path.join(self.cache_dir, f))
+    def _key(self, factory, reader, path, args, kwargs):
+        hashes_path = os.path.join(self.cache_dir, _parse_cache_hashes)
+        try:
+            with open(hashes_path, "rb") as f:
+                known_hashes = pickle.load(f)
+        except Exception: # a missing or unreadable memo just means the hashes are recomputed
+            known_hashes = {}
+        files, new_hashes = [], {}
+        for f in map(os.path.abspath, _source_files(path)):
+            stat = os.stat(f)
+            stamp = (f, stat.st_size, stat.st_mtime)
+            new_hashes[stamp] = known_hashes.get(stamp) or _content_hash(f)
+            files.append((f, stat.st_size, new_hashes[stamp]))
+        if set(new_hashes).difference(known_hashes):
+            known_hashes.update(new_hashes)
+            self._write_atomically(hashes_path, {k:v for k,v in known_hashes.items() if os.path.exists(k[0])})
+        key = [type(factory).__name__, type(reader.__self__).__name__, reader.__name__,
+               factory.schema(include_ancillary_info=True), args, kwargs, files]
+        return hashlib.sha1(_canonical_repr(key).encode("utf-8")).hexdigest()
+    def _load(self, factory, entry_path):
+        """
+        the (result, duplicates report) pair cached at entry_path, or None
+        """
+        try:
+            with open(entry_path, "rb") as f:
+                kind, data, frozen, duplicates = pickle.load(f)
+        except Exception:
+            if os.path.exists(entry_path): # an unreadable entry is dropped, and the source is parsed again
+                os.remove(entry_path)
+            return None
+        os.utime(entry_path, None) # mark as recently used
+        if kind == "TicDat":
+            rtn = factory.TicDat(**data)
+            return (factory.freeze_me(rtn) if frozen else rtn), duplicates
+        if kind == "PanDat":
+            return factory.PanDat(**data), duplicates
+        return data, duplicates
+    def _store(self, factory, entry_path, result, duplicates = None):
+        if isinstance(factory, ticdat.TicDatFactory) and isinstance(result, factory.TicDat):
+            data = factory.as_dict(result)
+            data.update({t:getattr(result, t) for t in factory.generic_tables})
+            entry = ("TicDat", data, getattr(result, "_isFrozen", False), duplicates)
+        elif isinstance(factory, ticdat.PanDatFactory) and isinstance(result, factory.PanDat):
+            entry = ("PanDat", {t:getattr(result, t) for t in factory.all_tables}, False, duplicates)
+        elif result is None:
+            return
+        else:
+            entry = ("value", result, False, duplicates)
+        try:
+            size = self._write_atomically(entry_path, entry)
+        except (pickle.PicklingError, TypeError, AttributeError): # not everything can be cached
+            return
+        if size > self.max_size:
+            os.remove(entry_path)
+        self._evict()
+    def _write_atomically(self, file_path, obj):
+        temp_path = "%s.%s.tmp"%(file_path, os.getpid())
+        try:
+            with open(temp_path, "wb") as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            getattr(os, "replace", os.rename)(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return os.path.getsize(file_path)
+    def _evict(self):
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(_parse_cache_suffix):
+                stat = os.stat(os.path.join(self.cache_dir, f))
+                entries.append((stat.st_mtime, stat.st_size, f))
+        total = sum(_[1] for _ in entries)
+        for mtime, size, f in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(os.path.join(self.cache_dir, f))
+            total -= size
+
+def _projected_factory(factory, tables, fields):
+    """
+    a clone of a TicDatFactory or PanDatFactory restricted to the tables to be read, and to the
+    data fields to be read for those tables. Foreign keys, data types, default values and data row
+    predicates are kept where everything they refer to is kept.
+    """
+    verify(tables is None or (containerish(tables) and not stringish(tables)),
+           "tables should be a collection of table names")
+    tables = set(factory.all_tables if tables is None else tables)
+    verify(tables.issubset(factory.all_tables), "tables includes unrecognized tables %s"%
+           sorted(tables.difference(factory.all_tables)))
+    fields = fields or {}
+    verify(dictish(fields), "fields should be a dictionary mapping tables to data fields")
+    for t, fs in fields.items():
+        verify(t in tables, "%s has fields to read but isn't one of the tables to read"%t)
+        verify(t not in factory.generic_tables, "fields can't be specified for the generic table %s"%t)
+        verify(containerish(fs) and not stringish(fs), "the fields for %s should be a collection of field names"%t)
+        verify(set(fs).issubset(all_fields(factory, t)), "%s includes unrecognized fields %s"%
+               (t, sorted(set(fs).difference(all_fields(factory, t)))))
+    tables_fields = {t: '*' if t in factory.generic_tables else
+                        [list(factory.primary_key_fields.get(t, ())),
+                         [f for f in factory.data_fields.get(t, ()) if t not in fields or f in fields[t]]]
+                     for t in tables}
+    kept = {(t, f) for t, fs in tables_fields.items() if fs != '*' for f in fs[0] + fs[1]}
+    full_schema = factory.schema(include_ancillary_info=True)
+    rtn = type(factory).create_from_full_schema({
+        "tables_fields": tables_fields,
+        "foreign_keys": [fk for fk in full_schema["foreign_keys"]
+                         if all((fk.native_table, f) in kept for f in fk.nativefields()) and
+                            all((fk.foreign_table, f) in kept for f in fk.foreigntonativemapping())],
+        "default_values": {t: {f: v for f, v in fvs.items() if (t, f) in kept}
+                           for t, fvs in full_schema["default_values"].items()},
+        "data_types": {t: {f: v for f, v in fdts.items() if (t, f) in kept}
+                       for t, fdts in full_schema["data_types"].items()}})
+    if getattr(factory, "generator_tables", None):
+        rtn.set_generator_tables(tables.intersection(factory.generator_tables))
+    for t, row_predicates in factory._data_row_predicates.items():
+        if t in tables and t not in fields:
+            for pn, p in row_predicates.items():
+                rtn.add_data_row_predicate(t, predicate=p, predicate_name=pn)
+    return rtn
+
+def _projected_read(factory, tables, fields, read, freeze_it = False):
+    """
+    read only the requested tables and fields, by passing a projected clone of the factory to read.
+    Returns a data object of the full factory, whose other tables are empty and whose other data
+    fields hold their default values.
+    """
+    projected = _projected_factory(factory, tables, fields)
+    dat = read(projected)
+    if isinstance(factory, ticdat.PanDatFactory):
+        rtn = {}
+        for t in factory.all_tables:
+            if t not in projected.all_tables:
+                rtn[t] = DataFrame(columns=[] if t in factory.generic_tables else list(all_fields(factory, t)))
+                continue
+            rtn[t] = getattr(dat, t)
+            for f in all_fields(factory, t):
+                if f not in all_fields(projected, t):
+                    rtn[t][f] = factory.default_values[t][f]
+        return factory.PanDat(**rtn)
+    rtn = factory.TicDat(**{t: getattr(dat, t) for t in projected.all_tables})
+    if freeze_it:
+        return factory.freeze_me(rtn)
+    return rtn
+
+class _KeyCountingDict(dict):
+    """
+    a table dictionary that counts the primary keys that are set more than once, so that duplicates
+    are found while the table is being loaded rather than by reading the data a second time
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.duplicates = {}
+    def __setitem__(self, key, value):
+        if key in self:
+            self.duplicates[key] = self.duplicates.get(key, 1) + 1
+        dict.__setitem__(self, key, value)
+
+def _loaded_duplicates(tables):
+    """
+    the duplicates found while loading the tables, in the same format as find_duplicates returns
+    """
+    return {t: dict(v.duplicates) for t, v in tables.items() if isinstance(v, _KeyCountingDict) and v.duplicates}
+
+def _assert_no_duplicates(duplicates):
+    assert not duplicates, "duplicate rows found"
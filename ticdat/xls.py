@@ -5,8 +5,14 @@ PEP8
 import ticdat.utils as utils
 from ticdat.utils import freezable_factory, TicDatError, verify, containerish, case_space_to_pretty, FrozenDict
 import os
-from collections import defaultdict
-from itertools import product
+import re
+import zipfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import defaultdict, OrderedDict
+from itertools import product, chain
+from operator import itemgetter
+from contextlib import contextmanager
 
 try:
     import xlrd
@@ -27,6 +33,260 @@ _can_unit_test = xlrd and xlwt and xlsx
 # the xlsxwriter doesn't handle infinity as seamlessly as xls
 _longest_sheet = 30
 
+_xlsx_ns = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_xlsx_rel_ns = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_xlsx_pkg_rel_ns = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_xml_space = "{http://www.w3.org/XML/1998/namespace}space"
+_xlsx_unescape = re.compile(r"_x([0-9A-Fa-f]{4})_").sub
+_xlsx_column_ref = re.compile(r"[A-Za-z]+")
+_xlsx_chunk_size = 2**16
+_workbook_cache_size = 4
+
+def _xlsx_text(elem):
+    # mirrors how xlrd cooks the text of a <t> or <v> element
+    rtn = elem.text or ""
+    if elem.get(_xml_space) != "preserve":
+        rtn = rtn.strip("\t\n\r ")
+    return _xlsx_unescape(lambda m : chr(int(m.group(1), 16)), rtn)
+
+def _xlsx_rich_text(elem):
+    # the text of an <si> or <is> element, ignoring phonetic runs
+    rtn = []
+    for child in elem:
+        if child.tag == _xlsx_ns + "t":
+            rtn.append(_xlsx_text(child))
+        elif child.tag == _xlsx_ns + "r":
+            rtn.extend(_xlsx_text(_) for _ in child if _.tag == _xlsx_ns + "t")
+    return "".join(rtn)
+
+def _xlsx_column_index(cell_ref):
+    rtn = 0
+    for c in _xlsx_column_ref.match(cell_ref).group(0).upper():
+        rtn = rtn * 26 + ord(c) - ord("A") + 1
+    return rtn - 1
+
+class _XlsxStreamingBook(object):
+    """
+    a minimal, read-only stand in for an xlrd book that streams the rows of .xlsx sheets
+    rather than parsing the entire workbook into memory. Only the shared strings table is held.
+    """
+    def __init__(self, xlsx_file_path):
+        self.file_path = xlsx_file_path
+        with zipfile.ZipFile(xlsx_file_path) as zf:
+            names = set(zf.namelist())
+            rels = {r.get("Id"): r.get("Target") for r in
+                    ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(_xlsx_pkg_rel_ns + "Relationship")}
+            self.shared_strings = []
+            if "xl/sharedStrings.xml" in names:
+                with zf.open("xl/sharedStrings.xml") as f:
+                    for event, elem in ET.iterparse(f):
+                        if elem.tag == _xlsx_ns + "si":
+                            self.shared_strings.append(_xlsx_rich_text(elem))
+                            elem.clear()
+            self._sheets = []
+            for sheet in ET.fromstring(zf.read("xl/workbook.xml")).iter(_xlsx_ns + "sheet"):
+                target = rels[sheet.get(_xlsx_rel_ns + "id")]
+                member = target.lstrip("/") if target.startswith("/") else "xl/" + target
+                self._sheets.append(_XlsxStreamingSheet(self, sheet.get("name"), member))
+    def sheets(self):
+        return list(self._sheets)
+
+class _XlsxSheetTarget(object):
+    """
+    an ElementTree parser target that turns the xml of an .xlsx worksheet into rows of
+    cell values, without ever building an element tree. The completed rows are collected
+    in the rows attribute, which is drained by _XlsxStreamingSheet.rows.
+    """
+    _c, _v, _t, _row = (_xlsx_ns + _ for _ in ("c", "v", "t", "row"))
+    _rph, _dimension = _xlsx_ns + "rPh", _xlsx_ns + "dimension"
+    def __init__(self, shared_strings):
+        self.shared_strings = shared_strings
+        self.rows, self.width = [], 0
+        self._row_ref = self._values = self._cell = self._text = None
+        self._in_phonetic = False
+        self._column_indicies = {}
+    def start(self, tag, attrib):
+        if tag == self._c:
+            self._cell = [attrib.get("r"), attrib.get("t", "n"), None]
+        elif tag == self._v or (tag == self._t and self._cell and not self._in_phonetic):
+            self._text = [attrib.get(_xml_space) == "preserve"]
+        elif tag == self._row:
+            self._row_ref, self._values = attrib.get("r"), []
+        elif tag == self._rph:
+            self._in_phonetic = True
+        elif tag == self._dimension:
+            last_cell = attrib.get("ref", "").split(":")[-1]
+            if _xlsx_column_ref.match(last_cell):
+                self.width = _xlsx_column_index(last_cell) + 1
+    def data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+    def _column_index(self, ref):
+        letters = ref.rstrip("0123456789")
+        if letters not in self._column_indicies:
+            self._column_indicies[letters] = _xlsx_column_index(letters)
+        return self._column_indicies[letters]
+    def end(self, tag):
+        if self._text is not None and (tag == self._v or tag == self._t):
+            text = "".join(self._text[1:])
+            if not self._text[0]:
+                text = text.strip("\t\n\r ")
+            if "_x" in text:
+                text = _xlsx_unescape(lambda m : chr(int(m.group(1), 16)), text)
+            self._cell[2] = text if self._cell[2] is None else self._cell[2] + text
+            self._text = None
+        elif tag == self._c:
+            ref, cell_type, text = self._cell
+            values = self._values
+            col = self._column_index(ref) if ref else len(values)
+            if col >= len(values):
+                values.extend([""] * (col + 1 - len(values)))
+            if text is not None:
+                values[col] = self._cell_value(cell_type, text)
+            self._cell = None
+        elif tag == self._row:
+            self.rows.append((self._row_ref, self._values))
+        elif tag == self._rph:
+            self._in_phonetic = False
+    def _cell_value(self, cell_type, text):
+        if cell_type == "n":
+            return float(text) if text else ""
+        if cell_type == "s":
+            return self.shared_strings[int(text)]
+        if cell_type == "b":
+            return int(text)
+        if cell_type == "e":
+            error_codes = {v:k for k,v in xlrd.biffh.error_text_from_code.items()} if xlrd else {}
+            return error_codes.get(text, text)
+        return text
+    def close(self):
+        pass
+
+class _XlsxStreamingSheet(object):
+    """
+    a streaming stand in for an xlrd sheet. Rows are yielded in the same form as
+    xlrd.sheet.row_values, one at a time, with only the current rows held in memory.
+    """
+    def __init__(self, book, name, member):
+        self.book, self.name, self._member = book, name, member
+    def rows(self, first_row = 0, width = 0):
+        """
+        yields the row values, starting with first_row. Each row is padded with empty strings
+        to be at least width long (or as wide as the dimension of the sheet, if it is declared).
+        Empty rows at the end of the sheet are skipped, as they are with xlrd.
+        """
+        target = _XlsxSheetTarget(self.book.shared_strings)
+        parser = ET.XMLParser(target=target)
+        next_row = 0
+        with zipfile.ZipFile(self.book.file_path) as zf:
+            with zf.open(self._member) as f:
+                for chunk in iter(lambda : f.read(_xlsx_chunk_size), b""):
+                    parser.feed(chunk)
+                    rows, target.rows = target.rows, []
+                    for row_ref, values in rows:
+                        row_index = int(row_ref) - 1 if row_ref else next_row
+                        if not any(_ != "" for _ in values):
+                            continue
+                        width = max(width, target.width)
+                        for i in range(max(next_row, first_row), row_index):
+                            yield [""] * width
+                        if row_index >= first_row:
+                            yield values + [""] * (width - len(values))
+                        next_row = row_index + 1
+        parser.close()
+
+_workbook_cache = OrderedDict()
+_workbook_cache_lock = threading.Lock()
+_workbook_cache_users = 0 # the number of cached_workbooks scopes that are open
+
+def _file_stamp(xls_file_path):
+    st = os.stat(xls_file_path)
+    return (st.st_mtime_ns if hasattr(st, "st_mtime_ns") else st.st_mtime, st.st_size, st.st_ino)
+
+def _workbook(xls_file_path, streaming = False):
+    """
+    get the parsed workbook for an Excel file, re-using a cached one if the file is unchanged
+
+    :param xls_file_path: the path of the Excel file
+
+    :param streaming: boolean. If truthy, returns an _XlsxStreamingBook, otherwise an xlrd book
+
+    :return: a workbook. Inside a _cached_workbooks scope, it is shared by all the readers until the
+             file changes or is released, and the least recently used workbooks are dropped once
+             _workbook_cache_size are held. Otherwise a freshly parsed workbook is returned.
+    """
+    open_book = lambda : _XlsxStreamingBook(xls_file_path) if streaming else xlrd.open_workbook(xls_file_path)
+    if not _workbook_cache_users:
+        return open_book()
+    key, stamp = (os.path.abspath(xls_file_path), bool(streaming)), _file_stamp(xls_file_path)
+    with _workbook_cache_lock:
+        cached = _workbook_cache.pop(key, None)
+        if cached and cached[0] == stamp:
+            _workbook_cache[key] = cached
+            return cached[1]
+    book = open_book()
+    with _workbook_cache_lock:
+        if not _workbook_cache_users: # the last scope closed while the book was being parsed
+            return book
+        _workbook_cache[key] = (stamp, book)
+        while len(_workbook_cache) > _workbook_cache_size:
+            _workbook_cache.popitem(last=False)
+    return book
+
+@contextmanager
+def _cached_workbooks():
+    global _workbook_cache_users
+    with _workbook_cache_lock:
+        _workbook_cache_users += 1
+    try:
+        yield
+    finally:
+        with _workbook_cache_lock:
+            _workbook_cache_users -= 1
+            if not _workbook_cache_users:
+                _workbook_cache.clear()
+
+def _release_workbooks(xls_file_path = None):
+    with _workbook_cache_lock:
+        for key in list(_workbook_cache):
+            if not xls_file_path or key[0] == os.path.abspath(xls_file_path):
+                del _workbook_cache[key]
+
+_xlsx_inf_strings = {float("inf"): "inf", -float("inf"): "-inf"}
+
+def _write_xlsx_book(file_path, sheets, constant_memory = False, workbook_options = None):
+    """
+    write an .xlsx file one row at a time. Used by both the TicDat and PanDat xls writers.
+
+    :param file_path: the .xlsx file to write. An existing file is replaced.
+
+    :param sheets: iterable of (sheet name, field names, rows) tuples, where rows is an iterable
+                   of sequences of cells. Cells that are +/- infinity are written as "inf"/"-inf".
+
+    :param constant_memory: boolean. Use the xlsxwriter constant_memory mode, which flushes each
+                            row to disk once the next row is started.
+
+    :param workbook_options: (optional) additional xlsxwriter Workbook options
+
+    :return:
+    """
+    verify(xlsx, "Can't write .xlsx files because xlsxwriter package isn't installed.")
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    book = xlsx.Workbook(file_path, dict(workbook_options or {}, constant_memory=bool(constant_memory)))
+    try:
+        inf, neg_inf = float("inf"), -float("inf")
+        infs = (inf, neg_inf)
+        for sheet_name, fields, rows in sheets:
+            write_row = book.add_worksheet(sheet_name).write_row
+            write_row(0, 0, fields)
+            for row_ind, row in enumerate(rows, 1):
+                if inf in row or neg_inf in row:
+                    row = [_xlsx_inf_strings[v] if v in infs else v for v in row]
+                write_row(row_ind, 0, row)
+    finally:
+        book.close()
+
 class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
     """
     Primary class for reading/writing Excel files with TicDat objects.
@@ -49,7 +309,8 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
         self._isFrozen = True
     def create_tic_dat(self, xls_file_path, row_offsets={}, headers_present = True,
                        treat_inf_as_infinity = True,
-                       freeze_it = False):
+                       freeze_it = False, streaming = False, tables = None, fields = None,
+                       duplicates_handler = None):
         """
         Create a TicDat object from an Excel file
 
@@ -67,6 +328,22 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
 
         :param freeze_it: boolean. should the returned object be frozen?
 
+        :param streaming: boolean. Only for .xlsx files. Should the sheets be streamed row by row
+                          rather than having the entire workbook parsed into memory by xlrd?
+                          Recommended for very large workbooks. Generator tables will
+                          re-stream their sheet each time they are iterated.
+
+        :param tables: None, or a collection of the tables to read. The other tables are skipped
+                       by the reader and returned empty.
+
+        :param fields: None, or a dictionary mapping tables to the data fields to read. Primary key
+                       fields are always read. The other data fields of these tables are skipped by the
+                       reader and get their default values.
+
+        :param duplicates_handler: None, or a function that is passed the duplicated primary keys found
+                                   while the data is loaded, as a dictionary in the same format as the one
+                                   returned by find_duplicates.
+
         :return: a TicDat object populated by the matching sheets.
 
         caveats: Missing sheets resolve to an empty table, but missing fields
@@ -83,6 +360,12 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                      the ticdat equivalent of pandas.read_excel convert_float
                      is to set must_be_int to true in data_types.
         """
+        if tables is not None or fields is not None:
+            row_offsets = {t: v for t, v in row_offsets.items() if tables is None or t in tables}
+            return utils._projected_read(self.tic_dat_factory, tables, fields, freeze_it=freeze_it,
+                read=lambda tdf: tdf.xls.create_tic_dat(xls_file_path, row_offsets, headers_present,
+                                                        treat_inf_as_infinity, streaming=streaming,
+                                                        duplicates_handler=duplicates_handler))
         self._verify_differentiable_sheet_names()
         verify(xlrd, "xlrd needs to be installed to use this subroutine")
         tdf = self.tic_dat_factory
@@ -92,8 +375,11 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                "headers need to be present to read generic tables")
         verify(utils.DataFrame or not tdf.generic_tables,
                "Strange absence of pandas despite presence of generic tables")
-        rtn =  tdf.TicDat(**self._create_tic_dat_dict
-                          (xls_file_path, row_offsets, headers_present))
+        dat = self._create_tic_dat_dict(xls_file_path, row_offsets, headers_present, streaming,
+                                        duplicates_handler is not None)
+        if duplicates_handler:
+            duplicates_handler(utils._loaded_duplicates(dat))
+        rtn =  tdf.TicDat(**dat)
         replaceable = defaultdict(dict)
         for t, dfs in tdf.data_types.items():
             replaceable[t] = {df for df, dt in dfs.items()
@@ -112,6 +398,34 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
         if freeze_it:
             return self.tic_dat_factory.freeze_me(rtn)
         return rtn
+    def cached_workbooks(self):
+        """
+        A context manager within which the Excel readers share their parsed workbooks. For example
+
+            with tdf.xls.cached_workbooks():
+                duplicates = tdf.xls.find_duplicates(xls_file_path)
+                dat = tdf.xls.create_tic_dat(xls_file_path)
+
+        parses the file only once.
+
+        :return: a context manager. The cached workbooks are dropped once every such scope is exited.
+
+        caveats : Outside of these scopes, each read parses its file afresh and nothing is kept in memory.
+                  Inside them, create_tic_dat, find_duplicates and generator tables share one parsed
+                  workbook per file. A workbook is re-parsed automatically if its file is modified,
+                  but it otherwise stays in memory until the scope is exited, it is released, or
+                  it is pushed out by more recently read files.
+        """
+        return _cached_workbooks()
+    def release_workbooks(self, xls_file_path = None):
+        """
+        Drop the parsed workbooks that are cached for the Excel readers. See cached_workbooks.
+
+        :param xls_file_path: the Excel file to release. If falsey, all the files are released.
+
+        :return:
+        """
+        _release_workbooks(xls_file_path)
     def _verify_differentiable_sheet_names(self):
         rtn = defaultdict(set)
         for t in self.tic_dat_factory.all_tables:
@@ -120,13 +434,15 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
         verify(not rtn, "The following tables collide when names are truncated to %s characters.\n%s"%
                (_longest_sheet, sorted(map(sorted, rtn))))
     def _get_sheets_and_fields(self, xls_file_path, all_tables, row_offsets, headers_present,
-                               print_missing_tables = False):
+                               print_missing_tables = False, streaming = False):
         verify(utils.stringish(xls_file_path) and os.path.exists(xls_file_path),
                "xls_file_path argument %s is not a valid file path."%xls_file_path)
+        verify(not streaming or zipfile.is_zipfile(xls_file_path),
+               "streaming is only supported for .xlsx files")
         try :
-            book = xlrd.open_workbook(xls_file_path)
+            book = _workbook(xls_file_path, streaming)
         except Exception as e:
-            raise TicDatError("Unable to open %s as xls file : %s"%(xls_file_path, e.message))
+            raise TicDatError("Unable to open %s as xls file : %s"%(xls_file_path, e))
         sheets = defaultdict(list)
         for table, sheet in product(all_tables, book.sheets()) :
             if table.lower()[:_longest_sheet] == sheet.name.lower().replace(' ', '_')[:_longest_sheet]:
@@ -150,22 +466,33 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                "The following field names were duplicated : \n" +
                "\n".join("%s : "%t + ",".join(bf) for t,bf in dup_fields.items() if bf))
         return sheets, field_indicies
-    def _create_generator_obj(self, xlsFilePath, table, row_offset, headers_present):
+    def _create_generator_obj(self, xlsFilePath, table, row_offset, headers_present, streaming):
         tdf = self.tic_dat_factory
         ho = 1 if headers_present else 0
         def tableObj() :
             sheets, field_indicies = self._get_sheets_and_fields(xlsFilePath,
-                                        (table,), {table:row_offset}, headers_present)
+                                        (table,), {table:row_offset}, headers_present,
+                                        streaming=streaming)
             if table in sheets :
-                sheet = sheets[table]
-                table_len = min(len(sheet.col_values(field_indicies[table][field]))
-                               for field in tdf.data_fields[table])
-                for x in (sheet.row_values(i) for i in range(table_len)[row_offset+ho:]):
-                    yield self._sub_tuple(table, tdf.data_fields[table],
-                                          field_indicies[table])(x)
+                sub_tuple = self._sub_tuple(table, tdf.data_fields[table], field_indicies[table])
+                for x in self._sheet_rows(sheets[table], row_offset+ho, field_indicies[table]):
+                    yield sub_tuple(x)
         return tableObj
+    def _sheet_rows(self, sheet, first_row, field_indicies):
+        """
+        the row values of the sheet, starting with first_row. Each row is long enough to be
+        indexed by field_indicies.
+        """
+        if isinstance(sheet, _XlsxStreamingSheet):
+            return sheet.rows(first_row, max(field_indicies.values()) + 1 if field_indicies else 0)
+        return (sheet.row_values(i) for i in range(first_row, sheet.nrows))
+    def _first_row(self, sheet, row_offset):
+        if isinstance(sheet, _XlsxStreamingSheet):
+            return next(iter(sheet.rows(row_offset)), None)
+        return sheet.row_values(row_offset) if sheet.nrows > row_offset else None
 
-    def _create_tic_dat_dict(self, xls_file_path, row_offsets, headers_present):
+    def _create_tic_dat_dict(self, xls_file_path, row_offsets, headers_present, streaming = False,
+                             count_duplicates = False):
         verify(utils.dictish(row_offsets) and
                set(row_offsets).issubset(self.tic_dat_factory.all_tables) and
                all(utils.numericish(x) and (x>=0) for x in row_offsets.values()),
@@ -175,31 +502,32 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
         rtn = {}
         sheets, field_indicies = self._get_sheets_and_fields(xls_file_path,
                                     set(tdf.all_tables).difference(tdf.generator_tables),
-                                    row_offsets, headers_present, print_missing_tables=True)
+                                    row_offsets, headers_present, print_missing_tables=True,
+                                    streaming=streaming)
         ho = 1 if headers_present else 0
         for tbl, sheet in sheets.items() :
             fields = tdf.primary_key_fields.get(tbl, ()) + tdf.data_fields.get(tbl, ())
             assert fields or tbl in self.tic_dat_factory.generic_tables
             indicies = field_indicies[tbl]
-            table_len = min(len(sheet.col_values(indicies[field]))
-                            for field in (fields or indicies))
+            rows = self._sheet_rows(sheet, row_offsets[tbl]+ho, indicies)
             if tdf.primary_key_fields.get(tbl, ()) :
-                tableObj = {self._sub_tuple(tbl, tdf.primary_key_fields[tbl], indicies)(x):
-                            self._sub_tuple(tbl, tdf.data_fields.get(tbl, ()), indicies)(x)
-                            for x in (sheet.row_values(i) for i in
-                                        range(table_len)[row_offsets[tbl]+ho:])}
+                pk_sub_tuple = self._sub_tuple(tbl, tdf.primary_key_fields[tbl], indicies)
+                data_sub_tuple = self._sub_tuple(tbl, tdf.data_fields.get(tbl, ()), indicies)
+                if count_duplicates:
+                    tableObj = utils._KeyCountingDict()
+                    for x in rows:
+                        tableObj[pk_sub_tuple(x)] = data_sub_tuple(x)
+                else:
+                    tableObj = {pk_sub_tuple(x): data_sub_tuple(x) for x in rows}
             elif tbl in tdf.generic_tables:
-                tableObj = [{f:x[i] for f,i in field_indicies[tbl].items()}
-                            for x in (sheet.row_values(i) for i in
-                                      range(table_len)[row_offsets[tbl]+ho:])]
+                tableObj = [{f:x[i] for f,i in field_indicies[tbl].items()} for x in rows]
             else :
-                tableObj = [self._sub_tuple(tbl, tdf.data_fields.get(tbl, ()), indicies)(x)
-                            for x in (sheet.row_values(i) for i in
-                                        range(table_len)[row_offsets[tbl]+ho:])]
+                data_sub_tuple = self._sub_tuple(tbl, tdf.data_fields.get(tbl, ()), indicies)
+                tableObj = [data_sub_tuple(x) for x in rows]
             rtn[tbl] = tableObj
         for tbl in tdf.generator_tables :
             rtn[tbl] = self._create_generator_obj(xls_file_path, tbl, row_offsets[tbl],
-                                                    headers_present)
+                                                    headers_present, streaming)
         return rtn
 
     def find_duplicates(self, xls_file_path, row_offsets={}, headers_present = True):
@@ -240,49 +568,56 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                                         row_offsets, headers_present)
         ho = 1 if headers_present else 0
         for table, sheet in sheets.items() :
-            fields = tdf.primary_key_fields[table] + tdf.data_fields.get(table, ())
             indicies = fieldIndicies[table]
-            table_len = min(len(sheet.col_values(indicies[field])) for field in fields)
-            for x in (sheet.row_values(i) for i in range(table_len)[row_offsets[table]+ho:]) :
-                rtn[table][self._sub_tuple(table, tdf.primary_key_fields[table],
-                                           indicies)(x)] += 1
+            pk_sub_tuple = self._sub_tuple(table, tdf.primary_key_fields[table], indicies)
+            for x in self._sheet_rows(sheet, row_offsets[table]+ho, indicies) :
+                rtn[table][pk_sub_tuple(x)] += 1
         for t in list(rtn.keys()):
             rtn[t] = {k:v for k,v in rtn[t].items() if v > 1}
             if not rtn[t]:
                 del(rtn[t])
         return rtn
     def _sub_tuple(self, table, fields, field_indicies) :
+        """
+        build the function that extracts the fields from a row of sheet values. Build it
+        once per table and apply it to every row.
+        """
         assert set(fields).issubset(field_indicies)
-        data_types = self.tic_dat_factory.data_types
-        def _convert_float(x, field):
-            rtn = x[field_indicies[field]]
-            if utils.numericish(rtn) and utils.safe_apply(int)(rtn) == rtn and \
-               table in data_types and field in data_types[table] and \
-               data_types[table][field].must_be_int:
-                return int(rtn)
-            return rtn
-        def rtn(x) :
-            if len(fields) == 1 :
-                return _convert_float(x, fields[0])
-            return tuple(_convert_float(x, field) for field in fields)
-        return rtn
+        data_types = self.tic_dat_factory.data_types.get(table, {})
+        indicies = tuple(field_indicies[field] for field in fields)
+        must_be_ints = tuple(field in data_types and data_types[field].must_be_int for field in fields)
+        def _convert_float(x):
+            if utils.numericish(x) and utils.safe_apply(int)(x) == x:
+                return int(x)
+            return x
+        if not fields:
+            return lambda x : ()
+        if len(fields) == 1 :
+            if must_be_ints[0]:
+                return lambda x : _convert_float(x[indicies[0]])
+            return itemgetter(indicies[0])
+        if not any(must_be_ints):
+            return itemgetter(*indicies)
+        steps = tuple(zip(indicies, must_be_ints))
+        return lambda x : tuple(_convert_float(x[i]) if must_be_int else x[i] for i, must_be_int in steps)
 
     def _get_field_indicies(self, table, sheet, row_offset, headers_present) :
         fields = self.tic_dat_factory.primary_key_fields.get(table, ()) + \
                  self.tic_dat_factory.data_fields.get(table, ())
+        first_row = self._first_row(sheet, row_offset)
         if not headers_present:
-            row_len = len(sheet.row_values(row_offset)) if sheet.nrows > 0  else len(fields)
+            row_len = len(first_row) if first_row is not None else len(fields)
             return ({f : i for i,f in enumerate(fields) if i < row_len},
                     [f for i,f in enumerate(fields) if i >= row_len], [])
-        if sheet.nrows - row_offset <= 0 :
+        if first_row is None :
             return {}, fields, []
         if table in self.tic_dat_factory.generic_tables:
             temp_rtn = defaultdict(list)
-            for ind, val in enumerate(sheet.row_values(row_offset)):
+            for ind, val in enumerate(first_row):
                 temp_rtn[val].append(ind)
         else:
             temp_rtn =  {field:list() for field in fields}
-            for field, (ind, val) in product(fields, enumerate(sheet.row_values(row_offset))) :
+            for field, (ind, val) in product(fields, enumerate(first_row)) :
                 if field == val or (all(map(utils.stringish, (field, val))) and
                                     field.lower() == val.lower()):
                     temp_rtn[field].append(ind)
@@ -291,7 +626,8 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                 [field for field, inds in temp_rtn.items() if len(inds) > 1])
 
 
-    def write_file(self, tic_dat, file_path, allow_overwrite = False, case_space_sheet_names = False):
+    def write_file(self, tic_dat, file_path, allow_overwrite = False, case_space_sheet_names = False,
+                   constant_memory = False):
         """
         write the ticDat data to an excel file
 
@@ -309,6 +645,10 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
               case_space_sheet_names: boolean - make best guesses how to add spaces and upper case
                                       characters to sheet names
 
+        :param constant_memory: boolean. Only for ".xlsx" files. Should each row be flushed
+                                to disk as it is written, rather than holding the entire
+                                workbook in memory? Recommended for very large solutions.
+
         :return:
 
         caveats: None may be written out as an empty string. This reflects the behavior of xlwt.
@@ -325,63 +665,48 @@ class XlsTicFactory(freezable_factory(object, "_isFrozen")) :
                "The %s path exists and overwrite is not allowed"%file_path)
         if self.tic_dat_factory.generic_tables:
             dat, tdf = utils.create_generic_free(tic_dat, self.tic_dat_factory)
-            return tdf.xls.write_file(dat, file_path, allow_overwrite, case_space_sheet_names)
+            return tdf.xls.write_file(dat, file_path, allow_overwrite, case_space_sheet_names,
+                                      constant_memory)
         case_space_sheet_names = case_space_sheet_names and \
                                  len(set(self.tic_dat_factory.all_tables)) == \
                                  len(set(map(case_space_to_pretty, self.tic_dat_factory.all_tables)))
         tbl_name_mapping = {t:case_space_to_pretty(t) if case_space_sheet_names else t
                             for t in self.tic_dat_factory.all_tables}
+        _release_workbooks(file_path)
         if file_path.endswith(".xls"):
             self._xls_write(tic_dat, file_path, tbl_name_mapping)
         else:
-            self._xlsx_write(tic_dat, file_path, tbl_name_mapping)
+            self._xlsx_write(tic_dat, file_path, tbl_name_mapping, constant_memory)
+    def _table_rows(self, tic_dat, t):
+        tdf = self.tic_dat_factory
+        _t = getattr(tic_dat, t)
+        dfs = tdf.data_fields.get(t, ())
+        if utils.dictish(_t) :
+            for p_key, data in _t.items() :
+                yield (p_key if containerish(p_key) else (p_key,)) + tuple(data[_f] for _f in dfs)
+        else :
+            for data in (_t if containerish(_t) else _t()) :
+                yield tuple(data[_f] for _f in dfs)
+    def _sorted_tables(self):
+        tdf = self.tic_dat_factory
+        return sorted(sorted(tdf.all_tables), key=lambda x: len(tdf.primary_key_fields.get(x, ())))
     def _xls_write(self, tic_dat, file_path, tbl_name_mapping):
         verify(xlwt, "Can't write .xls files because xlwt package isn't installed.")
         tdf = self.tic_dat_factory
         book = xlwt.Workbook()
-        for t in  sorted(sorted(tdf.all_tables),
-                         key=lambda x: len(tdf.primary_key_fields.get(x, ()))) :
+        for t in self._sorted_tables() :
             sheet = book.add_sheet(tbl_name_mapping[t][:_longest_sheet])
-            for i,f in enumerate(tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t, ())) :
-                sheet.write(0, i, f)
-            _t = getattr(tic_dat, t)
-            if utils.dictish(_t) :
-                for row_ind, (p_key, data) in enumerate(_t.items()) :
-                    for field_ind, cell in enumerate( (p_key if containerish(p_key) else (p_key,)) +
-                                        tuple(data[_f] for _f in tdf.data_fields.get(t, ()))):
-                        sheet.write(row_ind+1, field_ind, cell)
-            else :
-                for row_ind, data in enumerate(_t if containerish(_t) else _t()) :
-                    for field_ind, cell in enumerate(tuple(data[_f] for _f in tdf.data_fields[t])) :
-                        sheet.write(row_ind+1, field_ind, cell)
+            for row_ind, row in enumerate(chain([tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t, ())],
+                                                self._table_rows(tic_dat, t))) :
+                write = sheet.row(row_ind).write
+                for field_ind, cell in enumerate(row) :
+                    write(field_ind, cell)
         if os.path.exists(file_path):
             os.remove(file_path)
         book.save(file_path)
-    def _xlsx_write(self, tic_dat, file_path, tbl_name_mapping):
-        verify(xlsx, "Can't write .xlsx files because xlsxwriter package isn't installed.")
+    def _xlsx_write(self, tic_dat, file_path, tbl_name_mapping, constant_memory):
         tdf = self.tic_dat_factory
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        book = xlsx.Workbook(file_path)
-        def clean_inf(x):
-            if x == float("inf"):
-                return "inf"
-            if x == -float("inf"):
-                return "-inf"
-            return x
-        for t in sorted(sorted(tdf.all_tables),
-                         key=lambda x: len(tdf.primary_key_fields.get(x, ()))) :
-            sheet = book.add_worksheet(tbl_name_mapping[t])
-            for i,f in enumerate(tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t, ())) :
-                sheet.write(0, i, f)
-            _t = getattr(tic_dat, t)
-            if utils.dictish(_t) :
-                for row_ind, (p_key, data) in enumerate(_t.items()) :
-                    for field_ind, cell in enumerate( (p_key if containerish(p_key) else (p_key,)) +
-                                        tuple(data[_f] for _f in tdf.data_fields.get(t, ()))):
-                        sheet.write(row_ind+1, field_ind, clean_inf(cell))
-            else :
-                for row_ind, data in enumerate(_t if containerish(_t) else _t()) :
-                    for field_ind, cell in enumerate(tuple(data[_f] for _f in tdf.data_fields[t])) :
-                        sheet.write(row_ind+1, field_ind, clean_inf(cell))
-        book.close()
+        _write_xlsx_book(file_path, ((tbl_name_mapping[t],
+                                      tdf.primary_key_fields.get(t,()) + tdf.data_fields.get(t, ()),
+                                      self._table_rows(tic_dat, t))
+                                     for t in self._sorted_tables()), constant_memory)